@@ -0,0 +1,96 @@
+"""
+Compares appending results to JSONL history files one at a time, opening and closing the file for each result,
+versus the buffered writer that batches them through files kept open.
+Run from the project root with: python benchmarks/history_append_benchmark.py
+Write system calls are counted on Linux only (from /proc/self/io), file opens through an audit hook.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import common.custom_logging as custom_logging
+from common.settings_manager import settings
+from history.history_store import encode_history_line
+from history.jsonl_history_store import JsonlHistoryStore
+from queries.query_result import QueryResult
+
+MONITOR_COUNT = 200
+RESULTS_PER_MONITOR = 50
+
+file_open_count = 0
+
+
+def count_file_opens(event: str, _) -> None:
+    global file_open_count
+    if event == "open":
+        file_open_count += 1
+
+
+def append_unbuffered(unique_name: str, query_result: QueryResult) -> None:
+    """The previous implementation."""
+    target_path = JsonlHistoryStore.get_file_path(unique_name)
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    if not os.path.exists(target_path):
+        with open(target_path, "w") as f:
+            f.write("")
+    with open(target_path, "ab") as f:
+        f.write((encode_history_line(query_result) + "\n").encode("utf-8"))
+
+
+def count_write_syscalls() -> int | None:
+    try:
+        with open("/proc/self/io") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("syscw"))
+    except OSError:
+        return None
+
+
+def measure(append_function, flush_function) -> tuple[float, int | None, int]:
+    results = [QueryResult(test_passed=True, code_or_status=200, message="OK", reason="OK") for _ in range(RESULTS_PER_MONITOR)]
+    for monitor_index in range(MONITOR_COUNT):
+        append_function(f"monitor{monitor_index}", results[0])  # Steady state: files created, opened and indexed
+    flush_function()
+
+    file_opens_before = file_open_count
+    write_syscalls_before = count_write_syscalls()
+    start = time.perf_counter()
+    for query_result in results:
+        for monitor_index in range(MONITOR_COUNT):
+            append_function(f"monitor{monitor_index}", query_result)
+    flush_function()
+    duration_s = time.perf_counter() - start
+    write_syscalls_after = count_write_syscalls()
+    write_syscalls = write_syscalls_after - write_syscalls_before if write_syscalls_before is not None else None
+    return duration_s, write_syscalls, file_open_count - file_opens_before
+
+
+def main():
+    result_count = MONITOR_COUNT * RESULTS_PER_MONITOR
+    print(f"Appending {result_count} results to {MONITOR_COUNT} monitors' histories")
+    print(f"{'':>28} {'per result':>12} {'write syscalls':>15} {'file opens':>11}")
+
+    os.chdir(tempfile.mkdtemp())  # The logs are written in the working directory
+    custom_logging.initialize()
+    custom_logging.set_log_level("WARNING")
+    sys.addaudithook(count_file_opens)
+
+    for label, fsync_policy in (("one open/write/close each", None), ("buffered, fsync per batch", "batch"), ("buffered, fsync on exit", "on_exit")):
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            if fsync_policy is None:
+                duration_s, write_syscalls, file_opens = measure(append_unbuffered, lambda: None)
+            else:
+                settings.history_fsync_policy = fsync_policy
+                store = JsonlHistoryStore()
+                duration_s, write_syscalls, file_opens = measure(store.append, store.flush)
+                store.close()
+            write_syscalls_text = write_syscalls if write_syscalls is not None else "n/a"
+            print(f"{label:>28} {duration_s / result_count * 1e6:>10.1f}us {write_syscalls_text:>15} {file_opens:>11}")
+
+
+if __name__ == "__main__":
+    main()
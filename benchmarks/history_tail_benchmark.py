@@ -0,0 +1,53 @@
+"""
+Compares reading the last results of a JSONL history file by reading the whole file versus seeking from its end.
+Run from the project root with: python benchmarks/history_tail_benchmark.py
+"""
+
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import common.serialization as serialization
+from common.reverse_reader import read_last_lines
+from queries.query_result import QueryResult
+
+LINE_COUNTS = (1_000, 10_000, 100_000, 500_000)
+RESULTS_TO_READ = 12  # What a monitor list item displays
+REPETITIONS = 5
+
+
+def read_last_results_full_scan(file_path: str, count: int) -> list[QueryResult]:
+    """The previous implementation, reading every line of the file."""
+    with open(file_path, "r") as f:
+        lines = f.readlines()
+    return [serialization.from_encoded_json(line) for line in lines[-count:]]
+
+
+def read_last_results_from_end(file_path: str, count: int) -> list[QueryResult]:
+    return [serialization.from_encoded_json(line) for line in read_last_lines(file_path, count)]
+
+
+def main():
+    encoded_line = serialization.to_encoded_jsonl(QueryResult(test_passed=True, code_or_status=200, message="OK", reason="OK")) + "\n"
+    print(f"Reading the last {RESULTS_TO_READ} results, best of {REPETITIONS} runs")
+    print(f"{'lines':>10} {'file size':>10} {'full scan':>12} {'from end':>12}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "history.jsonl")
+        written_lines = 0
+        for line_count in LINE_COUNTS:
+            with open(file_path, "a") as f:
+                f.write(encoded_line * (line_count - written_lines))
+            written_lines = line_count
+
+            full_scan_s = min(timeit.repeat(lambda: read_last_results_full_scan(file_path, RESULTS_TO_READ), number=1, repeat=REPETITIONS))
+            from_end_s = min(timeit.repeat(lambda: read_last_results_from_end(file_path, RESULTS_TO_READ), number=1, repeat=REPETITIONS))
+            file_size_mb = os.path.getsize(file_path) / 1024 / 1024
+            print(f"{line_count:>10} {file_size_mb:>8.1f}MB {full_scan_s * 1000:>10.2f}ms {from_end_s * 1000:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Compares checking a local HTTP and HTTPS server with a new connection for every request, as before,
+versus the pooled keep-alive connections, in latency and client CPU time per request.
+Run from the project root with: python benchmarks/http_keep_alive_benchmark.py
+HTTPS uses a self-signed certificate generated with the openssl command, and is skipped if it is not available.
+"""
+
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import multiprocessing
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import common.custom_logging as custom_logging
+from common import http_client
+from common.settings_manager import settings
+
+REQUEST_COUNT = 500
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keeps connections alive
+    disable_nagle_algorithm = True  # Headers and body are sent separately, do not wait for the client to acknowledge the headers
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"OK")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port_queue: multiprocessing.Queue, certificate_path: str | None) -> None:
+    """Runs in its own process, so that the client's CPU time is measured alone."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    if certificate_path is not None:
+        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ssl_context.load_cert_chain(certificate_path)
+        server.socket = ssl_context.wrap_socket(server.socket, server_side=True)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def create_self_signed_certificate(directory: str) -> str | None:
+    if shutil.which("openssl") is None:
+        return None
+    certificate_path = os.path.join(directory, "localhost.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost"]
+        + ["-addext", "subjectAltName=DNS:localhost", "-keyout", certificate_path, "-out", certificate_path],
+        check=True,
+        capture_output=True,
+    )
+    return certificate_path
+
+
+async def measure(url: str) -> tuple[float, float]:
+    """Returns the average latency and client CPU time per request, in milliseconds."""
+    await http_client.fetch(url, 5)  # Warm up, e.g. the DNS resolver and the first connection
+    latency_sum_s = 0.0
+    cpu_start = time.process_time()
+    for _ in range(REQUEST_COUNT):
+        start = time.perf_counter()
+        await http_client.fetch(url, 5)
+        latency_sum_s += time.perf_counter() - start
+    cpu_s = time.process_time() - cpu_start
+    http_client.close_connections()
+    return latency_sum_s / REQUEST_COUNT * 1000, cpu_s / REQUEST_COUNT * 1000
+
+
+def main():
+    os.chdir(tempfile.mkdtemp())  # The logs are written in the working directory
+    custom_logging.initialize()
+    custom_logging.set_log_level("WARNING")
+
+    certificate_path = create_self_signed_certificate(os.getcwd())
+    servers = [("http", None)] + ([("https", certificate_path)] if certificate_path is not None else [])
+    if certificate_path is not None:
+        setattr(http_client, "__ssl_context", ssl.create_default_context(cafile=certificate_path))
+
+    print(f"Average per request over {REQUEST_COUNT} sequential requests to a local server")
+    print(f"{'':>28} {'latency':>10} {'client CPU':>11}")
+    for scheme, server_certificate_path in servers:
+        port_queue = multiprocessing.Queue()
+        server_process = multiprocessing.Process(target=serve, args=(port_queue, server_certificate_path), daemon=True)
+        server_process.start()
+        url = f"{scheme}://localhost:{port_queue.get()}/"
+        try:
+            for label, keep_alive_seconds in (("new connection each", 0), ("pooled keep-alive", 30)):
+                settings.queries_keep_alive_seconds = keep_alive_seconds
+                latency_ms, cpu_ms = asyncio.run(measure(url))
+                print(f"{scheme + ', ' + label:>28} {latency_ms:>8.3f}ms {cpu_ms:>9.3f}ms")
+        finally:
+            server_process.terminate()
+
+
+if __name__ == "__main__":
+    main()
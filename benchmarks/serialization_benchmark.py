@@ -0,0 +1,92 @@
+"""
+Compares encoding and decoding history results with the previous generic serializer, the per-class codecs,
+and the compact format without attribute names nor type tags.
+Run from the project root with: python benchmarks/serialization_benchmark.py
+"""
+
+from datetime import datetime
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import common.serialization as serialization
+from queries.query_result import QueryResult
+
+RESULT_COUNT = 20_000
+REPETITIONS = 5
+
+
+def previous_to_dict_encoded_with_types(obj):
+    """The previous encoder, inspecting every object and attribute name."""
+    if hasattr(obj, "__dict__"):
+        if not hasattr(obj.__class__, "from_dict"):
+            raise serialization.SerializationError(f"Class {obj.__class__.__name__} does not have a 'from_dict' static method implemented.")
+        class_name_prefix = f"_{obj.__class__.__name__}__"
+        attributes = {key: value for key, value in obj.__dict__.items() if not key.startswith(class_name_prefix)}
+        return {
+            "type": f"{obj.__class__.__module__}.{obj.__class__.__name__}",
+            "value": {key: previous_to_dict_encoded_with_types(value) for key, value in attributes.items()},
+        }
+    elif isinstance(obj, list):
+        return [previous_to_dict_encoded_with_types(item) for item in obj]
+    elif isinstance(obj, dict):
+        return {key: previous_to_dict_encoded_with_types(value) for key, value in obj.items()}
+    elif isinstance(obj, datetime):
+        return {"type": "datetime.datetime", "value": obj.isoformat()}
+    return obj
+
+
+def previous_from_encoded_json(json_string):
+    """The previous decoder, importing the class and running __init__ for every object."""
+
+    def decode_with_type(obj):
+        if isinstance(obj, dict) and "type" in obj and "value" in obj:
+            if obj["type"] == "datetime.datetime":
+                return datetime.fromisoformat(obj["value"])
+            class_name = obj["type"].split(".")[-1]
+            class_module = ".".join(obj["type"].split(".")[:-1])
+            class_ = getattr(__import__(class_module, fromlist=[class_name]), class_name)
+            return class_.from_dict({key: decode_with_type(value) for key, value in obj["value"].items()})
+        elif isinstance(obj, list):
+            return [decode_with_type(item) for item in obj]
+        elif isinstance(obj, dict):
+            return {key: decode_with_type(value) for key, value in obj.items()}
+        return obj
+
+    return decode_with_type(json.loads(json_string))
+
+
+def measure(function, items) -> float:
+    """Best time per item in microseconds."""
+    return min(timeit.repeat(lambda: [function(item) for item in items], number=1, repeat=REPETITIONS)) / len(items) * 1e6
+
+
+def main():
+    results = [
+        QueryResult(test_passed=index % 10 != 0, retries=1, code_or_status=200, message="OK", reason="OK", queue_wait_seconds=0.001)
+        for index in range(RESULT_COUNT)
+    ]
+    tagged_lines = [serialization.to_encoded_jsonl(result) for result in results]
+    compact_lines = [serialization.to_compact_jsonl(result) for result in results]
+
+    print(f"Per result, best of {REPETITIONS} runs over {RESULT_COUNT} results")
+    print(f"{'':>22} {'encode':>10} {'decode':>10} {'line size':>10}")
+    print(
+        f"{'previous':>22} {measure(lambda result: json.dumps(previous_to_dict_encoded_with_types(result)), results):>8.2f}us"
+        f" {measure(previous_from_encoded_json, tagged_lines):>8.2f}us {len(tagged_lines[0]):>9}B"
+    )
+    print(
+        f"{'per-class codecs':>22} {measure(serialization.to_encoded_jsonl, results):>8.2f}us"
+        f" {measure(serialization.from_encoded_json, tagged_lines):>8.2f}us {len(tagged_lines[0]):>9}B"
+    )
+    print(
+        f"{'compact':>22} {measure(serialization.to_compact_jsonl, results):>8.2f}us"
+        f" {measure(lambda line: serialization.from_compact_json(line, QueryResult), compact_lines):>8.2f}us {len(compact_lines[0]):>9}B"
+    )
+
+
+if __name__ == "__main__":
+    main()
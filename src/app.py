@@ -1,22 +1,22 @@
+import multiprocessing
 import os
-import tkinter as tk
-from tkinter import messagebox
+import signal
+import threading
 
 import common.custom_logging as custom_logging
 import common.mediator as mediator
-import common.python_js_bridge as python_js_bridge
 import sys
 
-from frontend.bottle_server import BottleServer
 from common.custom_logging import get_general_logger, set_log_level
-from frontend.gui_window import GuiWindow
 from monitor.monitors_manager import MonitorsManager
 from common import util
 from common.simple_queue import QueueEvents
 import common.serialization as serialization
-from common.system_tray_icon import SystemTrayIcon
 import common.settings_manager as settings_manager
 
+# NOTE: The GUI modules (pywebview, tkinter, pystray, plyer) are imported where they are used,
+# so that headless mode runs on machines without a display or GUI toolkits installed
+
 
 def define_cwd():
     """
@@ -38,6 +38,7 @@ def load_monitors_configuration():
     get_general_logger().debug("Trying to load monitors from file...")
     try:
         monitors_manager = serialization.load_from_json_file("data/monitors.json")
+        monitors_manager.load_runtime_state_from_file()
         get_general_logger().info("Monitors loaded successfully.")
     except FileNotFoundError:
         get_general_logger().warning("No monitors file found. Creating new empty file at 'data/monitors.json'.")
@@ -48,6 +49,14 @@ def load_monitors_configuration():
         # Prompt the user about overwriting the faulty config with a new empty one.
         get_general_logger().error(f"An error occurred while loading monitors: {e}.")
 
+        if mediator.headless_mode:
+            # No one to ask, never overwrite the user's configuration unattended
+            get_general_logger().critical("Failed to load monitors. Fix or remove 'data/monitors.json' and restart. Exiting application.")
+            sys.exit(1)
+
+        import tkinter as tk
+        from tkinter import messagebox
+
         root = tk.Tk()
         root.withdraw()
         message = (
@@ -93,6 +102,8 @@ def load_monitors_configuration():
 
 
 def main_thread_loop():
+    from frontend.gui_window import GuiWindow
+
     get_general_logger().debug("Main loop started.")
     test_window = GuiWindow()
     test_window.show()
@@ -123,8 +134,16 @@ def try_parse_cli_args():
 
     parser = argparse.ArgumentParser(description="Run the BUMP application.")
     parser.add_argument("--debugpwv", action="store_true", help="Enable pywebview debugging.")
+    parser.add_argument("--headless", action="store_true", help="Run the monitors and alerts only, without GUI or tray icon (e.g. as a service).")
+    parser.add_argument("--migrate-history", action="store_true", help="Import the jsonl history files into the history_backend set in the settings, then exit.")
     args = parser.parse_args()
 
+    if args.migrate_history:
+        mediator.migrate_history_requested = True
+
+    if args.headless:
+        mediator.headless_mode = True
+
     if args.debugpwv:
         mediator.pywebview_debug_mode = True
         custom_logging.set_log_level("DEBUG")
@@ -137,18 +156,14 @@ def try_parse_cli_args():
         get_general_logger().info("Debug mode enabled for pywebview through using the debug executable.")
 
 
-if __name__ == "__main__":
-    # NOTE: Order of operations is important in multiple places here
-    # (e.g. defining the working directory before loading settings, loading settings before setting log level, etc.)
-
-    define_cwd()  # Has to be called before any code that relies on relative paths
-    custom_logging.initialize()
-    try_parse_cli_args()
-    settings_manager.load_configs()
-    set_log_level(settings_manager.settings.general_log_level)
-    get_general_logger().info("Application starting...")
+def run_gui():
+    """
+    Run the application with its GUI and tray icon, until the user exits it.
+    """
+    import common.python_js_bridge as python_js_bridge
+    from common.system_tray_icon import SystemTrayIcon
+    from frontend.bottle_server import BottleServer
 
-    load_monitors_configuration()
     python_js_bridge.hook_frontend_to_backend_signals()  # Allows the JS frontend to receive specific backend events
     bottle_server = BottleServer()
     bottle_server.start_as_background_thread()  # Start custom HTTP server for the pywebview GUI
@@ -167,4 +182,70 @@ if __name__ == "__main__":
 
     print("Main window was closed. End of script reached.")
 
+
+def run_headless():
+    """
+    Run the monitors and their alerts only, until SIGTERM or SIGINT (Ctrl+C) is received.
+    Meant for servers and containers, e.g. as a systemd service.
+    """
+    exit_requested = threading.Event()
+
+    def request_exit(signal_number, frame):
+        get_general_logger().info(f"Received {signal.Signals(signal_number).name}, exiting application...")
+        exit_requested.set()
+
+    signal.signal(signal.SIGTERM, request_exit)
+    signal.signal(signal.SIGINT, request_exit)
+
+    async_bg_monitoring_thread = mediator.get_monitors_manager().start_background_monitoring_thread()
+    mediator.get_monitors_manager().checkIfAllMonitorsAreUpAndValid()
+    get_general_logger().info("Running in headless mode.")
+
+    # Wait in short steps, as a blocking wait is not interrupted by signals on all platforms
+    while not exit_requested.wait(timeout=1):
+        pass
+
+    # Stop the background monitoring and let in-flight executions finish
+    mediator.main_loop_exited.trigger()
+    async_bg_monitoring_thread.join()
+    get_general_logger().info("Headless mode exited.")
+
+
+if __name__ == "__main__":
+    # NOTE: Order of operations is important in multiple places here
+    # (e.g. defining the working directory before loading settings, loading settings before setting log level, etc.)
+
+    multiprocessing.freeze_support()  # Required for the monitoring worker processes in the bundled executable
+    define_cwd()  # Has to be called before any code that relies on relative paths
+    custom_logging.initialize()
+    try_parse_cli_args()
+    settings_manager.load_configs()
+    set_log_level(settings_manager.settings.general_log_level)
+    custom_logging.set_structured_format(settings_manager.settings.logs_structured_format)
+    custom_logging.set_rotation_policy(
+        settings_manager.settings.logs_max_file_size_mb, settings_manager.settings.logs_max_file_age_days, settings_manager.settings.logs_rotated_files_kept
+    )
+    get_general_logger().info("Application starting...")
+
+    if mediator.migrate_history_requested:
+        from history.history_store import get_history_store
+        from history.migrate_history import migrate_jsonl_history
+
+        try:
+            imported_counts = migrate_jsonl_history(get_history_store())
+        except ValueError as e:
+            get_general_logger().error(str(e))
+            sys.exit(1)
+        get_general_logger().info(
+            f"Imported {sum(imported_counts.values())} results of {len(imported_counts)} monitors into the {settings_manager.settings.history_backend} history."
+        )
+        sys.exit()
+
+    load_monitors_configuration()
+
+    if mediator.headless_mode:
+        run_headless()
+    else:
+        run_gui()
+
     sys.exit()
@@ -1,7 +1,7 @@
-import tkinter
-from tkinter import simpledialog
 import keyring
 
+import common.mediator as mediator
+
 KEYRING_SERVICE_NAME = "BUMP SMTP Credentials"
 
 # TODO - Allow changing the password through the GUI? Right now, if it exists, it will ALWAYS load without prompting the user
@@ -11,6 +11,7 @@ KEYRING_SERVICE_NAME = "BUMP SMTP Credentials"
 def get_password_from_keyring_or_user(for_username: str, force_prompt_user: bool = False) -> str:
     """
     Get the value for a key from keyring. If the key does not exist, prompt the user for the value and store it in keyring.
+    In headless mode there is no one to prompt, so the password has to be stored in keyring beforehand.
     """
     value = keyring.get_password(KEYRING_SERVICE_NAME, for_username)
     if value is None or force_prompt_user:
@@ -27,11 +28,16 @@ def prompt_for_and_save_password(for_username: str, title: str, message: str) ->
     Returns:
         str: The password entered by the user.
     """
-    # Prompt user for a password using tkinter
+    if mediator.headless_mode:
+        raise RuntimeError(f"No password stored in keyring for {for_username}, and cannot prompt for it in headless mode.")
+
+    # Prompt user for a password using tkinter, imported here so headless mode never loads it
+    import tkinter
+
     root = tkinter.Tk()
     root.withdraw()  # Hide the root window
 
-    password = PasswordDialog(parent=root, title=title, message=message).result
+    password = _create_password_dialog_class()(parent=root, title=title, message=message).result
 
     keyring.set_password(KEYRING_SERVICE_NAME, for_username, password)
     return password
@@ -53,33 +59,40 @@ def delete_password_from_keyring(for_username: str):
         keyring.delete_password(KEYRING_SERVICE_NAME, for_username)
 
 
-class PasswordDialog(simpledialog.Dialog):
-    """
-    A simple dialog to prompt the user for a password. The password is stored in the result attribute after the dialog is closed.
-    """
+def _create_password_dialog_class():
+    """Defines the password dialog on first use, as it derives from a tkinter class."""
+    import tkinter
+    from tkinter import simpledialog
+
+    class PasswordDialog(simpledialog.Dialog):
+        """
+        A simple dialog to prompt the user for a password. The password is stored in the result attribute after the dialog is closed.
+        """
+
+        def __init__(self, parent, title, message: str):
+            self.result = None
+            self.title_str = title
+            self.message_str = message
+            super().__init__(parent)
+            # self.body(parent, message)
 
-    def __init__(self, parent, title, message: str):
-        self.result = None
-        self.title_str = title
-        self.message_str = message
-        super().__init__(parent)
-        # self.body(parent, message)
+        def body(self, master):
+            self.title(self.title_str)
 
-    def body(self, master):
-        self.title(self.title_str)
+            # Adjust dialog size
+            # self.geometry("300x140")  # Width x Height in pixels
 
-        # Adjust dialog size
-        # self.geometry("300x140")  # Width x Height in pixels
+            # Add label with proper padding
+            tkinter.Label(master, text=self.message_str).grid(row=0, column=0, padx=20, pady=(15, 5), sticky="w")
 
-        # Add label with proper padding
-        tkinter.Label(master, text=self.message_str).grid(row=0, column=0, padx=20, pady=(15, 5), sticky="w")
+            # Add entry field for the password
+            self.password_var = tkinter.StringVar()
+            self.password_entry = tkinter.Entry(master, textvariable=self.password_var, show="*", width=40)
+            self.password_entry.grid(row=1, column=0, padx=20, pady=(10, 15))
 
-        # Add entry field for the password
-        self.password_var = tkinter.StringVar()
-        self.password_entry = tkinter.Entry(master, textvariable=self.password_var, show="*", width=40)
-        self.password_entry.grid(row=1, column=0, padx=20, pady=(10, 15))
+            return self.password_entry  # Focus the password entry box by default
 
-        return self.password_entry  # Focus the password entry box by default
+        def apply(self):
+            self.result = self.password_var.get()  # Retrieve the entered password
 
-    def apply(self):
-        self.result = self.password_var.get()  # Retrieve the entered password
+    return PasswordDialog
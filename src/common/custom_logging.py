@@ -1,9 +1,34 @@
+import atexit
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+import gzip
+import heapq
+import io
+import itertools
+import json
 import logging
+import logging.handlers
 import os
+import queue
 import re
+import shutil
+import time
+from typing import BinaryIO, Iterator
 
 from colorama import Fore, Back, Style, init
 
+from common.file_handle_pool import FileHandlePool
+from common.reverse_reader import iter_lines_reversed
+
+MAX_OPEN_LOG_FILES = 64  # Log files of the least recently active loggers are closed beyond that
+# Rotated log files are named after the time they were rotated at, e.g. general.log.2024-12-07_15-27-14-060123(.gz)
+LOG_SEGMENT_SUFFIX_FORMAT = "%Y-%m-%d_%H-%M-%S-%f"
+LOG_SEGMENT_SUFFIX_PATTERN = r"\.(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}-\d{6})(\.gz)?"
+LOG_ROTATION_CHECK_INTERVAL_S = 1  # How often each log file's size and age are checked, and whether another process rotated it
+# Each log file has an index, {log file}.idx, summarizing blocks of about this many bytes: their time range and entries per level
+LOG_INDEX_BLOCK_SIZE = 64 * 1024
+LOG_INDEX_SUFFIX = ".idx"
+
 
 # Color definitions for logs
 LEVEL_COLORS = {
@@ -24,13 +49,48 @@ class DynamicFormatter(logging.Formatter):
         "default": "%(asctime)s [%(levelname)s] (%(module)s.%(funcName)s:ln%(lineno)d) -> %(message)s",
     }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # One formatter per format, created once instead of for every record
+        self.__formatters = {level: logging.Formatter(log_fmt) for level, log_fmt in self.FORMATS.items()}
+
     def format(self, record):
         # Choose the format based on the log level
-        log_fmt = self.FORMATS.get(record.levelno, self.FORMATS["default"])
-        formatter = logging.Formatter(log_fmt)
+        formatter = self.__formatters.get(record.levelno, self.__formatters["default"])
         return formatter.format(record)
 
 
+class StructuredFormatter(logging.Formatter):
+    """Formats records as JSON objects, one per line, so that entries are parsed instead of recognized by their text."""
+
+    def format(self, record):
+        record.asctime = self.formatTime(record)
+        message = record.getMessage()
+        # Exceptions are usually already merged into the message by the queue handler
+        if record.exc_info:
+            message += "\n" + self.formatException(record.exc_info)
+        if record.stack_info:
+            message += "\n" + self.formatStack(record.stack_info)
+        return json.dumps(
+            {
+                "timestamp": record.asctime,
+                "level": record.levelname,
+                "monitor": record.name.removeprefix("monitors/") if record.name.startswith("monitors/") else None,
+                "module": record.module,
+                "function": record.funcName,
+                "line": record.lineno,
+                "message": message,
+            }
+        )
+
+
+def format_structured_log_entry(log_entry: dict) -> str:
+    """Formats a structured entry like DynamicFormatter does, so that both formats are displayed the same way."""
+    if log_entry["level"] == "INFO":
+        return f"{log_entry['timestamp']} -> {log_entry['message']}"
+    return f"{log_entry['timestamp']} [{log_entry['level']}] ({log_entry['module']}.{log_entry['function']}:ln{log_entry['line']}) -> {log_entry['message']}"
+
+
 class ColoredFormatter(DynamicFormatter):
     """Custom formatter to add colors to the entire log string."""
 
@@ -41,7 +101,185 @@ class ColoredFormatter(DynamicFormatter):
         return f"{log_color}{log_line}{reset_color}"
 
 
+@dataclass
+class _LogIndexBlock:
+    """Summary of the entries between two offsets of a log file, to skip them without reading them."""
+
+    file_id: int  # Inode of the log file, so that the index of a previous file with the same name is not used
+    start: int
+    end: int
+    first_time: str = ""
+    last_time: str = ""
+    levels: dict[str, int] = field(default_factory=dict)  # Number of entries per level
+
+
+class MultiplexedFileHandler(logging.Handler):
+    """
+    Writes each record to the log file of the logger it was logged with, {log_dir}/{logger name}.log, through a bounded pool
+    of open files shared by all loggers, instead of one file kept open per logger. The number of open files therefore stays
+    the same however many monitors there are.
+    Writes are flushed once no more records are waiting, so bursts of records (e.g. many monitors executing at once) are grouped.
+
+    Once rotation is enabled, a log file that grew larger or older than allowed is renamed to a segment suffixed with the time
+    it was rotated at, and a new file is started. The segments rotated before it are compressed and the oldest ones deleted.
+    The latest segment stays uncompressed until the next rotation, which leaves time to the other processes writing to the same
+    file (i.e. the monitoring workers) to notice that it was rotated and reopen it.
+
+    Entries are indexed by blocks as they are written (see _LogIndexBlock). A block is only indexed if the file grew by exactly
+    what this handler wrote in it, i.e. if no other process wrote in between, otherwise the readers scan it.
+    """
+
+    def __init__(self, log_dir: str, max_open_files: int, has_pending_records=lambda: False):
+        super().__init__()
+        self.__log_dir = log_dir
+        self.__files = FileHandlePool(max_open_files)
+        self.__unflushed_files = set()
+        self.__has_pending_records = has_pending_records
+        self.__max_file_size_bytes = 0  # 0 to not rotate
+        self.__max_file_age: timedelta | None = None
+        self.__rotated_files_kept = 0
+        self.__last_check_times: dict[str, float] = {}  # Per log file path
+        self.__start_times: dict[str, datetime] = {}  # Per log file path, the time of its first entry
+        self.__index_blocks: dict[str, _LogIndexBlock] = {}  # Per log file path, the block being written
+
+    def get_log_file_path(self, name: str) -> str:
+        return os.path.join(self.__log_dir, f"{name}.log")
+
+    def set_structured_format(self, is_structured: bool):
+        with self.lock:
+            self.setFormatter(StructuredFormatter() if is_structured else DynamicFormatter())
+
+    def set_rotation_policy(self, max_file_size_bytes: int, max_file_age: timedelta | None, rotated_files_kept: int):
+        """
+        :param max_file_size_bytes: Rotate log files larger than this, 0 to not rotate on size
+        :param max_file_age: Rotate log files whose first entry is older than this, None to not rotate on age
+        :param rotated_files_kept: Number of rotated segments kept per log file, the oldest ones are deleted
+        """
+        with self.lock:
+            self.__max_file_size_bytes = max_file_size_bytes
+            self.__max_file_age = max_file_age
+            self.__rotated_files_kept = rotated_files_kept
+
+    def emit(self, record):
+        try:
+            log_file_path = self.get_log_file_path(record.name)
+            log_file = self.__files.get(log_file_path)
+            now = time.monotonic()
+            if now - self.__last_check_times.get(log_file_path, 0) >= LOG_ROTATION_CHECK_INTERVAL_S:
+                self.__last_check_times[log_file_path] = now
+                log_file = self.__rotate_if_needed(log_file_path, log_file)
+            log_entry = (self.format(record) + "\n").encode("utf-8")
+            index_block = self.__get_index_block(log_file_path, log_file)
+            log_file.write(log_entry)
+            self.__unflushed_files.add(log_file)
+            self.__add_to_index_block(log_file_path, log_file, index_block, record, len(log_entry))
+            if not self.__has_pending_records():
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        for log_file in self.__unflushed_files:
+            if not log_file.closed:  # Closed files, e.g. the least recently used one, were flushed when closed
+                log_file.flush()
+        self.__unflushed_files.clear()
+
+    def close_file(self, name: str):
+        """Closes a logger's file if it is open, e.g. before it is renamed or deleted."""
+        with self.lock:
+            self.flush()
+            self.__end_index_block(self.get_log_file_path(name))
+            self.__files.close(self.get_log_file_path(name))
+            self.__last_check_times.pop(self.get_log_file_path(name), None)
+            self.__start_times.pop(self.get_log_file_path(name), None)
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            for log_file_path in list(self.__index_blocks):
+                self.__end_index_block(log_file_path)
+            self.__files.close_all()
+        super().close()
+
+    def __get_index_block(self, log_file_path: str, log_file: BinaryIO) -> _LogIndexBlock:
+        index_block = self.__index_blocks.get(log_file_path)
+        if index_block is None:
+            log_file.flush()
+            file_stat = os.fstat(log_file.fileno())
+            index_block = self.__index_blocks[log_file_path] = _LogIndexBlock(file_stat.st_ino, file_stat.st_size, file_stat.st_size)
+        return index_block
+
+    def __add_to_index_block(self, log_file_path: str, log_file: BinaryIO, index_block: _LogIndexBlock, record, entry_size: int):
+        entry_time = getattr(record, "asctime", None) or self.formatter.formatTime(record)  # Set by the formatter
+        index_block.end += entry_size
+        index_block.first_time = index_block.first_time or entry_time
+        index_block.last_time = entry_time
+        index_block.levels[record.levelname] = index_block.levels.get(record.levelname, 0) + 1
+        if index_block.end - index_block.start >= LOG_INDEX_BLOCK_SIZE:
+            self.__end_index_block(log_file_path, log_file)
+
+    def __end_index_block(self, log_file_path: str, log_file: BinaryIO | None = None):
+        """Adds the block being written to the file's index, unless another process also wrote to the file meanwhile."""
+        index_block = self.__index_blocks.pop(log_file_path, None)
+        if index_block is None or index_block.end == index_block.start:
+            return
+        try:
+            if log_file is not None:
+                log_file.flush()
+            file_stat = os.stat(log_file_path)
+            if file_stat.st_ino == index_block.file_id and file_stat.st_size == index_block.end:
+                with open(log_file_path + LOG_INDEX_SUFFIX, "a") as f:
+                    f.write(json.dumps(asdict(index_block)) + "\n")
+        except OSError:
+            pass  # The block is scanned instead
+
+    def __rotate_if_needed(self, log_file_path: str, log_file: BinaryIO) -> BinaryIO:
+        """Returns the handle to write to, reopened if the file was rotated, by this process or another one."""
+        try:
+            is_rotated_elsewhere = os.stat(log_file_path).st_ino != os.fstat(log_file.fileno()).st_ino
+        except FileNotFoundError:
+            is_rotated_elsewhere = True
+        if is_rotated_elsewhere:
+            self.__files.close(log_file_path)
+            self.__start_times.pop(log_file_path, None)
+            self.__index_blocks.pop(log_file_path, None)
+            log_file = self.__files.get(log_file_path)
+
+        if log_file_path not in self.__start_times:
+            self.__start_times[log_file_path] = _read_log_file_start_time(log_file_path)
+        is_too_large = self.__max_file_size_bytes > 0 and log_file.tell() >= self.__max_file_size_bytes
+        is_too_old = self.__max_file_age is not None and datetime.now() - self.__start_times[log_file_path] >= self.__max_file_age
+        if not is_too_large and not is_too_old:
+            return log_file
+
+        self.__files.close(log_file_path)
+        try:
+            os.rename(log_file_path, f"{log_file_path}.{datetime.now().strftime(LOG_SEGMENT_SUFFIX_FORMAT)}")
+        except OSError:
+            pass  # E.g. still open by another process on Windows, or already rotated by another process, retried at the next check
+        else:
+            # Rotated segments are not indexed, they are only read past the active file
+            self.__index_blocks.pop(log_file_path, None)
+            _remove_log_segment(log_file_path + LOG_INDEX_SUFFIX)
+            try:
+                segment_paths = get_log_segment_paths(log_file_path)
+                for segment_path in segment_paths[1:]:
+                    if not segment_path.endswith(".gz"):
+                        compress_log_segment(segment_path)
+                for segment_path in segment_paths[self.__rotated_files_kept :]:
+                    _remove_log_segment(segment_path)
+            except OSError:
+                pass  # E.g. compressed by another process, left to the next rotation
+        self.__start_times.pop(log_file_path, None)
+        return self.__files.get(log_file_path)
+
+
 class LoggerManager:
+    """
+    Loggers only put their records in a queue, which a single background thread writes to the files and console.
+    Logging therefore never blocks the monitoring threads on disk or console writes.
+    """
+
     def __init__(self, log_dir="logs", log_to_file=True, log_to_console=True, log_level=logging.DEBUG):
         self.loggers = {}
         self.log_dir = log_dir
@@ -51,6 +289,24 @@ class LoggerManager:
 
         os.makedirs(self.log_dir, exist_ok=True)  # Ensure log directory exists
 
+        self.__queue = queue.Queue()
+        self.__queue_handler = logging.handlers.QueueHandler(self.__queue)
+        # The same handlers for all loggers, used by the logging thread
+        self.__handlers = []
+        self.__file_handler = None
+        if self.log_to_file:
+            self.__file_handler = MultiplexedFileHandler(self.log_dir, MAX_OPEN_LOG_FILES, has_pending_records=lambda: not self.__queue.empty())
+            self.__file_handler.setFormatter(DynamicFormatter())
+            self.__handlers.append(self.__file_handler)
+        if self.log_to_console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(ColoredFormatter("%(asctime)s - %(module)s - %(funcName)s - %(lineno)d - %(message)s"))
+            self.__handlers.append(console_handler)
+        self.__listener = logging.handlers.QueueListener(self.__queue, *self.__handlers)
+        self.__listener.start()
+        self.__stopped = False
+        atexit.register(self.stop)  # Runs before logging's own shutdown, which flushes and closes the handlers
+
     def get_logger(self, name):
         """Retrieve or create a logger with the given name."""
         if name not in self.loggers:
@@ -58,34 +314,64 @@ class LoggerManager:
         return self.loggers[name]
 
     def _setup_logger(self, name):
-        """Configure a logger with specific handlers and formatters."""
+        """Configure a logger, whose records are written to its own log file, {log_dir}/{name}.log, and to the console."""
         logger = logging.getLogger(name)
         logger.setLevel(self.log_level)
         logger.propagate = False
 
-        handlers = []
-
-        if self.log_to_file:
-            # Separate log file for each logger
-            log_file = os.path.join(self.log_dir, f"{name}.log")
-
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(log_file), exist_ok=True)
-
-            file_handler = logging.FileHandler(log_file)
-            file_handler.setFormatter(DynamicFormatter())
-            handlers.append(file_handler)
-
-        if self.log_to_console:
-            console_handler = logging.StreamHandler()
-            console_handler.setFormatter(ColoredFormatter("%(asctime)s - %(module)s - %(funcName)s - %(lineno)d - %(message)s"))
-            handlers.append(console_handler)
-
-        for handler in handlers:
+        # The logger itself only enqueues its records
+        for handler in self.__handlers if self.__stopped else [self.__queue_handler]:
             logger.addHandler(handler)
 
         return logger
 
+    def get_log_file_path(self, name):
+        return os.path.join(self.log_dir, f"{name}.log")
+
+    def set_structured_format(self, is_structured):
+        if self.__file_handler is not None:
+            self.__file_handler.set_structured_format(is_structured)
+
+    def set_rotation_policy(self, max_file_size_bytes, max_file_age, rotated_files_kept):
+        if self.__file_handler is not None:
+            self.__file_handler.set_rotation_policy(max_file_size_bytes, max_file_age, rotated_files_kept)
+
+    def rename_log_file(self, old_name, new_name):
+        """
+        Renames the log file of a logger, e.g. of a renamed monitor, once the records logged so far are written to it.
+        Its rotated segments are renamed too.
+        """
+        self.close_log_file(old_name)
+        old_log_file_path = self.get_log_file_path(old_name)
+        new_log_file_path = self.get_log_file_path(new_name)
+        for segment_path in get_log_segment_paths(old_log_file_path):
+            os.replace(segment_path, new_log_file_path + segment_path[len(old_log_file_path) :])
+        if os.path.exists(old_log_file_path + LOG_INDEX_SUFFIX):
+            os.replace(old_log_file_path + LOG_INDEX_SUFFIX, new_log_file_path + LOG_INDEX_SUFFIX)
+        if os.path.exists(old_log_file_path):
+            os.replace(old_log_file_path, new_log_file_path)
+
+    def close_log_file(self, name):
+        """Closes the log file of a logger once the records logged so far are written to it, e.g. before another process renames it."""
+        self.flush()
+        if self.__file_handler is not None:
+            self.__file_handler.close_file(name)
+
+    def flush(self):
+        """Waits until the records logged so far are written, e.g. before the log files are read or exported."""
+        self.__queue.join()
+
+    def stop(self):
+        """Writes the records still queued, then stops the logging thread. Records logged afterwards are written right away."""
+        if self.__stopped:
+            return
+        self.__stopped = True
+        for logger in self.loggers.values():
+            for handler in self.__handlers:
+                logger.addHandler(handler)
+            logger.removeHandler(self.__queue_handler)
+        self.__listener.stop()
+
 
 __logger_manager = None
 __general_logger = None
@@ -101,6 +387,12 @@ def initialize():
     __general_logger = __logger_manager.get_logger("general")
 
 
+def flush():
+    """Waits until the records logged so far are written to the log files."""
+    if __logger_manager is not None:
+        __logger_manager.flush()
+
+
 def get_general_logger() -> logging.Logger:
     if __general_logger is None:
         raise ValueError("The logger manager has not been initialized. DId you forget to call custom_logging.initialize()?")
@@ -114,12 +406,42 @@ def set_log_level(log_level: str):
         __general_logger.error(f"Invalid log level: {log_level}")
         return
 
+    __logger_manager.log_level = log_level  # For the loggers created later, e.g. monitors' loggers created on their first event
     for logger in __logger_manager.loggers.values():
         logger.setLevel(log_level)
 
     __general_logger.debug(f"Log level set to: {log_level}")
 
 
+def set_structured_format(is_structured: bool):
+    """Writes the log entries as JSON objects from now on, instead of text. Both formats can be read from the same files."""
+    __logger_manager.set_structured_format(is_structured)
+
+
+def set_rotation_policy(max_file_size_mb: int, max_file_age_days: int, rotated_files_kept: int):
+    """
+    Enables the rotation of the log files, once the settings are loaded.
+    :param max_file_size_mb: Rotate log files larger than this, 0 to not rotate on size
+    :param max_file_age_days: Rotate log files older than this, 0 to not rotate on age
+    :param rotated_files_kept: Number of rotated (and compressed) segments kept per log file
+    """
+    __logger_manager.set_rotation_policy(
+        max_file_size_mb * 1024 * 1024,
+        timedelta(days=max_file_age_days) if max_file_age_days > 0 else None,
+        max(0, rotated_files_kept),
+    )
+
+
+def rename_custom_logger_file(old_name: str, new_name: str):
+    """Renames the log file of a custom logger, e.g. from "monitors/monitor1" to "monitors/monitor2"."""
+    __logger_manager.rename_log_file(old_name, new_name)
+
+
+def close_custom_logger_file(name: str):
+    """Closes the log file of a custom logger until its next record, e.g. "monitors/monitor1"."""
+    __logger_manager.close_log_file(name)
+
+
 def get_custom_logger(name: str) -> logging.Logger:
     """
     Get a custom logger with the specified name.
@@ -137,58 +459,198 @@ def get_custom_logger(name: str) -> logging.Logger:
     return __logger_manager.get_logger(name)
 
 
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+LOG_ENTRY_TIMESTAMP_LENGTH = len("2024-12-07 15:27:14,060")  # Entries start with their timestamp, which sorts like the time it stands for
+LOG_ENTRY_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S,%f"
+# The start of an entry: its timestamp, then its level except for INFO entries (see DynamicFormatter.FORMATS)
+LOG_ENTRY_HEADER_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2} [\d:,]+ (?:\[(DEBUG|INFO|WARNING|ERROR|CRITICAL)\])?")
+
+
 def extract_log_level_from_entry(log_entry: str) -> str:
-    """Extracts the log level from a log entry."""
-    levels_patterns = ["[DEBUG]", "[INFO]", "[WARNING]", "[ERROR]", "[CRITICAL]"]
+    """Extracts the log level from a log entry's header, so that the same words in the message are not mistaken for it."""
     level_if_unknown = "INFO"
-    for level in levels_patterns:
-        if level in log_entry:
-            return level[1:-1]  # Remove brackets
-    return level_if_unknown
+    header_match = LOG_ENTRY_HEADER_PATTERN.match(log_entry)
+    if header_match is None or header_match.group(1) is None:
+        return level_if_unknown
+    return header_match.group(1)
 
 
-def read_entries_from_log_file(log_file_path: str, mnumber_of_entries: int, min_level: str = "INFO"):
-    """
-    Reads and returns the last `mnumber_of_entries` log entries from the specified log file with the specified level.
-    Expects log_file_path to be the full path, not just relative to the log directory.
-    """
-    log_entries = []
+def get_log_segment_paths(log_file_path: str) -> list[str]:
+    """Returns the paths of a log file's rotated segments, most recent first."""
+    directory, file_name = os.path.split(log_file_path)
+    segment_pattern = re.compile(re.escape(file_name) + LOG_SEGMENT_SUFFIX_PATTERN + "$")
+    try:
+        file_names = os.listdir(directory or ".")
+    except FileNotFoundError:
+        return []
 
-    accepted_log_levels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+    segment_file_names = {}  # Per rotation time, the uncompressed segment while it is being compressed
+    for segment_file_name in file_names:
+        segment_match = segment_pattern.match(segment_file_name)
+        if segment_match is not None and (segment_match.group(2) is None or segment_match.group(1) not in segment_file_names):
+            segment_file_names[segment_match.group(1)] = segment_file_name
+    return [os.path.join(directory, segment_file_names[rotation_time]) for rotation_time in sorted(segment_file_names, reverse=True)]
 
-    if min_level not in accepted_log_levels:
-        __general_logger.error(f"Invalid log level: {min_level}")
-        return log_entries
-    accepted_log_levels = accepted_log_levels[accepted_log_levels.index(min_level) :]
 
-    # The pattern that determines when to finish adding lines to the current entry and start a new one
-    entry_delimiter_pattern = re.compile(r"^\d{4}-\d{2}-\d{2}")
+def compress_log_segment(segment_path: str):
+    """Replaces a rotated segment with its gzip-compressed version."""
+    with open(segment_path, "rb") as source, gzip.open(f"{segment_path}.gz.tmp", "wb") as target:
+        shutil.copyfileobj(source, target)
+    os.replace(f"{segment_path}.gz.tmp", f"{segment_path}.gz")
+    os.remove(segment_path)
+
 
+def _remove_log_segment(segment_path: str):
     try:
-        with open(log_file_path, "r") as f:
-            lines = f.readlines()
+        os.remove(segment_path)
+    except FileNotFoundError:
+        pass
 
-        selected_entries_count = 0
-        current_entry = ""
-        # For every line in the log file, starting from the end (i.e. most recents)
-        for line in reversed(lines):
-            if selected_entries_count >= mnumber_of_entries:
-                break
 
-            # Append the current line to the current entry
-            current_entry = line + current_entry
+def _read_log_file_start_time(log_file_path: str) -> datetime:
+    """Returns the time of the first entry of a log file, in either format, now if it is empty."""
+    try:
+        with open(log_file_path, "rb") as f:
+            if f.read(1) == b"{":  # Structured entries are JSON objects
+                f.seek(0)
+                timestamp = json.loads(f.readline())["timestamp"]
+            else:
+                f.seek(0)
+                timestamp = f.read(LOG_ENTRY_TIMESTAMP_LENGTH).decode("utf-8")
+            return datetime.strptime(timestamp, LOG_ENTRY_TIMESTAMP_FORMAT)
+    except (OSError, ValueError, KeyError, TypeError):
+        return datetime.now()
+
+
+def _open_log_segment(log_file_path: str) -> BinaryIO | None:
+    """Opens a log file or segment for reading, decompressing it in memory if needed. None if it does not exist (anymore)."""
+    try:
+        if log_file_path.endswith(".gz"):
+            with gzip.open(log_file_path, "rb") as f:
+                return io.BytesIO(f.read())
+        return open(log_file_path, "rb")
+    except FileNotFoundError:
+        if re.search(LOG_SEGMENT_SUFFIX_PATTERN + "$", log_file_path) and not log_file_path.endswith(".gz"):
+            return _open_log_segment(f"{log_file_path}.gz")  # Compressed since it was listed
+        return None
 
-            if entry_delimiter_pattern.match(line):
-                # current_entry ends on this line, add it to the list if it has the right log level and start a new entry
-                line_log_level = extract_log_level_from_entry(current_entry)
-                if line_log_level in accepted_log_levels:
-                    log_entries.append(current_entry)
-                    selected_entries_count += 1
 
-                current_entry = ""
+def _read_log_index(log_file_path: str, log_file: BinaryIO) -> list[_LogIndexBlock]:
+    """
+    Returns the indexed blocks of a log file in chronological order, or none if its index does not match the file,
+    e.g. written for a previous file with the same name, in which case the whole file is scanned.
+    """
+    try:
+        with open(log_file_path + LOG_INDEX_SUFFIX) as f:
+            index_blocks = [_LogIndexBlock(**json.loads(line)) for line in f if line.strip()]
+        file_stat = os.fstat(log_file.fileno())
+    except (OSError, ValueError, TypeError):
+        return []
+
+    index_blocks.sort(key=lambda index_block: index_block.start)
+    previous_end = 0
+    for index_block in index_blocks:
+        if index_block.file_id != file_stat.st_ino or index_block.start < previous_end or index_block.end > file_stat.st_size:
+            return []
+        previous_end = index_block.end
+    return index_blocks
+
+
+def _get_log_file_regions(log_file_path: str, log_file: BinaryIO, is_indexed: bool) -> list[tuple[int, int, _LogIndexBlock | None]]:
+    """Splits a log file into its indexed blocks and the parts not indexed in between, most recent first."""
+    log_file.seek(0, os.SEEK_END)
+    file_size = log_file.tell()
+    regions = []
+    position = 0
+    for index_block in _read_log_index(log_file_path, log_file) if is_indexed else []:
+        if index_block.start > position:
+            regions.append((position, index_block.start, None))
+        regions.append((index_block.start, index_block.end, index_block))
+        position = index_block.end
+    if position < file_size:
+        regions.append((position, file_size, None))
+    regions.reverse()
+    return regions
+
+
+def _iter_region_entries_reversed(log_file: BinaryIO, start: int, end: int) -> Iterator[tuple[str, str, str]]:
+    """Yields the timestamp, level and text of the entries between two offsets of a log file, in text or structured format, last one first."""
+    entry_lines: list[str] = []  # Continuation lines of the text entry being read, last one first
+    for raw_line in iter_lines_reversed(log_file, start=start, end=end):
+        if raw_line.startswith(b"{"):
+            try:
+                log_entry = json.loads(raw_line)
+                yield log_entry["timestamp"], log_entry["level"], format_structured_log_entry(log_entry) + "\n"
+                entry_lines.clear()
+                continue
+            except (ValueError, KeyError):
+                pass  # A continuation line starting with "{", e.g. in a message
+
+        line = raw_line.decode("utf-8", errors="replace").rstrip("\r")
+        header_match = LOG_ENTRY_HEADER_PATTERN.match(line)
+        if header_match is None:
+            entry_lines.append(line)
+            continue
+
+        # The entry starts on this line
+        entry_lines.append(line)
+        yield line[:LOG_ENTRY_TIMESTAMP_LENGTH], header_match.group(1) or "INFO", "\n".join(reversed(entry_lines)) + "\n"
+        entry_lines.clear()
+
+
+def iter_log_entries_reversed(log_file_path: str, min_level: str = "INFO", since: str | None = None, until: str | None = None) -> Iterator[str]:
+    """
+    Yields the entries of a log file of at least `min_level`, from the most recent one to the oldest one,
+    continuing with its rotated segments, most recent first.
+    Entries span several lines when their message does (e.g. tracebacks), each line ends with "\n".
+    Structured entries are formatted like text ones.
+    Files are read by blocks from their end, so getting the last entries takes the same time whatever the size of the file,
+    and a segment is only read (and decompressed) once the entries of the more recent ones are all consumed.
+    The blocks of the active file whose index shows no entry of the level or time range requested are skipped without being read.
+    :param since, until: Only yield the entries logged within this range of timestamps (e.g. "2024-12-07 15:27:14,060"), both included
+    """
+    accepted_log_levels = LOG_LEVELS[LOG_LEVELS.index(min_level) :]
+    for path in itertools.chain([log_file_path], get_log_segment_paths(log_file_path)):
+        f = _open_log_segment(path)
+        if f is None:
+            continue
+        with f:
+            for start, end, index_block in _get_log_file_regions(path, f, is_indexed=path == log_file_path):
+                if index_block is not None:
+                    if since is not None and index_block.last_time < since:
+                        return
+                    if until is not None and index_block.first_time > until:
+                        continue
+                    if not any(index_block.levels.get(log_level) for log_level in accepted_log_levels):
+                        continue
+
+                for entry_time, log_level, log_entry in _iter_region_entries_reversed(f, start, end):
+                    if since is not None and entry_time < since:
+                        return
+                    if log_level in accepted_log_levels and (until is None or entry_time <= until):
+                        yield log_entry
+
+
+def merge_log_entries_reversed(log_file_paths: list[str], min_level: str = "INFO", since: str | None = None, until: str | None = None) -> Iterator[str]:
+    """
+    Yields the entries of several log files of at least `min_level`, from the most recent one to the oldest one across all files.
+    A heap merges the files' reverse readers on the entries' timestamps, so each file is only read as far back as the entries consumed.
+    """
+    readers = [iter_log_entries_reversed(log_file_path, min_level, since, until) for log_file_path in log_file_paths]
+    return heapq.merge(*readers, key=lambda entry: entry[:LOG_ENTRY_TIMESTAMP_LENGTH], reverse=True)
 
+
+def read_entries_from_log_file(log_file_path: str, mnumber_of_entries: int, min_level: str = "INFO"):
+    """
+    Reads and returns the last `mnumber_of_entries` log entries from the specified log file with the specified level.
+    Expects log_file_path to be the full path, not just relative to the log directory.
+    """
+    if min_level not in LOG_LEVELS:
+        __general_logger.error(f"Invalid log level: {min_level}")
+        return []
+
+    try:
+        return list(itertools.islice(iter_log_entries_reversed(log_file_path, min_level), mnumber_of_entries))
     except Exception as e:
         __general_logger.error(f"Error while reading log file: {e}")
         return []
-
-    return log_entries
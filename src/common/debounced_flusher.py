@@ -0,0 +1,66 @@
+"""
+Batches expensive writes (e.g. saving the monitors to disk) requested from many places and threads into periodic flushes.
+"""
+
+import threading
+from typing import Callable
+
+from common.custom_logging import get_general_logger
+
+
+class DebouncedFlusher:
+    """
+    Calls a flush function on a background thread at most once every delay_s, coalescing all the requests made in between.
+    E.g. many monitor results coming in at once lead to a single write to disk.
+    Flushes never run concurrently, whether they come from the background thread or from flush_now().
+    """
+
+    def __init__(self, flush_function: Callable[[], None], delay_s: float, name: str) -> None:
+        self.__flush_function = flush_function
+        self.__delay_s = delay_s
+        self.__name = name
+        self.__flush_requested = threading.Event()
+        self.__stop_requested = threading.Event()
+        self.__flush_lock = threading.Lock()
+        self.__thread: threading.Thread | None = None
+        self.__thread_lock = threading.Lock()
+
+    def request_flush(self) -> None:
+        """Requests a flush within delay_s. Returns immediately."""
+        if self.__stop_requested.is_set():
+            self.flush_now()  # No background thread anymore, e.g. a late change during shutdown
+            return
+        self.__start_thread_if_needed()
+        self.__flush_requested.set()
+
+    def flush_now(self) -> None:
+        """Flushes synchronously in the calling thread, which also satisfies any pending request."""
+        self.__flush_requested.clear()
+        with self.__flush_lock:
+            try:
+                self.__flush_function()
+            except Exception as e:
+                get_general_logger().error(f"{self.__name} failed to flush: {e}")
+
+    def stop(self) -> None:
+        """Stops the background thread and flushes, so that nothing requested is lost. Later requests flush synchronously."""
+        self.__stop_requested.set()
+        self.__flush_requested.set()  # Wakes the thread up
+        with self.__thread_lock:
+            if self.__thread is not None:
+                self.__thread.join()
+        self.flush_now()
+
+    def __start_thread_if_needed(self) -> None:
+        with self.__thread_lock:
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name=self.__name, daemon=True)
+                self.__thread.start()
+
+    def __run(self) -> None:
+        while True:
+            self.__flush_requested.wait()
+            self.__stop_requested.wait(self.__delay_s)  # Let more requests accumulate, cut short when stopping
+            if self.__stop_requested.is_set():
+                return  # stop() does the final flush
+            self.flush_now()
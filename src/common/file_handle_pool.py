@@ -0,0 +1,58 @@
+"""
+Keeps files that are written to over and over open between writes, instead of opening and closing them every time,
+while bounding how many are open at once to stay well under the process' file descriptors limit.
+"""
+
+from collections import OrderedDict
+import os
+import threading
+from typing import BinaryIO
+
+
+class FileHandlePool:
+    """
+    Least recently used files opened in append mode, up to max_open_files. Opening one more closes the least recently used one.
+    Handles are shared and may be closed by any later get(), so callers have to serialize their writes and use a handle right away.
+    """
+
+    def __init__(self, max_open_files: int, mode: str = "ab") -> None:
+        self.__max_open_files = max(1, max_open_files)
+        self.__mode = mode
+        self.__handles: OrderedDict[str, BinaryIO] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, file_path: str) -> BinaryIO:
+        """Returns the open handle of a file, opening it (and its directory if needed) if it is not open yet."""
+        with self.__lock:
+            handle = self.__handles.get(file_path)
+            if handle is not None:
+                self.__handles.move_to_end(file_path)
+                return handle
+
+            while len(self.__handles) >= self.__max_open_files:
+                _, least_recently_used_handle = self.__handles.popitem(last=False)
+                least_recently_used_handle.close()  # Flushes it
+
+            os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+            handle = self.__handles[file_path] = open(file_path, self.__mode)
+            return handle
+
+    def close(self, file_path: str) -> None:
+        """Closes a file if it is open, e.g. before it is renamed, deleted or replaced."""
+        with self.__lock:
+            handle = self.__handles.pop(file_path, None)
+        if handle is not None:
+            handle.close()
+
+    def close_all(self, fsync: bool = False) -> None:
+        with self.__lock:
+            handles = list(self.__handles.values())
+            self.__handles.clear()
+        for handle in handles:
+            if fsync:
+                handle.flush()
+                os.fsync(handle.fileno())
+            handle.close()
+
+    def __len__(self) -> int:
+        return len(self.__handles)
@@ -0,0 +1,92 @@
+"""
+Limits the load the queries put on each origin (scheme + host + port), so that many monitors pointing at the same service
+do not hammer it once they execute concurrently.
+Each origin gets a cap on concurrent requests and a token bucket rate limit, both configured in the settings.
+"""
+
+import asyncio
+import contextlib
+from dataclasses import dataclass, field
+import time
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+import weakref
+
+
+@dataclass
+class _OriginState:
+    concurrency_slots: asyncio.Semaphore | None
+    tokens: float
+    last_refill: float = field(default_factory=time.monotonic)
+
+
+class HostLimiter:
+    """
+    Per-origin concurrency cap and token bucket, shared by all queries.
+    asyncio primitives are bound to an event loop, so the state is kept per event loop.
+    """
+
+    def __init__(self) -> None:
+        self.__states: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, _OriginState]] = weakref.WeakKeyDictionary()
+
+    @contextlib.asynccontextmanager
+    async def limit(self, url: str, execution_slot: asyncio.Semaphore | None = None) -> AsyncIterator[float]:
+        """
+        Waits until a request to the URL's origin is allowed, and holds a concurrency slot for that origin until the block exits.
+        Yields the time in seconds spent waiting, to be reported with the query's result.
+        :param execution_slot: Global limit on running queries, only taken once the origin allows the request,
+        so that queries waiting on a rate limited origin do not hold slots other origins could use
+        """
+        state = self.__get_state(origin_of(url))
+        wait_start = time.perf_counter()
+
+        async with state.concurrency_slots or contextlib.nullcontext():
+            await self.__take_token(state)
+            async with execution_slot or contextlib.nullcontext():
+                yield time.perf_counter() - wait_start
+
+    def __get_state(self, origin: str) -> _OriginState:
+        from common.settings_manager import settings  # Imported here so that the queries can be imported before the settings
+
+        loop_states = self.__states.setdefault(asyncio.get_running_loop(), {})
+        if origin not in loop_states:
+            max_concurrent_requests = settings.queries_max_concurrent_requests_per_host
+            loop_states[origin] = _OriginState(
+                concurrency_slots=asyncio.Semaphore(max_concurrent_requests) if max_concurrent_requests > 0 else None,
+                tokens=max(1, settings.queries_rate_limit_burst_per_host),
+            )
+        return loop_states[origin]
+
+    async def __take_token(self, state: _OriginState) -> None:
+        from common.settings_manager import settings
+
+        requests_per_second = settings.queries_max_requests_per_minute_per_host / 60
+        if requests_per_second <= 0:
+            return  # Rate limiting disabled
+
+        burst = max(1, settings.queries_rate_limit_burst_per_host)
+        while True:
+            now = time.monotonic()
+            state.tokens = min(burst, state.tokens + (now - state.last_refill) * requests_per_second)
+            state.last_refill = now
+            if state.tokens >= 1:
+                state.tokens -= 1
+                return
+            await asyncio.sleep((1 - state.tokens) / requests_per_second)
+
+
+def origin_of(url: str) -> str:
+    """Returns the origin of a URL, e.g. "https://example.com:443", which is what the limits apply to."""
+    parts = urlsplit(url)
+    try:
+        port = parts.port or {"http": 80, "https": 443}.get(parts.scheme)
+    except ValueError:
+        port = None  # Invalid port, the query itself will report the error
+    return f"{parts.scheme}://{parts.hostname}:{port}"
+
+
+__host_limiter = HostLimiter()
+
+
+def get_host_limiter() -> HostLimiter:
+    return __host_limiter
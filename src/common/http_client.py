@@ -0,0 +1,357 @@
+"""
+Minimal asyncio HTTP/1.1 client used by the http queries, so that many checks can be in flight on a single thread.
+Mirrors the behavior of urllib.request.urlopen that the queries rely on: redirects are followed, HTTP errors raise HTTPError
+and connection issues raise URLError, and responses expose the same attributes as urllib's (code, status, msg, reason, headers, read()).
+
+Connections are kept alive between requests and shared by all queries targeting the same origin (see ConnectionPool),
+so that periodic checks do not pay for DNS resolution, TCP and TLS handshakes every time.
+
+Proxies are not implemented by this client: requests to URLs that the proxy settings apply to (HTTP_PROXY, HTTPS_PROXY
+and NO_PROXY environment variables, or the system settings on Windows and macOS) are sent with urllib on a worker thread,
+the same way as before this client existed. They do not benefit from the connection pool, and each one occupies a thread.
+"""
+
+import asyncio
+import contextlib
+from dataclasses import dataclass, field
+import io
+import ssl
+import sys
+import time
+from http.client import HTTPMessage, RemoteDisconnected, parse_headers
+from typing import AsyncIterator
+from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin, urlsplit
+import urllib.request
+import weakref
+
+MAX_REDIRECTIONS = 10  # Same limit as urllib's HTTPRedirectHandler
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+USER_AGENT = f"Python-urllib/{sys.version_info.major}.{sys.version_info.minor}"
+
+IDLE_CONNECTIONS_CHECK_INTERVAL_S = 1  # How often idle connections are checked for expiration, at most
+
+__ssl_context: ssl.SSLContext | None = None
+__proxies: dict[str, str] | None = None
+
+
+class AsyncHttpResponse:
+    """
+    A fully read HTTP response.
+    Exposes the subset of http.client.HTTPResponse used by the queries, so predicates work with both execution paths.
+    """
+
+    def __init__(self, url: str, code: int, reason: str, headers: HTTPMessage, body: bytes) -> None:
+        self.url = url
+        self.code = code
+        self.status = code
+        self.reason = reason
+        self.msg = reason  # urllib exposes the reason phrase as "msg" on its responses
+        self.headers = headers
+        self.__body = body
+
+    def read(self) -> bytes:
+        return self.__body
+
+    def getcode(self) -> int:
+        return self.code
+
+
+@dataclass
+class _Connection:
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    is_reused: bool = False
+    can_be_reused: bool = False  # Set once a response was fully read and the server did not ask to close the connection
+    last_used: float = field(default_factory=time.monotonic)
+
+    def is_usable(self) -> bool:
+        """Whether the connection is still open on both ends, e.g. not closed by the server while idle."""
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+@dataclass
+class _OriginConnections:
+    connection_slots: asyncio.Semaphore | None
+    idle_connections: list[_Connection] = field(default_factory=list)  # Most recently used last
+
+
+class ConnectionPool:
+    """
+    Keep-alive connections per origin (scheme + host + port), at most queries_max_connections_per_host per origin.
+    A request reuses the most recently used idle connection to its origin, or opens a new one, and the connection goes back to
+    the pool once the response is fully read, unless the server asked to close it.
+    Idle connections are closed after queries_keep_alive_seconds, and when the server closes them.
+
+    asyncio streams are bound to an event loop, so each event loop has its own pool (see get_connection_pool()).
+    """
+
+    def __init__(self) -> None:
+        self.__origins: dict[tuple[str, str, int], _OriginConnections] = {}
+        self.__last_idle_check = time.monotonic()
+
+    @contextlib.asynccontextmanager
+    async def connection(self, scheme: str, host: str, port: int) -> AsyncIterator[_Connection]:
+        """
+        Holds a connection to the origin until the block exits, waiting for one of the origin's connections to be available.
+        The connection goes back to the pool if the block set its can_be_reused, it is closed otherwise, e.g. on errors and timeouts.
+        """
+        from common.settings_manager import settings  # Imported here so that the queries can be imported before the settings
+
+        self.__close_expired_connections()
+        origin = self.__origins.get((scheme, host, port))
+        if origin is None:
+            max_connections = settings.queries_max_connections_per_host
+            origin = self.__origins[(scheme, host, port)] = _OriginConnections(asyncio.Semaphore(max_connections) if max_connections > 0 else None)
+
+        async with origin.connection_slots or contextlib.nullcontext():
+            connection = self.__take_idle_connection(origin)
+            if connection is None:
+                connection = await _open_connection(scheme, host, port)
+            try:
+                yield connection
+            except BaseException:
+                connection.close()
+                raise
+
+            if connection.can_be_reused and settings.queries_keep_alive_seconds > 0:
+                connection.is_reused = True
+                connection.can_be_reused = False
+                connection.last_used = time.monotonic()
+                origin.idle_connections.append(connection)
+            else:
+                connection.close()
+
+    def close_all(self) -> None:
+        """Closes the idle connections, e.g. before the event loop is closed."""
+        for origin in self.__origins.values():
+            for connection in origin.idle_connections:
+                connection.close()
+            origin.idle_connections.clear()
+
+    @staticmethod
+    def __take_idle_connection(origin: _OriginConnections) -> _Connection | None:
+        while origin.idle_connections:
+            connection = origin.idle_connections.pop()
+            if connection.is_usable():
+                return connection
+            connection.close()
+        return None
+
+    def __close_expired_connections(self) -> None:
+        from common.settings_manager import settings
+
+        now = time.monotonic()
+        if now - self.__last_idle_check < IDLE_CONNECTIONS_CHECK_INTERVAL_S:
+            return
+        self.__last_idle_check = now
+
+        for origin in self.__origins.values():
+            for connection in origin.idle_connections:
+                if now - connection.last_used >= settings.queries_keep_alive_seconds or not connection.is_usable():
+                    connection.close()
+            origin.idle_connections = [connection for connection in origin.idle_connections if not connection.writer.is_closing()]
+
+
+__connection_pools: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ConnectionPool] = weakref.WeakKeyDictionary()
+
+
+def get_connection_pool() -> ConnectionPool:
+    """Returns the connection pool of the running event loop."""
+    return __connection_pools.setdefault(asyncio.get_running_loop(), ConnectionPool())
+
+
+def close_connections() -> None:
+    """Closes the idle connections of the running event loop, to be called before it is closed."""
+    pool = __connection_pools.get(asyncio.get_running_loop())
+    if pool is not None:
+        pool.close_all()
+
+
+def get_ssl_context() -> ssl.SSLContext:
+    """Returns the SSL context shared by all requests, creating it on first use."""
+    global __ssl_context
+    if __ssl_context is None:
+        __ssl_context = ssl.create_default_context()
+    return __ssl_context
+
+
+async def fetch(url: str, timeout: float) -> AsyncHttpResponse:
+    """
+    Sends a GET request to the URL and returns the fully read response, following redirects.
+    :param url: The URL to query
+    :param timeout: The timeout in seconds for the whole request, redirects included
+    :raises ValueError: If the URL is invalid
+    :raises HTTPError: If the server responded with an error status code (e.g. 404, 500)
+    :raises URLError: On timeouts and connection issues
+    """
+    try:
+        return await asyncio.wait_for(_fetch_following_redirects(url, timeout), timeout)
+    except asyncio.TimeoutError:
+        raise URLError(TimeoutError("timed out"))
+    except (HTTPError, URLError, ValueError):
+        raise
+    except (OSError, EOFError) as e:
+        # Connection refused, DNS failure, connection reset, incomplete response...
+        raise URLError(e)
+
+
+async def _fetch_following_redirects(url: str, timeout: float) -> AsyncHttpResponse:
+    for _ in range(MAX_REDIRECTIONS + 1):
+        if _is_proxied(url):
+            # urllib goes through the proxy and follows the remaining redirects itself
+            return await asyncio.to_thread(_fetch_through_proxy, url, timeout)
+
+        response = await _fetch_once(url)
+
+        if response.code in REDIRECT_CODES and "location" in response.headers:
+            new_url = urljoin(url, response.headers["location"])
+            if urlsplit(new_url).scheme not in DEFAULT_PORTS:
+                raise HTTPError(new_url, response.code, f"Redirection to url '{new_url}' is not allowed", response.headers, None)
+            url = new_url
+            continue
+
+        if not 200 <= response.code < 300:
+            raise HTTPError(response.url, response.code, response.reason, response.headers, io.BytesIO(response.read()))
+
+        return response
+
+    raise HTTPError(url, response.code, "The HTTP server returned a redirect error that would lead to an infinite loop.", response.headers, None)
+
+
+def _is_proxied(url: str) -> bool:
+    """Returns whether the proxy settings apply to the URL, read once like urlopen does."""
+    global __proxies
+    if __proxies is None:
+        __proxies = urllib.request.getproxies()
+    parts = urlsplit(url)
+    return parts.scheme in __proxies and not urllib.request.proxy_bypass(parts.hostname or "")
+
+
+def _fetch_through_proxy(url: str, timeout: float) -> AsyncHttpResponse:
+    """Blocking, sends the request like urlopen does, through the proxies _is_proxied() decided on. Raises the same errors as fetch()."""
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler(__proxies))
+    with opener.open(url, timeout=timeout) as response:
+        return AsyncHttpResponse(response.url, response.status, response.reason, response.headers, response.read())
+
+
+async def _fetch_once(url: str) -> AsyncHttpResponse:
+    from common.settings_manager import settings
+
+    scheme, host, port, target = _split_url(url)
+    request = _build_request(host, port, scheme, target, keep_alive=settings.queries_keep_alive_seconds > 0)
+
+    while True:
+        async with get_connection_pool().connection(scheme, host, port) as connection:
+            try:
+                connection.writer.write(request)
+                await connection.writer.drain()
+                response, connection.can_be_reused = await _read_response(url, connection.reader)
+                return response
+            except ConnectionError:
+                if connection.is_reused:
+                    continue  # The server closed the idle connection as it was reused, retry on another one
+                raise
+
+
+async def _open_connection(scheme: str, host: str, port: int) -> _Connection:
+    if scheme == "https":
+        reader, writer = await asyncio.open_connection(host, port, ssl=get_ssl_context(), server_hostname=host)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    return _Connection(reader, writer)
+
+
+def _split_url(url: str) -> tuple[str, str, int, str]:
+    """Splits a URL into (scheme, host, port, request target), raising like urllib does for unusable URLs."""
+    parts = urlsplit(url)
+    if not parts.scheme:
+        raise ValueError(f"unknown url type: {url!r}")
+    if parts.scheme not in DEFAULT_PORTS:
+        raise URLError(f"unknown url type: {parts.scheme}")
+    if not parts.hostname:
+        raise URLError("no host given")
+
+    target = parts.path or "/"
+    if parts.query:
+        target += "?" + parts.query
+    target.encode("ascii")  # Like http.client, refuse non-ASCII request targets (raises UnicodeEncodeError, a ValueError)
+
+    return parts.scheme, parts.hostname, parts.port or DEFAULT_PORTS[parts.scheme], target
+
+
+def _build_request(host: str, port: int, scheme: str, target: str, keep_alive: bool) -> bytes:
+    host_header = host.encode("idna").decode("ascii")
+    if port != DEFAULT_PORTS[scheme]:
+        host_header += f":{port}"
+    request = (
+        f"GET {target} HTTP/1.1\r\n"
+        f"Host: {host_header}\r\n"
+        f"User-Agent: {USER_AGENT}\r\n"
+        "Accept-Encoding: identity\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    return request.encode("ascii")
+
+
+async def _read_response(url: str, reader: asyncio.StreamReader) -> tuple[AsyncHttpResponse, bool]:
+    """Reads a response, and whether the connection can be reused for another request afterwards."""
+    # Status line, e.g. "HTTP/1.1 200 OK", skipping any interim 1xx responses
+    while True:
+        raw_status_line = await reader.readline()
+        if not raw_status_line:
+            raise RemoteDisconnected("Remote end closed connection without response")
+        status_line = raw_status_line.decode("iso-8859-1").rstrip("\r\n")
+        parts = status_line.split(" ", 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/") or not parts[1].isdigit():
+            raise URLError(f"Invalid HTTP status line: {status_line!r}")
+        code = int(parts[1])
+        reason = parts[2] if len(parts) > 2 else ""
+        headers = await _read_headers(reader)
+        if not 100 <= code < 200:
+            break
+
+    connection_options = [option.strip().lower() for option in headers.get("connection", "").split(",")]
+    if parts[0] == "HTTP/1.0":
+        keeps_connection_alive = "keep-alive" in connection_options
+    else:
+        keeps_connection_alive = "close" not in connection_options
+
+    if code in (204, 304):
+        body = b""
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        body = await _read_chunked_body(reader)
+    elif headers.get("content-length") is not None:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()  # Read until the server closes the connection
+        keeps_connection_alive = False
+
+    return AsyncHttpResponse(url, code, reason, headers, body), keeps_connection_alive
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> HTTPMessage:
+    raw_headers = b""
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        raw_headers += line
+    return parse_headers(io.BytesIO(raw_headers + b"\r\n"))
+
+
+async def _read_chunked_body(reader: asyncio.StreamReader) -> bytes:
+    chunks = []
+    while True:
+        size_line = await reader.readline()
+        chunk_size = int(size_line.split(b";", 1)[0].strip(), 16)
+        if chunk_size == 0:
+            await _read_headers(reader)  # Discard the trailers
+            return b"".join(chunks)
+        chunks.append(await reader.readexactly(chunk_size))
+        await reader.readexactly(2)  # CRLF after each chunk
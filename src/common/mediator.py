@@ -1,12 +1,13 @@
 from __future__ import annotations
+import threading
 from typing import TYPE_CHECKING
-from bottle import Bottle
 
-from common.simple_queue import SimpleQueue
+from common.simple_queue import EventQueue, SimpleQueue
 from common.signal import Signal
 from monitor.monitor import Monitor
 
 if TYPE_CHECKING:
+    from bottle import Bottle
     from frontend.gui_window import GuiWindow
     from monitor.monitors_manager import MonitorsManager
 
@@ -19,9 +20,14 @@ A central hub for communication between different parts of the application.
 # For inter-thread communication, where "get" blocks until an event is received
 # When you need an action to be performed in a specific thread
 main_thread_blocking_queue = SimpleQueue()
-bg_monitoring_queue = SimpleQueue()  # Can take QueueEvents or Monitor objects (in which case the monitor will be executed)
+bg_monitoring_queue = EventQueue()  # Can take QueueEvents or Monitor objects (in which case the monitor will be executed)
 bg_monitoring_queue.add_allowed_event_type(Monitor)  # Allow Monitors to be added to the queue for immediate bg execution
 
+############################################################################################
+# Locks
+# For state that is mutated from multiple threads (e.g. monitoring workers and the GUI bridge)
+monitor_results_lock = threading.RLock()  # Serializes the side effects of new results (history, status changes, signals, saves)
+
 ############################################################################################
 # Signals
 # For unasfe "brodcast" communication, where all observers are called when the signal is sent
@@ -43,6 +49,8 @@ __active_gui: GuiWindow | None = None
 __monitors_manager: MonitorsManager | None = None
 __http_server: Bottle | None = None
 pywebview_debug_mode: bool = False  # Can be set with command-line arguments
+headless_mode: bool = False  # Set with the --headless command-line argument, no GUI, tray icon or toast notifications
+migrate_history_requested: bool = False  # Set with the --migrate-history command-line argument
 
 
 def register_active_gui(window: GuiWindow | None):
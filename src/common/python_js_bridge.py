@@ -1,8 +1,11 @@
+from datetime import datetime
+import itertools
 import json
+import os
 import webview
 
 import common.credentials_manager as credentials_manager
-from common.custom_logging import get_general_logger, read_entries_from_log_file
+from common.custom_logging import LOG_ENTRY_TIMESTAMP_FORMAT, LOG_LEVELS, get_general_logger, merge_log_entries_reversed
 from common.simple_queue import QueueEvents
 import common.util
 import common.mediator as mediator
@@ -59,7 +62,7 @@ class JsApi:
         targetMonitor = mediator.get_monitors_manager().get_monitor_by_name(unique_name)
         if targetMonitor is None:
             raise ValueError(f"No monitor found with name {unique_name}")
-        targetMonitor.recalculate_stats()  # Send the frontend the latest stats for monitor details
+        targetMonitor.refresh_stats()  # Send the frontend the latest stats for monitor details
         return serialization.to_dict_encoded_with_types(targetMonitor)
 
     def request_monitor_history(self, unique_name: str, max_number_of_entries: int):
@@ -78,7 +81,7 @@ class JsApi:
         if targetMonitor is None:
             return f"Monitor with name {unique_name} not found"
         monitors_manager.remove_monitor(targetMonitor)
-        targetMonitor.delete_history_file()
+        monitors_manager.delete_monitor_files(unique_name)
         monitors_manager.save_monitors_configs_to_file()
         return "true"
 
@@ -90,28 +93,45 @@ class JsApi:
         targetMonitor.execute_in_background()
         return "true"
 
-    def request_log_entries(self, max_number_of_entries: int, min_level: str = "INFO", include_general: bool = True, include_monitoring: bool = True):
+    def request_log_entries(
+        self,
+        max_number_of_entries: int,
+        min_level: str = "INFO",
+        include_general: bool = True,
+        include_monitoring: bool = True,
+        since: str | None = None,
+        until: str | None = None,
+    ):
         """
-        Reads from general and/or monitors logs and returns the last `max_number_of_entries` entries of at least `min_level`.
+        Reads from general and/or monitors logs and returns the last `max_number_of_entries` entries of at least `min_level`, most recent first.
+        :param since: Only return the entries logged at or after this timestamp (e.g. "2024-12-07 15:27:14,060"), typically the one of the
+        most recent entry already displayed, to only fetch the new ones. The entries logged at that exact timestamp are returned again.
+        :param until: Only return the entries logged at or before this timestamp
         """
         # print(f"Received request for log entries")
+        if min_level not in LOG_LEVELS:
+            get_general_logger().error(f"Invalid log level: {min_level}")
+            return []
 
-        # Get log entries from the general log and all monitors logs
-        log_entries = []
+        log_file_paths = []
         if include_general:
-            # Add log entries from the general log
-            general_log_path = common.util.resolve_relative_path("logs/general.log")
-            log_entries += read_entries_from_log_file(general_log_path, max_number_of_entries, min_level)
+            log_file_paths.append(common.util.resolve_relative_path("logs/general.log"))
         if include_monitoring:
-            # Add log entries for all monitors in the manager
-            for monitor in mediator.get_monitors_manager().monitors:
-                log_entries += monitor.read_monitor_log_entries(max_number_of_entries, min_level)
+            log_file_paths += [monitor.get_log_file_path() for monitor in mediator.get_monitors_manager().monitors]
+        log_file_paths = [log_file_path for log_file_path in log_file_paths if os.path.exists(log_file_path)]
 
-        # Sort alphanumerically descending since they start with a timestamp
-        log_entries.sort(reverse=True)
-
-        # Return the first (i.e. most recent) max_number_of_entries
-        return log_entries[:max_number_of_entries]
+        try:
+            if since:
+                # Logs not written to since then have nothing new, no need to open them
+                since_time = datetime.strptime(since, LOG_ENTRY_TIMESTAMP_FORMAT)
+                log_file_paths = [path for path in log_file_paths if datetime.fromtimestamp(os.path.getmtime(path)) >= since_time]
+
+            # Newest first across all the logs, each one only read as far back as needed
+            log_entries = merge_log_entries_reversed(log_file_paths, min_level, since or None, until or None)
+            return list(itertools.islice(log_entries, max_number_of_entries))
+        except Exception as e:
+            get_general_logger().error(f"Error while reading log entries: {e}")
+            return []
 
     def set_monitor_pause_state(self, unique_name: str, new_paused_value: bool) -> str:
         """
@@ -125,6 +145,7 @@ class JsApi:
         if targetMonitor is None:
             return f"Monitor with name {unique_name} not found"
         targetMonitor.paused = new_paused_value
+        mediator.get_monitors_manager().reschedule_monitor(targetMonitor)
         targetMonitor.log_monitor_event("Monintor paused." if new_paused_value else "Monitor unpaused.")
         mediator.get_monitors_manager().save_monitors_configs_to_file()
         return "true"
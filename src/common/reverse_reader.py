@@ -0,0 +1,57 @@
+"""
+Reads text files backwards from their end, so that reading their last lines costs the same whatever the size of the file.
+Used for the files that are appended to forever and mostly read from the end, i.e. the history and the logs.
+"""
+
+import os
+from typing import BinaryIO, Iterator
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+
+def iter_lines_reversed(file: BinaryIO, block_size: int = DEFAULT_BLOCK_SIZE, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+    """
+    Yields the lines of a file opened in binary mode from the last one to the first one, without their "\\n".
+    Reads the file by blocks from its end, so only the blocks holding the consumed lines are read.
+    The file's position is undefined while iterating.
+    :param start, end: Only read the lines between these offsets, which have to be at line boundaries. The whole file by default
+    """
+    if end is None:
+        file.seek(0, os.SEEK_END)
+        end = file.tell()
+    position = end
+    remainder = b""  # Start of the line at the beginning of the previous block, to be completed by the next block
+    is_last_block = True
+
+    while position > start:
+        read_size = min(block_size, position - start)
+        position -= read_size
+        file.seek(position)
+        lines = (file.read(read_size) + remainder).split(b"\n")
+
+        if is_last_block:
+            is_last_block = False
+            if lines[-1] == b"":
+                lines.pop()  # The file ends with a line ending, not an empty line
+
+        remainder = lines[0]
+        for line in reversed(lines[1:]):
+            yield line
+
+    if remainder or not is_last_block:
+        yield remainder
+
+
+def read_last_lines(file_path: str, count: int, block_size: int = DEFAULT_BLOCK_SIZE) -> list[str]:
+    """Returns the last `count` non-empty lines of a UTF-8 text file, in their order in the file."""
+    lines = []
+    if count <= 0:
+        return lines
+    with open(file_path, "rb") as file:
+        for line in iter_lines_reversed(file, block_size):
+            if line.strip():
+                lines.append(line.decode("utf-8").rstrip("\r"))
+                if len(lines) >= count:
+                    break
+    lines.reverse()
+    return lines
@@ -1,6 +1,7 @@
 from datetime import datetime
 import json
 import os
+import tempfile
 
 
 class SerializationError(Exception):
@@ -10,6 +11,10 @@ class SerializationError(Exception):
 class Deserializable:
     """Base class for class instances that can be deserialized from a dictionary."""
 
+    # Set on classes whose __init__ only assigns immutable defaults, so decoding copies the defaults of an instance built once
+    # instead of running __init__ for every object
+    DECODE_WITHOUT_INIT = False
+
     @classmethod
     def from_dict(cls, dict_object: dict):
         # TODO : IS THIS DEPRECATED IN FAVOR OF from_encoded_json()?
@@ -22,6 +27,97 @@ class Deserializable:
         return instance
 
 
+SIMPLE_TYPES = frozenset((str, int, float, bool, type(None)))  # Encoded as is
+DATETIME_TYPE_TAG = "datetime.datetime"
+
+
+class _ClassCodec:
+    """
+    What encoding and decoding the instances of a class needs, worked out once per class instead of for every object:
+    its type tag, which attributes are included, the class behind a tag, and its default attributes.
+    """
+
+    def __init__(self, cls: type) -> None:
+        self.cls = cls
+        self.type_tag = f"{cls.__module__}.{cls.__name__}"
+        self.__private_prefix = f"_{cls.__name__}__"  # Prefix for mangled private attributes
+        self.__included_attributes: dict[tuple[bool, bool], dict[str, bool]] = {}  # Per inclusion parameters
+        self.__default_attributes: dict | None = None
+        # from_dict() can be skipped only if not overridden
+        self.__decodes_without_init = (
+            getattr(cls, "DECODE_WITHOUT_INIT", False) and getattr(cls.from_dict, "__func__", None) is Deserializable.from_dict.__func__
+        )
+
+    def encode_attributes(self, obj, include_internal: bool, include_private: bool) -> dict:
+        included_attributes = self.__included_attributes.get((include_internal, include_private))
+        if included_attributes is None:
+            included_attributes = self.__included_attributes[(include_internal, include_private)] = {}
+
+        encoded_attributes = {}
+        for key, value in obj.__dict__.items():
+            is_included = included_attributes.get(key)
+            if is_included is None:
+                is_included = included_attributes[key] = (
+                    # Filtering out name-mangled private attributes
+                    (include_private or not key.startswith(self.__private_prefix))
+                    # Filtering out internal attributes
+                    and (include_internal or not key.startswith("_") or key.startswith(self.__private_prefix))
+                )
+            if is_included:
+                value_type = type(value)
+                if value_type in SIMPLE_TYPES:
+                    encoded_attributes[key] = value
+                elif value_type is datetime:
+                    encoded_attributes[key] = {"type": DATETIME_TYPE_TAG, "value": value.isoformat()}
+                else:
+                    encoded_attributes[key] = to_dict_encoded_with_types(value, include_internal, include_private)
+        return encoded_attributes
+
+    def get_default_attributes(self) -> dict:
+        """The attributes of an instance built without arguments, in the order __init__ sets them."""
+        if self.__default_attributes is None:
+            self.__default_attributes = dict(vars(self.cls()))
+        return self.__default_attributes
+
+    def decode(self, attributes: dict):
+        if not self.__decodes_without_init:
+            return self.cls.from_dict(attributes)
+
+        # Same result as from_dict(), without running __init__ for every object
+        default_attributes = self.get_default_attributes()
+        instance = self.cls.__new__(self.cls)
+        instance.__dict__.update(default_attributes)
+        for key, value in attributes.items():
+            # Only set attributes that exist in the class
+            if key in default_attributes or hasattr(self.cls, key):
+                setattr(instance, key, value)
+        return instance
+
+
+_codecs: dict[type, _ClassCodec] = {}
+_codecs_by_type_tag: dict[str, _ClassCodec] = {}
+
+
+def _get_codec(cls: type) -> _ClassCodec:
+    codec = _codecs.get(cls)
+    if codec is None:
+        # Check if the class has a 'from_dict' static method implemented so that it can be deserialized
+        if not hasattr(cls, "from_dict"):
+            raise SerializationError(f"Class {cls.__name__} does not have a 'from_dict' static method implemented.")
+        codec = _codecs[cls] = _ClassCodec(cls)
+        _codecs_by_type_tag[codec.type_tag] = codec
+    return codec
+
+
+def _get_codec_by_type_tag(type_tag: str) -> _ClassCodec:
+    codec = _codecs_by_type_tag.get(type_tag)
+    if codec is None:
+        class_module, _, class_name = type_tag.rpartition(".")
+        codec = _get_codec(getattr(__import__(class_module, fromlist=[class_name]), class_name))
+        _codecs_by_type_tag[type_tag] = codec
+    return codec
+
+
 def to_dict_encoded_with_types(obj, include_internal=True, include_private=False) -> dict:
     """
     Function to encode an non-simple object to a dictionary of its attributes AND its type.
@@ -35,34 +131,15 @@ def to_dict_encoded_with_types(obj, include_internal=True, include_private=False
     Raises:
         SerializationError: If the object's class does not have a 'from_dict' static method implemented.
     """
-    if hasattr(obj, "__dict__"):
+    obj_type = type(obj)
+    if obj_type in SIMPLE_TYPES:
+        return obj  # Most values, so checked first
+    elif obj_type is datetime:
+        return {"type": DATETIME_TYPE_TAG, "value": obj.isoformat()}
+    elif hasattr(obj, "__dict__"):
         # Handle objects with a __dict__ attribute recursively (they are class instances/complex objects)
-
-        # Check if the class has a 'from_dict' static method implemented so that it can be deserialized
-        if not hasattr(obj.__class__, "from_dict"):
-            raise SerializationError(f"Class {obj.__class__.__name__} does not have a 'from_dict' static method implemented.")
-
-        # Apply the internal/private inclusion/exclusion parameters
-        class_name_prefix = f"_{obj.__class__.__name__}__"  # Prefix for mangled private attributes
-
-        attributes = {
-            key: value
-            for key, value in obj.__dict__.items()
-            # Filtering out name-mangled private attributes
-            if (include_private or not key.startswith(class_name_prefix))
-            # Filtering out internal attributes
-            and (include_internal or not key.startswith("_") or key.startswith(class_name_prefix))
-        }
-
-        # Recursively encode the attributes
-        encoded_attributes = {}
-        for key, value in attributes.items():
-            encoded_attributes[key] = to_dict_encoded_with_types(value, include_internal, include_private)
-
-        return {
-            "type": f"{obj.__class__.__module__}.{obj.__class__.__name__}",
-            "value": encoded_attributes,
-        }
+        codec = _get_codec(obj_type)
+        return {"type": codec.type_tag, "value": codec.encode_attributes(obj, include_internal, include_private)}
     elif isinstance(obj, list):
         return [
             to_dict_encoded_with_types(item, include_internal, include_private) for item in obj
@@ -74,7 +151,7 @@ def to_dict_encoded_with_types(obj, include_internal=True, include_private=False
     else:
         # "value" types with custom encoding, then a default behavior
         if isinstance(obj, datetime):
-            return {"type": "datetime.datetime", "value": obj.isoformat()}
+            return {"type": DATETIME_TYPE_TAG, "value": obj.isoformat()}
         else:
             return obj  # Return primitives directly
 
@@ -93,41 +170,71 @@ def to_encoded_jsonl(obj):
     return json.dumps(to_dict_encoded_with_types(obj))
 
 
+def _decode_typed_object(obj: dict):
+    """json.loads() hook, called on each JSON object after its content was decoded."""
+    if len(obj) == 2 and "type" in obj and "value" in obj:
+        if obj["type"] == DATETIME_TYPE_TAG:
+            return datetime.fromisoformat(obj["value"])
+        return _get_codec_by_type_tag(obj["type"]).decode(obj["value"])
+    return obj
+
+
 def from_encoded_json(json_string) -> object:
     """
     Deserializes an object from a JSON string that was encoded with the encode_with_type function.
     """
+    return json.loads(json_string, object_hook=_decode_typed_object)
 
-    def decode_with_type(obj):
-        if isinstance(obj, dict) and "type" in obj and "value" in obj:
-            if obj["type"] == "datetime.datetime":
-                return datetime.fromisoformat(obj["value"])
-            else:
-                class_name = obj["type"].split(".")[-1]
-                class_module = ".".join(obj["type"].split(".")[:-1])
-                class_ = getattr(__import__(class_module, fromlist=[class_name]), class_name)
-                return class_.from_dict({key: decode_with_type(value) for key, value in obj["value"].items()})
-
-        elif isinstance(obj, list):
-            return [decode_with_type(item) for item in obj]
-        elif isinstance(obj, dict):
-            return {key: decode_with_type(value) for key, value in obj.items()}
-        else:
-            return obj
 
-    return decode_with_type(json.loads(json_string))
+def to_compact_jsonl(obj) -> str:
+    """
+    Encodes an object as a JSON array of its attribute values, in the order __init__ sets them, without attribute names nor type tags.
+    For long streams of objects of a single class, e.g. a monitor's history, that only hold simple values and datetimes.
+    Decoded with from_compact_json() and the class.
+    """
+    values = [getattr(obj, key, None) for key in _get_codec(type(obj)).get_default_attributes()]
+    return json.dumps([value.isoformat() if type(value) is datetime else value for value in values])
+
+
+def from_compact_json(json_string, cls: type) -> object:
+    """
+    Decodes an object encoded by to_compact_jsonl(). Its attributes are matched by position with the attributes of cls(),
+    and the ones that hold a datetime there are decoded as datetimes.
+    """
+    codec = _get_codec(cls)
+    default_attributes = codec.get_default_attributes()
+    attributes = {}
+    for (key, default_value), value in zip(default_attributes.items(), json.loads(json_string)):
+        attributes[key] = datetime.fromisoformat(value) if type(default_value) is datetime and value is not None else value
+    return codec.decode(attributes)
 
 
 def save_as_json_file(obj, file_path) -> None:
     """
     Saves an object to a JSON file, but includes the type of the non-simple objects for them to beproperly deserialized.
     """
-    # Create path and file if they don't exist
+    write_text_file_atomically(file_path, to_encoded_json(obj))
+
+
+def write_text_file_atomically(file_path, text: str) -> None:
+    """
+    Writes a text file through a temporary file that then replaces it, so that readers and crashes never see a partially written file.
+    """
+    # Create path if it doesn't exist
     file_path = os.path.abspath(file_path)
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
-    with open(file_path, "w") as file:
-        file.write(to_encoded_json(obj))
+    # The temporary file has to be on the same file system for the replacement to be atomic
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix=os.path.basename(file_path), suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "w") as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
 
 
 def load_from_json_file(file_path) -> object:
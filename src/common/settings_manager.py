@@ -13,6 +13,32 @@ class Settings:
     general_interval: int = 60
     general_log_level: str = "INFO"
     general_theme: str = "light"
+    monitoring_max_parallel_executions: int = 8
+    monitoring_worker_processes: int = 0
+    monitoring_stagger_start_times: bool = True
+    monitoring_max_jitter_seconds: int = 0
+    monitoring_retries_backoff_factor: float = 2.0
+    monitoring_retries_jitter_percent: int = 10
+    monitoring_save_delay_seconds: int = 5
+    queries_max_concurrent_requests_per_host: int = 4
+    queries_max_requests_per_minute_per_host: int = 0
+    queries_rate_limit_burst_per_host: int = 5
+    queries_max_connections_per_host: int = 8
+    queries_keep_alive_seconds: int = 30
+    history_backend: str = "jsonl"
+    history_jsonl_compact_format: bool = False
+    history_write_delay_ms: int = 1000
+    history_write_batch_size: int = 500
+    history_fsync_policy: str = "on_exit"
+    history_max_open_files: int = 256
+    history_raw_retention_days: int = 30
+    history_minute_rollups_retention_days: int = 90
+    history_hour_rollups_retention_days: int = 365
+    history_compaction_interval_minutes: int = 60
+    logs_structured_format: bool = False
+    logs_max_file_size_mb: int = 10
+    logs_max_file_age_days: int = 30
+    logs_rotated_files_kept: int = 5
     alerts_use_toast: bool = True
     alerts_use_email: bool = False
     alerts_use_sms: bool = False
@@ -77,13 +103,94 @@ def save_configs():
     yaml_data.yaml_set_comment_before_after_key("general_interval", before="\n")
     yaml_data.yaml_set_comment_before_after_key("general_log_level", before="\n")
     yaml_data.yaml_set_comment_before_after_key("general_theme", before="\n")
+    yaml_data.yaml_set_comment_before_after_key("monitoring_max_parallel_executions", before="\n")
+    yaml_data.yaml_set_comment_before_after_key("queries_max_concurrent_requests_per_host", before="\n")
+    yaml_data.yaml_set_comment_before_after_key("history_backend", before="\n")
+    yaml_data.yaml_set_comment_before_after_key("logs_structured_format", before="\n")
     yaml_data.yaml_set_comment_before_after_key("alerts_use_toast", before="\n")
     yaml_data.yaml_set_comment_before_after_key("smtp_server", before="\n")
 
     # Add "internal" comments
-    yaml_data.yaml_set_comment_before_after_key("general_interval", before='Integer in seconds that defines the monitoring "ticking rate"')
+    yaml_data.yaml_set_comment_before_after_key("general_interval", before="Integer in seconds, maximum time the monitoring loop sleeps before re-checking its schedule")
     yaml_data.yaml_set_comment_before_after_key("general_log_level", before='One of "DEBUG", "INFO", "WARNING", "ERROR"')
     yaml_data.yaml_set_comment_before_after_key("general_theme", before='"light" or "dark"')
+    yaml_data.yaml_set_comment_before_after_key(
+        "monitoring_max_parallel_executions", before="Maximum number of monitors executed concurrently by the background monitoring engine"
+    )
+    yaml_data.yaml_set_comment_before_after_key(
+        "monitoring_worker_processes",
+        before="Number of processes the monitors are spread across to use multiple cores, 0 to run them in the application process",
+    )
+    yaml_data.yaml_set_comment_before_after_key(
+        "monitoring_stagger_start_times", before="Spread monitors sharing the same period evenly across it, instead of running them all at once"
+    )
+    yaml_data.yaml_set_comment_before_after_key(
+        "monitoring_max_jitter_seconds", before="Upper bound in seconds of a random delay added to each run (0 to disable), capped to the monitor's period"
+    )
+    yaml_data.yaml_set_comment_before_after_key(
+        "monitoring_retries_backoff_factor",
+        before="Each retry of a failed check waits this many times longer than the previous one, starting from the monitor's retry interval",
+    )
+    yaml_data.yaml_set_comment_before_after_key("monitoring_retries_jitter_percent", before="Randomly spreads retry delays by up to this percentage")
+    yaml_data.yaml_set_comment_before_after_key(
+        "monitoring_save_delay_seconds", before="Monitors' state is saved to disk in batches, at most this many seconds after it changed"
+    )
+    yaml_data.yaml_set_comment_before_after_key(
+        "queries_max_concurrent_requests_per_host",
+        before="Limits shared by all queries targeting the same host (scheme + host + port), 0 to disable\nMaximum number of requests in flight at once per host",
+    )
+    yaml_data.yaml_set_comment_before_after_key("queries_max_requests_per_minute_per_host", before="Sustained request rate per host")
+    yaml_data.yaml_set_comment_before_after_key("queries_rate_limit_burst_per_host", before="Requests per host allowed in a burst above the sustained rate")
+    yaml_data.yaml_set_comment_before_after_key(
+        "queries_max_connections_per_host", before="Maximum number of connections open at once per host, reused from one request to the next"
+    )
+    yaml_data.yaml_set_comment_before_after_key(
+        "queries_keep_alive_seconds", before="Integer in seconds, how long an unused connection is kept open, 0 to open a new connection for every request"
+    )
+    yaml_data.yaml_set_comment_before_after_key(
+        "history_backend",
+        before='Where monitors\' results are stored: "jsonl" (one text file per monitor in data/history), "sqlite" (indexed database)\n'
+        'or "binary" (compact fixed-size records, fastest stats over long periods, even more so with NumPy installed)\n'
+        "After switching, run the application once with --migrate-history to import the jsonl history into the new backend",
+    )
+    yaml_data.yaml_set_comment_before_after_key(
+        "history_jsonl_compact_format",
+        before="With the jsonl backend, write results as arrays of values without attribute names nor types: about half the size and faster to read\n"
+        "Files can hold both formats, so it can be switched at any time",
+    )
+    yaml_data.yaml_set_comment_before_after_key(
+        "history_write_delay_ms",
+        before="With the jsonl backend, results are written in batches: at most this many milliseconds after they come in",
+    )
+    yaml_data.yaml_set_comment_before_after_key("history_write_batch_size", before="Or as soon as this many results are waiting")
+    yaml_data.yaml_set_comment_before_after_key(
+        "history_fsync_policy",
+        before='"batch" to force each batch to disk (results survive a power failure, at the cost of a disk flush per batch)\n'
+        'or "on_exit" to leave it to the operating system until the application exits, when pending results are always written and synced',
+    )
+    yaml_data.yaml_set_comment_before_after_key("history_max_open_files", before="History files kept open between batches")
+    yaml_data.yaml_set_comment_before_after_key(
+        "history_raw_retention_days",
+        before="Retention in days, 0 to keep forever. Older results are summarized in per-minute, per-hour and per-day rollups\n"
+        "(count, passes, latency min/avg/max/percentiles), which keep long-term stats available once the results are deleted\n"
+        "Every result is kept for this many days",
+    )
+    yaml_data.yaml_set_comment_before_after_key("history_minute_rollups_retention_days", before="Then per-minute rollups for this many days")
+    yaml_data.yaml_set_comment_before_after_key("history_hour_rollups_retention_days", before="Then per-hour rollups for this many days, per-day rollups are kept forever")
+    yaml_data.yaml_set_comment_before_after_key(
+        "history_compaction_interval_minutes", before="Integer in minutes, how often the rollups are updated and the retention applied, in the background"
+    )
+    yaml_data.yaml_set_comment_before_after_key(
+        "logs_structured_format",
+        before="Write log entries as JSON objects (timestamp, level, monitor, message...) instead of text, e.g. to process the logs with other tools\n"
+        "Both formats are read and displayed the same way, the existing entries are kept as they are",
+    )
+    yaml_data.yaml_set_comment_before_after_key(
+        "logs_max_file_size_mb", before="Log files are rotated once larger than this many megabytes (0 to disable), or older than logs_max_file_age_days (0 to disable)"
+    )
+    yaml_data.yaml_set_comment_before_after_key(
+        "logs_rotated_files_kept", before="Rotated log files are compressed, only this many are kept per log file, the oldest ones are deleted"
+    )
     yaml_data.yaml_set_comment_before_after_key("alerts_use_toast", before="Enable/disable alerts per type")
     yaml_data.yaml_set_comment_before_after_key(
         "smtp_server",
@@ -120,7 +227,10 @@ def apply_Settings_dictionary(dictionary: dict):
     """
     for key, value in dictionary.items():
         if hasattr(settings, key):  # If it's a known setting
-            if isinstance(value, type(getattr(settings, key))):  # If it's the right type
+            default_value = getattr(settings, key)
+            if isinstance(default_value, float) and isinstance(value, int) and not isinstance(value, bool):
+                value = float(value)  # YAML loads whole numbers as int, e.g. "2" for a float setting
+            if isinstance(value, type(default_value)):  # If it's the right type
                 setattr(settings, key, value)  # Set the value
             else:
                 # Actual setting, but wrong type, don't load
@@ -1,5 +1,10 @@
-from queue import Empty, LifoQueue
+from dataclasses import dataclass
+import heapq
+import itertools
+from queue import Empty, Full, LifoQueue
 from enum import Enum, auto
+import threading
+import time
 from typing import Any
 from common.custom_logging import get_general_logger
 
@@ -11,6 +16,7 @@ class QueueEvents(Enum):
 
     OPEN_GUI = auto()
     EXIT_APP = auto()
+    SCHEDULE_CHANGED = auto()  # E.g. a monitor was rescheduled earlier than the background loop's next wake up
     NO_EVENT = auto()  # E.g. it timed out and was still empty
 
 
@@ -73,3 +79,122 @@ class SimpleQueue:
         except Exception as e:
             get_general_logger().error(f"Queue get failed: {e}")
             return QueueEvents.NO_EVENT
+
+
+@dataclass
+class EventQueueStats:
+    depth: int  # Events currently waiting
+    max_depth: int  # Highest depth reached since the queue was created
+    coalesced_count: int  # Events not added because an identical one was already waiting
+    last_wait_s: float | None  # Time the last dequeued event spent in the queue
+    average_wait_s: float | None  # Average time dequeued events spent in the queue
+
+
+class EventQueue:
+    """
+    Lossless bounded priority queue, for threads that must not miss any request (e.g. the background monitoring loop).
+    - Events are dequeued by priority, then in FIFO order: EXIT_APP first, then payloads (e.g. manual monitor executions),
+      then the other QueueEvents (e.g. SCHEDULE_CHANGED wake ups).
+    - An event identical to one already waiting is coalesced into it instead of being added again,
+      so e.g. clicking "Run now" twice before the first click was handled only executes the monitor once.
+    - When full, "put" blocks until there is room (backpressure) instead of dropping events. EXIT_APP is always accepted.
+    """
+
+    def __init__(self, maxsize: int = 1000) -> None:
+        self.__maxsize = maxsize
+        self.__heap: list[tuple[int, int, float, Any]] = []  # (priority, sequence number, enqueue time, event)
+        self.__pending_events = set()
+        self.__sequence = itertools.count()  # FIFO order within a priority
+        self.__condition = threading.Condition()
+        self.__allowed_types = {QueueEvents}
+        self.__max_depth = 0
+        self.__coalesced_count = 0
+        self.__last_wait_s: float | None = None
+        self.__total_wait_s = 0.0
+        self.__dequeued_count = 0
+
+    def add_allowed_event_type(self, event_type: type) -> None:
+        """
+        Add a type for the queue to be allowed to handle other than the default QueueEvents.
+        """
+        self.__allowed_types.add(event_type)
+
+    def is_allowed_event_type(self, object) -> bool:
+        """
+        Check if the object is an allowed type for the queue.
+        """
+        return type(object) in self.__allowed_types
+
+    def put_nowait(self, event: Any) -> None:
+        """
+        Put a payload into the queue.
+        :raises Full: If the queue is full
+        """
+        self.put(event, timeout_s=0)
+
+    def put(self, event: Any, timeout_s: float = None) -> None:
+        """
+        Put a payload into the queue, waiting for room if it is full.
+        :param timeout_s: Maximum time to wait for room, forever if None
+        :raises Full: If there was still no room after timeout_s
+        """
+        if not self.is_allowed_event_type(event):
+            get_general_logger().error(f"Invalid payload {event}. Expected types: {self.__allowed_types}")
+            raise TypeError(f"Invalid payload {event}. Expected types: {self.__allowed_types}")
+
+        with self.__condition:
+            if event in self.__pending_events:
+                self.__coalesced_count += 1
+                get_general_logger().debug("Event %s is already queued, coalesced with the waiting one", event)
+                return
+
+            if event != QueueEvents.EXIT_APP:
+                has_room = self.__condition.wait_for(lambda: len(self.__heap) < self.__maxsize, timeout=timeout_s)
+                if not has_room:
+                    raise Full(f"Queue is full ({self.__maxsize} events), could not put {event}")
+
+            heapq.heappush(self.__heap, (self.__get_priority(event), next(self.__sequence), time.monotonic(), event))
+            self.__pending_events.add(event)
+            self.__max_depth = max(self.__max_depth, len(self.__heap))
+            self.__condition.notify_all()
+
+    def get(self, timeout_s: float = None) -> Any:
+        """
+        Get the highest priority payload from the queue. Caller blocks until a payload is available.
+        Returns QueueEvents.NO_EVENT if none was received before timeout_s.
+        """
+        with self.__condition:
+            if not self.__condition.wait_for(lambda: len(self.__heap) > 0, timeout=timeout_s):
+                return QueueEvents.NO_EVENT
+
+            _, _, enqueue_time, event = heapq.heappop(self.__heap)
+            self.__pending_events.discard(event)
+            self.__last_wait_s = time.monotonic() - enqueue_time
+            self.__total_wait_s += self.__last_wait_s
+            self.__dequeued_count += 1
+            self.__condition.notify_all()  # Wake up producers waiting for room
+            return event
+
+    def qsize(self) -> int:
+        """Returns the number of events currently waiting."""
+        with self.__condition:
+            return len(self.__heap)
+
+    def get_stats(self) -> EventQueueStats:
+        with self.__condition:
+            return EventQueueStats(
+                depth=len(self.__heap),
+                max_depth=self.__max_depth,
+                coalesced_count=self.__coalesced_count,
+                last_wait_s=self.__last_wait_s,
+                average_wait_s=self.__total_wait_s / self.__dequeued_count if self.__dequeued_count else None,
+            )
+
+    @staticmethod
+    def __get_priority(event: Any) -> int:
+        """Lower is dequeued first."""
+        if event == QueueEvents.EXIT_APP:
+            return 0
+        if not isinstance(event, QueueEvents):
+            return 1  # Payloads are requests from the user, e.g. executing a monitor now
+        return 2
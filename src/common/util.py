@@ -5,8 +5,7 @@ import zipfile
 import pathvalidate
 from importlib import import_module
 from urllib.parse import urlparse
-from common.custom_logging import get_general_logger
-import common.mediator as mediator
+from common.custom_logging import flush as flush_logs, get_general_logger
 from common.simple_queue import QueueEvents
 
 
@@ -118,6 +117,7 @@ def export_app_config_and_logs_to_zip():
     subdirectory = "exports"
     output_path = resolve_relative_path(subdirectory + "/" + filename)
     get_general_logger().debug(f"Exporting app data and logs to {output_path}")
+    flush_logs()  # Logs are written in the background, make sure the files are complete
     with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zipf:
         for folder in folders:
             for root, _, files in os.walk(folder):
@@ -154,6 +154,7 @@ def import_app_config_and_logs_from_zip():
     from tkinter import Tk
     from tkinter.filedialog import askopenfilename
     from tkinter import messagebox
+    import common.mediator as mediator  # Imported here, the mediator imports the monitors which import this module
 
     # Tk().withdraw()  # Prevents the root window from appearing
     filepath = askopenfilename(title="Select the BUMP export ZIP file to import", filetypes=[("ZIP files", "*.zip")], initialdir=initial_folder)
@@ -8,6 +8,10 @@ import { requestLogEntries, requestMonitorsList } from "./PythonJsBridge.js";
  */
 export class DashboardPanel extends BaseComponent {
   static LOG_ENTRIES_LIMIT = 100; // The maximum number of log entries to fetch and display on the dashboard
+  static LOG_TIMESTAMP_LENGTH = "2024-12-07 15:27:14,060".length; // Log entries start with their timestamp
+
+  #newestLogTimestamp = null; // Timestamp of the most recent log entry displayed
+  #newestLogEntries = new Set(); // The log entries displayed with that timestamp
 
   constructor(parentSelector, monitorListResponseDataData) {
     super(parentSelector, "dashboard-column", "fragments/dashboard-panel.html");
@@ -41,93 +45,48 @@ export class DashboardPanel extends BaseComponent {
   }
 
   #updateRecentEvents() {
-    requestLogEntries(DashboardPanel.LOG_ENTRIES_LIMIT)
+    // After the first request, only the entries logged since the most recent one displayed are requested
+    requestLogEntries(DashboardPanel.LOG_ENTRIES_LIMIT, this.#newestLogTimestamp)
       .then((response) => {
         if (!response) {
           console.error("Failed to fetch log entries");
           return;
         }
 
-        //TODO - Add entires until we reach one that is already displayed, then stop?
-
-        // Clear the existing log entries
         const recentEvents = document.querySelector(".recent-events");
         const scrollTop = recentEvents.parentElement.scrollTop; // Save the current scroll position
-        recentEvents.innerHTML = "";
-
-        function formatLogEntryElement(logEntryElement, rawText) {
-          // Kinda jank/fragile method of applying color and formatting to log entries
-          // TODO - Come up with a more robust system than regex... tight coupling between string formats... at least it's visual-only
-          let processedText = rawText;
-
-          // Trim the timestamp to make it slightly easier to read (e.g. from "2024-12-07 15:27:14,060 " to "2024-12-07 15:27:14 ")
-          const timestampRegex = /^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}/;
-          const timestampMatch = processedText.match(timestampRegex);
-          if (timestampMatch) {
-            const trimmedTimestamp = timestampMatch[0].replace(/,\d{3}$/, ""); // Remove milliseconds
-            processedText = processedText.replace(timestampRegex, trimmedTimestamp);
-          }
-
-          // Remove the module:line part of the log entry for anything that isn't a ERROR/CRITICAL
-          // E.g. " (monitor.log_monitor_event:ln96) "
-          if (!processedText.includes("[ERROR]") && !processedText.includes("[CRITICAL]")) {
-            const moduleLineRegex = /\s\(.+:.*?\d+\)\s/;
-            const moduleLineMatch = processedText.match(moduleLineRegex);
-            if (moduleLineMatch) {
-              processedText = processedText.replace(moduleLineRegex, " ");
-            }
-          }
-
-          // Apply color to the log level and remove it from the text
-          const logLevelRegex = /(\[DEBUG\]|\[INFO\]|\[WARNING\]|\[ERROR\]|\[CRITICAL\])/;
-          const logLevelMatch = processedText.match(logLevelRegex);
-          if (logLevelMatch) {
-            const logLevel = logLevelMatch[0].replace(/\[|\]/g, "");
-            logEntryElement.setAttribute("data-log-level", logLevel.toLowerCase());
-            processedText = processedText.replace(logLevelRegex, "");
-          } else {
-            logEntryElement.setAttribute("data-log-level", "info");
-          }
-
-          // HACK - Apply special case coloring for good/bad monitoring events
-          if (processedText.includes("onitor is back online")) {
-            logEntryElement.setAttribute("data-extra-event-type", "good");
-          }
-          if (processedText.includes("onitor is down")) {
-            logEntryElement.setAttribute("data-extra-event-type", "bad");
-          }
 
-          // Apply the text to the element
-          logEntryElement.innerText = processedText;
+        // The entries logged at the exact timestamp of the previous request are sent again, skip the ones already displayed
+        const newEntries = response.filter(
+          (rawText) => this.#getLogEntryTimestamp(rawText) !== this.#newestLogTimestamp || !this.#newestLogEntries.has(rawText)
+        );
+        if (this.#newestLogTimestamp === null) {
+          recentEvents.innerHTML = "";
         }
 
-        // Add the new log entries
-        for (let i = 0; i < response.length; i++) {
+        // Add the new log entries on top, most recent first
+        const firstExistingElement = recentEvents.firstChild;
+        for (const rawText of newEntries) {
           const newElement = document.createElement("div");
           newElement.className = "recent-events-item";
-          formatLogEntryElement(newElement, response[i]);
+          this.#formatLogEntryElement(newElement, rawText);
 
-          recentEvents.appendChild(newElement);
+          recentEvents.insertBefore(newElement, firstExistingElement);
+          this.#addFoldingBehavior(newElement);
+        }
 
-          //If the text inside newElement overflows, add a data-text-overflows attribute to it
-          if (newElement.scrollHeight > newElement.clientHeight) {
-            newElement.setAttribute("data-text-overflows", "true");
-          }
+        // Keep the most recent ones only
+        while (recentEvents.children.length > DashboardPanel.LOG_ENTRIES_LIMIT) {
+          recentEvents.lastChild.remove();
+        }
 
-          //Folding/unfolding behavior for long log entries
-          this.addManagedEventListener(newElement, "click", () => {
-            if (newElement.getAttribute("data-text-overflows") === "true") {
-              //If it has the class ".expanded", remove it, otherwise, add it
-              newElement.classList.toggle("expanded");
-
-              //If it has the class now has ".expanded", apply a new max-height calculated from its scrollHeight, to fix the animation
-              if (newElement.classList.contains("expanded")) {
-                newElement.style.maxHeight = `${newElement.scrollHeight}px`;
-              } else {
-                newElement.style.maxHeight = "1.4rem";
-              }
-            }
-          });
+        if (newEntries.length > 0) {
+          const newestTimestamp = this.#getLogEntryTimestamp(newEntries[0]);
+          if (newestTimestamp !== this.#newestLogTimestamp) {
+            this.#newestLogEntries.clear();
+          }
+          this.#newestLogTimestamp = newestTimestamp;
+          newEntries.filter((rawText) => this.#getLogEntryTimestamp(rawText) === newestTimestamp).forEach((rawText) => this.#newestLogEntries.add(rawText));
         }
 
         // Restore the scroll position
@@ -138,6 +97,78 @@ export class DashboardPanel extends BaseComponent {
       });
   }
 
+  #getLogEntryTimestamp(rawText) {
+    return rawText.substring(0, DashboardPanel.LOG_TIMESTAMP_LENGTH);
+  }
+
+  #formatLogEntryElement(logEntryElement, rawText) {
+    // Kinda jank/fragile method of applying color and formatting to log entries
+    // TODO - Come up with a more robust system than regex... tight coupling between string formats... at least it's visual-only
+    let processedText = rawText;
+
+    // Trim the timestamp to make it slightly easier to read (e.g. from "2024-12-07 15:27:14,060 " to "2024-12-07 15:27:14 ")
+    const timestampRegex = /^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}/;
+    const timestampMatch = processedText.match(timestampRegex);
+    if (timestampMatch) {
+      const trimmedTimestamp = timestampMatch[0].replace(/,\d{3}$/, ""); // Remove milliseconds
+      processedText = processedText.replace(timestampRegex, trimmedTimestamp);
+    }
+
+    // Remove the module:line part of the log entry for anything that isn't a ERROR/CRITICAL
+    // E.g. " (monitor.log_monitor_event:ln96) "
+    if (!processedText.includes("[ERROR]") && !processedText.includes("[CRITICAL]")) {
+      const moduleLineRegex = /\s\(.+:.*?\d+\)\s/;
+      const moduleLineMatch = processedText.match(moduleLineRegex);
+      if (moduleLineMatch) {
+        processedText = processedText.replace(moduleLineRegex, " ");
+      }
+    }
+
+    // Apply color to the log level and remove it from the text
+    const logLevelRegex = /(\[DEBUG\]|\[INFO\]|\[WARNING\]|\[ERROR\]|\[CRITICAL\])/;
+    const logLevelMatch = processedText.match(logLevelRegex);
+    if (logLevelMatch) {
+      const logLevel = logLevelMatch[0].replace(/\[|\]/g, "");
+      logEntryElement.setAttribute("data-log-level", logLevel.toLowerCase());
+      processedText = processedText.replace(logLevelRegex, "");
+    } else {
+      logEntryElement.setAttribute("data-log-level", "info");
+    }
+
+    // HACK - Apply special case coloring for good/bad monitoring events
+    if (processedText.includes("onitor is back online")) {
+      logEntryElement.setAttribute("data-extra-event-type", "good");
+    }
+    if (processedText.includes("onitor is down")) {
+      logEntryElement.setAttribute("data-extra-event-type", "bad");
+    }
+
+    // Apply the text to the element
+    logEntryElement.innerText = processedText;
+  }
+
+  #addFoldingBehavior(newElement) {
+    //If the text inside newElement overflows, add a data-text-overflows attribute to it
+    if (newElement.scrollHeight > newElement.clientHeight) {
+      newElement.setAttribute("data-text-overflows", "true");
+    }
+
+    //Folding/unfolding behavior for long log entries
+    this.addManagedEventListener(newElement, "click", () => {
+      if (newElement.getAttribute("data-text-overflows") === "true") {
+        //If it has the class ".expanded", remove it, otherwise, add it
+        newElement.classList.toggle("expanded");
+
+        //If it has the class now has ".expanded", apply a new max-height calculated from its scrollHeight, to fix the animation
+        if (newElement.classList.contains("expanded")) {
+          newElement.style.maxHeight = `${newElement.scrollHeight}px`;
+        } else {
+          newElement.style.maxHeight = "1.4rem";
+        }
+      }
+    });
+  }
+
   #updateSummaryCard(monitorListResponseData) {
     let upCount = 0;
     let downCount = 0;
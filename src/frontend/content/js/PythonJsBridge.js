@@ -113,14 +113,15 @@ export async function requestMonitorHistory(monitorName, numberOfResults) {
 }
 
 /**
- * Request a number of application log entries
+ * Request a number of application log entries, most recent first
  * @param {number} numberOfEntries
+ * @param {string|null} since - Only request the entries logged at or after this timestamp (e.g. "2024-12-07 15:27:14,060")
  * @returns {Promise<Array<Object>>} Array of objects, each containing the log entry under its 'value' property
  */
-export async function requestLogEntries(numberOfEntries) {
+export async function requestLogEntries(numberOfEntries, since = null) {
   // Signature for reference:
-  // request_log_entries(self, max_number_of_entries: int, min_level: str = "INFO", include_general: bool = True, include_monitoring: bool = True)
-  const response = await pywebview.api.request_log_entries(numberOfEntries, "INFO", true, true);
+  // request_log_entries(self, max_number_of_entries: int, min_level: str = "INFO", include_general: bool = True, include_monitoring: bool = True, since: str | None = None)
+  const response = await pywebview.api.request_log_entries(numberOfEntries, "INFO", true, true, since);
   return response;
 }
 
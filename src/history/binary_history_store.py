@@ -0,0 +1,308 @@
+"""
+Compact binary history backend: fixed-width records read through mmap, and as NumPy arrays when NumPy is installed,
+so that stats over long periods are vectorized instead of decoding every result one by one.
+
+Files per monitor, in data/history:
+    <unique_name>.bin: a header, then one RECORD_FORMAT record per result, in chronological order
+    <unique_name>.strings: the interned strings (messages, reasons, exception types), one JSON string per line, ids are line numbers
+"""
+
+import bisect
+from datetime import datetime
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+
+from common.custom_logging import get_general_logger
+from history.history_store import HistoryAggregate, HistoryStore, rewrite_file_without_range
+from history.jsonl_history_store import HISTORY_DIRECTORY
+from queries.query_result import QueryResult
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # Optional, aggregates fall back to decoding the records with struct
+
+FILE_MAGIC = b"BUMPHIST"
+FILE_VERSION = 1
+# start_time, end_time (POSIX timestamps), test_passed (-1 if unknown), padding, retries, code_or_status, message id, reason id,
+# exception type id (-1 if None), queue_wait_seconds (NaN if None)
+RECORD_FORMAT = struct.Struct("<ddbxhiiiif")
+RECORD_SIZE = RECORD_FORMAT.size
+HEADER_SIZE = RECORD_SIZE  # Keeps the records aligned on their size
+END_TIME_OFFSET = 8
+NO_VALUE = -1
+
+if numpy is not None:
+    RECORD_DTYPE = numpy.dtype(
+        [
+            ("start_time", "<f8"),
+            ("end_time", "<f8"),
+            ("test_passed", "i1"),
+            ("padding", "V1"),
+            ("retries", "<i2"),
+            ("code_or_status", "<i4"),
+            ("message_id", "<i4"),
+            ("reason_id", "<i4"),
+            ("exception_type_id", "<i4"),
+            ("queue_wait_seconds", "<f4"),
+        ]
+    )
+    assert RECORD_DTYPE.itemsize == RECORD_SIZE
+
+
+class _StringTable:
+    """A monitor's interned strings, loaded from its .strings file on first use and appended to as new strings come in."""
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self.__strings: list[str] = []
+        self.__ids: dict[str, int] = {}
+        self.__loaded_size = 0
+
+    def get_id(self, string: str | None) -> int:
+        if string is None:
+            return NO_VALUE
+        self.__load_new_strings()
+        if string not in self.__ids:
+            with open(self.file_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(string) + "\n")
+            self.__add(string)
+            self.__loaded_size = os.path.getsize(self.file_path)
+        return self.__ids[string]
+
+    def get_string(self, string_id: int) -> str | None:
+        if string_id == NO_VALUE:
+            return None
+        if string_id >= len(self.__strings):
+            self.__load_new_strings()  # Appended by another process
+        return self.__strings[string_id] if string_id < len(self.__strings) else None
+
+    def __load_new_strings(self) -> None:
+        if not os.path.exists(self.file_path) or os.path.getsize(self.file_path) == self.__loaded_size:
+            return
+        with open(self.file_path, "r", encoding="utf-8") as f:
+            f.seek(self.__loaded_size)
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # Being written by another process
+                self.__add(json.loads(line))
+                self.__loaded_size += len(line.encode("utf-8"))
+
+    def __add(self, string: str) -> None:
+        self.__ids.setdefault(string, len(self.__strings))
+        self.__strings.append(string)
+
+
+class BinaryHistoryStore(HistoryStore):
+    """
+    ~40 bytes per result instead of ~400 in JSONL. Time windows are found by binary search on the records' end times,
+    and aggregates are computed on the raw columns.
+    """
+
+    def __init__(self) -> None:
+        self.__string_tables: dict[str, _StringTable] = {}
+        self.__lock = threading.RLock()  # Guards the string tables, which are shared by appends and reads
+
+    def append(self, unique_name: str, query_result: QueryResult) -> None:
+        try:
+            with self.__lock:
+                self.create(unique_name)
+                strings = self.__get_string_table(unique_name)
+                record = RECORD_FORMAT.pack(
+                    query_result.start_time.timestamp(),
+                    query_result.end_time.timestamp(),
+                    NO_VALUE if query_result.test_passed is None else int(query_result.test_passed),
+                    NO_VALUE if query_result.retries is None else query_result.retries,
+                    NO_VALUE if query_result.code_or_status is None else query_result.code_or_status,
+                    strings.get_id(query_result.message),  # Strings are written before the record referencing them
+                    strings.get_id(query_result.reason),
+                    strings.get_id(query_result.exception_type),
+                    math.nan if query_result.queue_wait_seconds is None else query_result.queue_wait_seconds,
+                )
+                with open(self.get_file_path(unique_name), "ab") as f:
+                    f.write(record)
+        except Exception as e:
+            get_general_logger().error(f"Error while appending query result to history: {e}")
+
+    def read_last(self, unique_name: str, count: int) -> list[QueryResult]:
+        with self.__map_records(unique_name) as records:
+            record_count = len(records) // RECORD_SIZE
+            return self.__decode_records(unique_name, records, max(0, record_count - count), record_count)
+
+    def read_range(self, unique_name: str, since: datetime, until: datetime | None = None) -> list[QueryResult]:
+        with self.__map_records(unique_name) as records:
+            first, last = self.__find_range(records, since, until)
+            return self.__decode_records(unique_name, records, first, last)
+
+    def aggregate(self, unique_name: str, since: datetime, until: datetime | None = None) -> HistoryAggregate:
+        with self.__map_records(unique_name) as records:
+            first, last = self.__find_range(records, since, until)
+            if first >= last:
+                return HistoryAggregate()
+            if numpy is None:
+                return self.__aggregate_records(records[first * RECORD_SIZE : last * RECORD_SIZE])
+
+            columns = numpy.frombuffer(records, dtype=RECORD_DTYPE, count=last - first, offset=first * RECORD_SIZE)
+            end_times = columns["end_time"]
+            passed = columns["test_passed"] == 1
+            failed = columns["test_passed"] == 0
+            aggregate = HistoryAggregate(
+                count=len(columns),
+                passed_count=int(numpy.count_nonzero(passed)),
+                average_latency_seconds=float(numpy.mean(end_times - columns["start_time"])),
+                first_end_time=datetime.fromtimestamp(end_times[0]),
+                last_passed_end_time=datetime.fromtimestamp(end_times[passed][-1]) if passed.any() else None,
+                last_failed_end_time=datetime.fromtimestamp(end_times[failed][-1]) if failed.any() else None,
+            )
+            del columns, end_times  # Views on the map, which cannot be closed while they exist
+            return aggregate
+
+    @staticmethod
+    def __aggregate_records(records: memoryview) -> HistoryAggregate:
+        """Without NumPy, still avoids building a QueryResult per record."""
+        aggregate = HistoryAggregate()
+        latency_sum = 0
+        for start_time, end_time, test_passed, *_ in RECORD_FORMAT.iter_unpack(records):
+            if aggregate.first_end_time is None:
+                aggregate.first_end_time = end_time
+            aggregate.count += 1
+            latency_sum += end_time - start_time
+            if test_passed == 1:
+                aggregate.passed_count += 1
+                aggregate.last_passed_end_time = end_time
+            elif test_passed == 0:
+                aggregate.last_failed_end_time = end_time
+        aggregate.average_latency_seconds = latency_sum / aggregate.count
+        for attribute in ("first_end_time", "last_passed_end_time", "last_failed_end_time"):
+            timestamp = getattr(aggregate, attribute)
+            setattr(aggregate, attribute, datetime.fromtimestamp(timestamp) if timestamp is not None else None)
+        return aggregate
+
+    def create(self, unique_name: str) -> None:
+        target_path = self.get_file_path(unique_name)
+        if not os.path.exists(target_path):
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            with open(target_path, "wb") as f:
+                f.write(FILE_MAGIC + struct.pack("<H", FILE_VERSION).ljust(HEADER_SIZE - len(FILE_MAGIC), b"\0"))
+
+    def rename(self, old_unique_name: str, new_unique_name: str) -> None:
+        with self.__lock:
+            for extension in (".bin", ".strings"):
+                old_path = f"{HISTORY_DIRECTORY}/{old_unique_name}{extension}"
+                if os.path.exists(old_path):
+                    os.rename(old_path, f"{HISTORY_DIRECTORY}/{new_unique_name}{extension}")
+            self.__string_tables.pop(old_unique_name, None)
+
+    def delete(self, unique_name: str) -> None:
+        with self.__lock:
+            for extension in (".bin", ".strings"):
+                target_path = f"{HISTORY_DIRECTORY}/{unique_name}{extension}"
+                if os.path.exists(target_path):
+                    os.remove(target_path)
+            self.__string_tables.pop(unique_name, None)
+        get_general_logger().debug(f"Monitor {unique_name} history file deleted.")
+
+    def delete_before(self, unique_name: str, before: datetime) -> int:
+        with self.__lock:  # Appends wait, they would be lost in the rewrite
+            with self.__map_records(unique_name) as records:
+                deleted_count, _ = self.__find_range(records, before, None)
+            if deleted_count > 0:
+                rewrite_file_without_range(self.get_file_path(unique_name), HEADER_SIZE, HEADER_SIZE + deleted_count * RECORD_SIZE)
+        return deleted_count
+
+    def count(self, unique_name: str) -> int:
+        target_path = self.get_file_path(unique_name)
+        return max(0, os.path.getsize(target_path) - HEADER_SIZE) // RECORD_SIZE if os.path.exists(target_path) else 0
+
+    @staticmethod
+    def get_file_path(unique_name: str) -> str:
+        return f"{HISTORY_DIRECTORY}/{unique_name}.bin"
+
+    def __get_string_table(self, unique_name: str) -> _StringTable:
+        with self.__lock:
+            if unique_name not in self.__string_tables:
+                self.__string_tables[unique_name] = _StringTable(f"{HISTORY_DIRECTORY}/{unique_name}.strings")
+            return self.__string_tables[unique_name]
+
+    def __map_records(self, unique_name: str) -> "_MappedRecords":
+        return _MappedRecords(self.get_file_path(unique_name))
+
+    @staticmethod
+    def __find_range(records: memoryview, since: datetime, until: datetime | None) -> tuple[int, int]:
+        """Returns the [first, last) indexes of the records that ended within [since, until], by binary search as records are in chronological order."""
+        record_count = len(records) // RECORD_SIZE
+        end_times = _EndTimes(records, record_count)
+        first = bisect.bisect_left(end_times, since.timestamp())
+        last = record_count if until is None else bisect.bisect_right(end_times, until.timestamp(), lo=first)
+        return first, last
+
+    def __decode_records(self, unique_name: str, records: memoryview, first: int, last: int) -> list[QueryResult]:
+        strings = self.__get_string_table(unique_name)
+        results = []
+        with self.__lock:
+            for offset in range(first * RECORD_SIZE, last * RECORD_SIZE, RECORD_SIZE):
+                start_time, end_time, test_passed, retries, code_or_status, message_id, reason_id, exception_type_id, queue_wait_seconds = (
+                    RECORD_FORMAT.unpack_from(records, offset)
+                )
+                results.append(
+                    QueryResult(
+                        start_time=datetime.fromtimestamp(start_time),
+                        end_time=datetime.fromtimestamp(end_time),
+                        test_passed=None if test_passed == NO_VALUE else bool(test_passed),
+                        retries=None if retries == NO_VALUE else retries,
+                        code_or_status=None if code_or_status == NO_VALUE else code_or_status,
+                        message=strings.get_string(message_id),
+                        reason=strings.get_string(reason_id),
+                        exception_type=strings.get_string(exception_type_id),
+                        queue_wait_seconds=None if math.isnan(queue_wait_seconds) else queue_wait_seconds,
+                    )
+                )
+        return results
+
+
+class _EndTimes:
+    """Sequence view on the records' end times, for bisect."""
+
+    def __init__(self, records: memoryview, record_count: int) -> None:
+        self.__records = records
+        self.__record_count = record_count
+
+    def __len__(self) -> int:
+        return self.__record_count
+
+    def __getitem__(self, index: int) -> float:
+        return struct.unpack_from("<d", self.__records, index * RECORD_SIZE + END_TIME_OFFSET)[0]
+
+
+class _MappedRecords:
+    """
+    Context manager mapping a history file read-only, yielding a memoryview on its complete records (header excluded).
+    Yields an empty view if the file does not exist or has no records.
+    """
+
+    def __init__(self, file_path: str) -> None:
+        self.__file_path = file_path
+        self.__file = None
+        self.__map = None
+        self.__view = None
+
+    def __enter__(self) -> memoryview:
+        if not os.path.exists(self.__file_path) or os.path.getsize(self.__file_path) <= HEADER_SIZE:
+            return memoryview(b"")
+        self.__file = open(self.__file_path, "rb")
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        record_count = (len(self.__map) - HEADER_SIZE) // RECORD_SIZE  # A partially written last record is ignored
+        self.__view = memoryview(self.__map)[HEADER_SIZE : HEADER_SIZE + record_count * RECORD_SIZE]
+        return self.__view
+
+    def __exit__(self, *exception_info) -> None:
+        if self.__view is not None:
+            self.__view.release()
+        if self.__map is not None:
+            self.__map.close()
+        if self.__file is not None:
+            self.__file.close()
@@ -0,0 +1,108 @@
+"""
+Applies the history retention policy in the background, off the monitoring hot path:
+summarizes the raw results of past days in rollups, then deletes the raw results and rollups older than their retention.
+"""
+
+from datetime import datetime, timedelta
+import threading
+from typing import Callable
+
+from common.custom_logging import get_general_logger
+from common.settings_manager import settings
+from history.history_store import get_history_store
+from history.rollups import RESOLUTIONS, compute_rollups, get_bucket_start, get_rollup_store
+
+FIRST_COMPACTION_DELAY_S = 60  # Leaves the startup to the monitors
+
+
+class HistoryCompactor:
+    """
+    Compacts the history of the monitors returned by get_unique_names every settings.history_compaction_interval_minutes.
+    Only complete past days are rolled up, one day at a time so that memory use does not depend on the retention.
+    """
+
+    def __init__(self, get_unique_names: Callable[[], list[str]]) -> None:
+        self.__get_unique_names = get_unique_names
+        self.__stop_requested = threading.Event()
+        self.__thread: threading.Thread | None = None
+        self.__compaction_lock = threading.Lock()  # Held while a monitor is compacted
+        self.__forgotten_names: set[str] = set()  # Monitors to skip until the next pass, as their files were deleted or renamed
+
+    def start(self) -> None:
+        if settings.history_compaction_interval_minutes <= 0:
+            return
+        self.__thread = threading.Thread(target=self.__run, name="history-compactor", daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """Stops the background thread, waiting for the monitor being compacted if any."""
+        self.__stop_requested.set()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def forget(self, unique_name: str) -> None:
+        """
+        Waits until the monitor is not being compacted, and skips it for the rest of the current pass,
+        e.g. before its files are deleted or renamed, so that they are not recreated under its name.
+        """
+        with self.__compaction_lock:
+            self.__forgotten_names.add(unique_name)
+
+    def compact_all(self) -> None:
+        with self.__compaction_lock:
+            self.__forgotten_names.clear()  # The names are read again below
+        for unique_name in self.__get_unique_names():
+            if self.__stop_requested.is_set():
+                return
+            with self.__compaction_lock:
+                if unique_name in self.__forgotten_names:
+                    continue
+                try:
+                    self.compact(unique_name)
+                except Exception as e:
+                    get_general_logger().error(f"Error while compacting the history of monitor {unique_name}: {e}")
+
+    def compact(self, unique_name: str, now: datetime | None = None) -> None:
+        now = now or datetime.now()
+        history_store = get_history_store()
+        rollup_store = get_rollup_store()
+        today = get_bucket_start(now, "day")
+
+        watermark = rollup_store.get_watermark(unique_name)
+        if watermark is None:
+            first_end_time = history_store.aggregate(unique_name, datetime.fromtimestamp(0), today).first_end_time
+            watermark = get_bucket_start(first_end_time, "day") if first_end_time is not None else today
+            rollup_store.set_watermark(unique_name, watermark)  # Spares the full scan next time
+        rollup_store.delete_from(unique_name, watermark)  # Left over if the previous compaction was interrupted
+
+        rolled_up_days = 0
+        while watermark < today and not self.__stop_requested.is_set():
+            next_day = get_bucket_start(watermark + timedelta(days=1, hours=12), "day")  # Days are not all 24h long
+            results = [result for result in history_store.read_range(unique_name, watermark, next_day) if result.end_time < next_day]
+            for resolution in RESOLUTIONS:
+                rollup_store.append(unique_name, resolution, compute_rollups(results, resolution))
+            watermark = next_day
+            rollup_store.set_watermark(unique_name, watermark)
+            rolled_up_days += 1
+
+        deleted_count = 0
+        if settings.history_raw_retention_days > 0:
+            # Results are only deleted once rolled up
+            raw_cutoff = min(watermark, get_bucket_start(now - timedelta(days=settings.history_raw_retention_days), "day"))
+            deleted_count = history_store.delete_before(unique_name, raw_cutoff)
+
+        for resolution, retention_days in (
+            ("minute", settings.history_minute_rollups_retention_days),
+            ("hour", settings.history_hour_rollups_retention_days),
+        ):
+            if retention_days > 0:
+                rollup_store.delete_before(unique_name, resolution, get_bucket_start(now - timedelta(days=retention_days), "day"))
+
+        if rolled_up_days or deleted_count:
+            get_general_logger().debug(f"Monitor {unique_name} history compacted: {rolled_up_days} days rolled up, {deleted_count} results deleted.")
+
+    def __run(self) -> None:
+        delay_s = FIRST_COMPACTION_DELAY_S
+        while not self.__stop_requested.wait(delay_s):
+            self.compact_all()
+            delay_s = settings.history_compaction_interval_minutes * 60
@@ -0,0 +1,164 @@
+from dataclasses import dataclass
+from datetime import datetime
+import os
+import shutil
+import tempfile
+
+import common.serialization as serialization
+from common.custom_logging import get_general_logger
+from common.settings_manager import settings
+from queries.query_result import QueryResult
+
+
+@dataclass
+class HistoryAggregate:
+    """Summary of a monitor's results over a time window, computed by the store without returning every result."""
+
+    count: int = 0
+    passed_count: int = 0
+    average_latency_seconds: float = 0
+    first_end_time: datetime | None = None  # Oldest result in the window
+    last_passed_end_time: datetime | None = None  # Most recent passed result in the window
+    last_failed_end_time: datetime | None = None  # Most recent failed result in the window
+
+    @property
+    def uptime(self) -> float:
+        return self.passed_count / self.count if self.count > 0 else 0
+
+    def merge(self, other: "HistoryAggregate") -> None:
+        """Adds another window's aggregate to this one, e.g. to combine rollups with recent raw results."""
+        if other.count == 0:
+            return
+        total_count = self.count + other.count
+        self.average_latency_seconds = (self.average_latency_seconds * self.count + other.average_latency_seconds * other.count) / total_count
+        self.count = total_count
+        self.passed_count += other.passed_count
+        self.first_end_time = min(filter(None, (self.first_end_time, other.first_end_time)))
+        self.last_passed_end_time = max(filter(None, (self.last_passed_end_time, other.last_passed_end_time)), default=None)
+        self.last_failed_end_time = max(filter(None, (self.last_failed_end_time, other.last_failed_end_time)), default=None)
+
+
+class HistoryStore:
+    """
+    Abstract storage for the monitors' query results, that defines the "interface" for all history backends.
+    Stores are shared by all monitors, which are identified by their unique name.
+    Results are returned in chronological order (oldest first).
+    """
+
+    def append(self, unique_name: str, query_result: QueryResult) -> None:
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def append_many(self, unique_name: str, query_results: list[QueryResult]) -> None:
+        """Appends several results at once, e.g. when importing history. Backends that can batch writes override this."""
+        for query_result in query_results:
+            self.append(unique_name, query_result)
+
+    def read_last(self, unique_name: str, count: int) -> list[QueryResult]:
+        """Returns the monitor's last `count` results."""
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def read_range(self, unique_name: str, since: datetime, until: datetime | None = None) -> list[QueryResult]:
+        """Returns the monitor's results that ended within [since, until], or since `since` if until is None."""
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def aggregate(self, unique_name: str, since: datetime, until: datetime | None = None) -> HistoryAggregate:
+        """
+        Summarizes the monitor's results within [since, until].
+        Computed from read_range() by default, backends that can aggregate natively override this.
+        """
+        aggregate = HistoryAggregate()
+        latency_sum = 0
+        for result in self.read_range(unique_name, since, until):
+            if aggregate.first_end_time is None:
+                aggregate.first_end_time = result.end_time
+            aggregate.count += 1
+            latency_sum += result.calcualte_latency()
+            if result.test_passed:
+                aggregate.passed_count += 1
+                aggregate.last_passed_end_time = result.end_time
+            else:
+                aggregate.last_failed_end_time = result.end_time
+        if aggregate.count > 0:
+            aggregate.average_latency_seconds = latency_sum / aggregate.count
+        return aggregate
+
+    def count(self, unique_name: str) -> int:
+        """Returns the number of results stored for the monitor."""
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def delete_before(self, unique_name: str, before: datetime) -> int:
+        """Deletes the monitor's results that ended before `before`, e.g. to apply the retention policy. Returns the number deleted."""
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def create(self, unique_name: str) -> None:
+        """Prepares the storage of a monitor's history, if needed by the backend."""
+        pass
+
+    def rename(self, old_unique_name: str, new_unique_name: str) -> None:
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def delete(self, unique_name: str) -> None:
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def close(self) -> None:
+        """Releases the resources held by the store, e.g. on exit."""
+        pass
+
+
+def rewrite_file_without_range(file_path: str, start_offset: int, end_offset: int) -> None:
+    """
+    Atomically rewrites a file without its bytes in [start_offset, end_offset), e.g. to drop a history file's oldest results
+    while keeping its header. Streams the kept bytes, so it works on files larger than memory.
+    """
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), suffix=".tmp")
+    try:
+        with open(file_path, "rb") as source, os.fdopen(file_descriptor, "wb") as destination:
+            destination.write(source.read(start_offset))
+            source.seek(end_offset)
+            shutil.copyfileobj(source, destination)
+            destination.flush()
+            os.fsync(destination.fileno())
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def encode_history_line(query_result: QueryResult) -> str:
+    """Encodes a result as a line of a JSONL history file, compact (without attribute names nor type tags) if set in the settings."""
+    if settings.history_jsonl_compact_format:
+        return serialization.to_compact_jsonl(query_result)
+    return serialization.to_encoded_jsonl(query_result)
+
+
+def decode_history_line(line: str | bytes) -> QueryResult:
+    """Decodes a line of a JSONL history file, in either format since a file holds both after switching."""
+    if line.lstrip()[:1] in ("[", b"["):
+        return serialization.from_compact_json(line, QueryResult)
+    return serialization.from_encoded_json(line)
+
+
+__history_store: HistoryStore | None = None
+
+
+def get_history_store() -> HistoryStore:
+    """Returns the history store selected by settings.history_backend, creating it on first use."""
+    global __history_store
+    if __history_store is None:
+        __history_store = create_history_store(settings.history_backend)
+    return __history_store
+
+
+def create_history_store(backend: str) -> HistoryStore:
+    # Imported here as the backends import this module
+    from history.binary_history_store import BinaryHistoryStore
+    from history.jsonl_history_store import JsonlHistoryStore
+    from history.sqlite_history_store import SqliteHistoryStore
+
+    if backend == "sqlite":
+        return SqliteHistoryStore()
+    if backend == "binary":
+        return BinaryHistoryStore()
+    if backend != "jsonl":
+        get_general_logger().warning(f'Unknown history backend "{backend}", using "jsonl" instead.')
+    return JsonlHistoryStore()
@@ -0,0 +1,251 @@
+import atexit
+from datetime import datetime
+import itertools
+import os
+import threading
+import traceback
+from typing import Iterator
+
+from common.custom_logging import get_general_logger
+from common.debounced_flusher import DebouncedFlusher
+from common.file_handle_pool import FileHandlePool
+from common.reverse_reader import read_last_lines
+from common.settings_manager import settings
+from history.history_store import HistoryStore, decode_history_line, encode_history_line, rewrite_file_without_range
+from history.sparse_time_index import SparseTimeIndex
+from queries.query_result import QueryResult
+
+HISTORY_DIRECTORY = "data/history"
+
+
+class JsonlHistoryStore(HistoryStore):
+    """
+    Stores each monitor's results in its own file, one JSON encoded result per line, appended in chronological order.
+    Human-readable and easy to back up. Reads of the last results seek from the end of the files,
+    and reads of time windows seek to the window's start thanks to a sparse time index next to each file.
+
+    Appends are buffered and written in batches by a background thread (group commit), through files kept open between batches.
+    Reads merge the monitor's results not written yet, so they see every result appended in this process without waiting for a write.
+    Other processes, e.g. the parent of sharded monitoring workers, only see the results once they are written.
+    File operations write the monitor's pending results first.
+    """
+
+    def __init__(self) -> None:
+        self.__time_indexes: dict[str, SparseTimeIndex] = {}
+        self.__file_locks: dict[str, threading.Lock] = {}  # Keeps appends out of a file while it is being rewritten
+        self.__time_indexes_lock = threading.Lock()
+        self.__pending_results: list[tuple[str, datetime, bytes]] = []  # (unique_name, end_time, encoded line) not written yet
+        self.__results_being_written: dict[str, list[tuple[datetime, bytes]]] = {}  # Taken by the writer, not written yet either
+        self.__pending_results_lock = threading.Lock()
+        self.__file_handles = FileHandlePool(settings.history_max_open_files)
+        self.__writer = DebouncedFlusher(self.__write_pending_results, settings.history_write_delay_ms / 1000, "history-writer")
+        atexit.register(self.close)  # Also covers exits that skip the monitoring thread's shutdown
+
+    def append(self, unique_name: str, query_result: QueryResult) -> None:
+        try:
+            encoded_line = (encode_history_line(query_result) + "\n").encode("utf-8")
+            with self.__pending_results_lock:
+                self.__pending_results.append((unique_name, query_result.end_time, encoded_line))
+                is_batch_full = len(self.__pending_results) >= settings.history_write_batch_size
+            if is_batch_full:
+                self.__writer.flush_now()
+            else:
+                self.__writer.request_flush()
+        except Exception as e:
+            get_general_logger().error(f"Error while appending query result to history: {e}")
+
+    def flush(self) -> None:
+        """Writes the pending results now."""
+        self.__writer.flush_now()
+
+    def close(self) -> None:
+        """Writes the pending results and stops the writer thread. Later appends are written synchronously."""
+        self.__writer.stop()
+        self.__file_handles.close_all(fsync=True)
+
+    def read_last(self, unique_name: str, count: int) -> list[QueryResult]:
+        resultsList = []
+        try:
+            target_path = self.get_file_path(unique_name)
+            with self.__get_file_lock(unique_name):  # Keeps writes and rewrites, e.g. by the compactor, out of the file while it is read
+                unwritten_lines = self.__get_unwritten_lines(unique_name)
+                if not os.path.exists(target_path):
+                    if not unwritten_lines:
+                        get_general_logger().warning(f"Requested history file {target_path} does not exist.")
+                        return []
+                else:
+                    # Only the end of the file is read, whatever its size
+                    for line in read_last_lines(target_path, count - len(unwritten_lines)):
+                        resultsList.append(decode_history_line(line))
+            for line in unwritten_lines[-count:] if count > 0 else []:
+                resultsList.append(decode_history_line(line))
+        except Exception as e:
+            get_general_logger().error(f"Error while getting previous query result: {e}")
+            traceback.print_exc()
+            return []
+        return resultsList
+
+    def read_range(self, unique_name: str, since: datetime, until: datetime | None = None) -> list[QueryResult]:
+        resultsList = []
+        try:
+            target_path = self.get_file_path(unique_name)
+            with self.__get_file_lock(unique_name):  # Keeps the time index's offsets valid while the file is read
+                unwritten_lines = self.__get_unwritten_lines(unique_name)
+                if not os.path.exists(target_path) and not unwritten_lines:
+                    get_general_logger().warning(f"Requested history file {target_path} does not exist.")
+                    return []
+                for line in itertools.chain(self.__iter_written_lines(unique_name, since), unwritten_lines):
+                    result: QueryResult = decode_history_line(line)
+                    try:
+                        if until is not None and result.end_time > until:
+                            break  # Results are in chronological order
+                        if result.end_time >= since:
+                            resultsList.append(result)
+                    except Exception as e:
+                        get_general_logger().error(f"Error while filtering results by date: {e}")
+                        traceback.print_exc()
+                        continue
+        except Exception as e:
+            get_general_logger().error(f"Error while getting previous query result: {e}")
+            traceback.print_exc()
+            return []
+        return resultsList
+
+    def count(self, unique_name: str) -> int:
+        with self.__get_file_lock(unique_name):
+            return sum(1 for _ in self.__iter_written_lines(unique_name, None)) + len(self.__get_unwritten_lines(unique_name))
+
+    def delete_before(self, unique_name: str, before: datetime) -> int:
+        self.__write_pending_results_of(unique_name)
+        target_path = self.get_file_path(unique_name)
+        if not os.path.exists(target_path):
+            return 0
+
+        with self.__get_file_lock(unique_name):
+            self.__file_handles.close(target_path)  # It would keep appending to the replaced file
+            time_index = self.__get_time_index(unique_name)
+            # Find the first result to keep, starting from the last index entry before it
+            with open(target_path, "rb") as f:
+                cut_offset = time_index.find_start_offset(before)
+                f.seek(cut_offset)
+                for line in f:
+                    if line.strip() and decode_history_line(line).end_time >= before:
+                        break
+                    cut_offset += len(line)
+                if cut_offset == 0:
+                    return 0
+                f.seek(0)
+                deleted_count = f.read(cut_offset).count(b"\n")
+
+            rewrite_file_without_range(target_path, 0, cut_offset)
+            time_index.rebuild()
+        return deleted_count
+
+    def create(self, unique_name: str) -> None:
+        target_path = self.get_file_path(unique_name)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        if not os.path.exists(target_path):
+            get_general_logger().debug(f"Monitor {unique_name} did not have a history file, creating one now.")
+            with open(target_path, "w") as f:
+                f.write("")  # Create an empty file
+
+    def rename(self, old_unique_name: str, new_unique_name: str) -> None:
+        self.__write_pending_results_of(old_unique_name)
+        old_path = self.get_file_path(old_unique_name)
+        self.__file_handles.close(old_path)
+        if os.path.exists(old_path):
+            os.rename(old_path, self.get_file_path(new_unique_name))
+        with self.__time_indexes_lock:
+            time_index = self.__time_indexes.pop(old_unique_name, None) or SparseTimeIndex(old_path)
+            time_index.rename(self.get_file_path(new_unique_name))
+            self.__time_indexes[new_unique_name] = time_index
+
+    def delete(self, unique_name: str) -> None:
+        self.__write_pending_results_of(unique_name)
+        target_path = self.get_file_path(unique_name)
+        self.__file_handles.close(target_path)
+        if os.path.exists(target_path):
+            os.remove(target_path)
+            get_general_logger().debug(f"Monitor {unique_name} history file deleted.")
+        with self.__time_indexes_lock:
+            time_index = self.__time_indexes.pop(unique_name, None) or SparseTimeIndex(target_path)
+        time_index.delete()
+
+    def __write_pending_results(self) -> None:
+        """Writes the pending results with a single write per file, then syncs them to disk according to settings.history_fsync_policy."""
+        with self.__pending_results_lock:
+            pending_results, self.__pending_results = self.__pending_results, []
+            for unique_name, end_time, encoded_line in pending_results:
+                self.__results_being_written.setdefault(unique_name, []).append((end_time, encoded_line))
+            unique_names = list(self.__results_being_written)
+
+        for unique_name in unique_names:
+            self.__write_results_being_written(unique_name)
+
+    def __write_pending_results_of(self, unique_name: str) -> None:
+        """Writes the pending results of a single monitor now, leaving the other monitors' to the writer."""
+        with self.__pending_results_lock:
+            lines = self.__results_being_written.setdefault(unique_name, [])
+            lines += [(end_time, encoded_line) for name, end_time, encoded_line in self.__pending_results if name == unique_name]
+            self.__pending_results = [pending_result for pending_result in self.__pending_results if pending_result[0] != unique_name]
+        self.__write_results_being_written(unique_name)
+
+    def __write_results_being_written(self, unique_name: str) -> None:
+        with self.__get_file_lock(unique_name):
+            # Taken under the file lock, so that readers find each result either in memory or in the file, never in both
+            with self.__pending_results_lock:
+                lines = self.__results_being_written.pop(unique_name, [])
+            if not lines:
+                return
+            try:
+                f = self.__file_handles.get(self.get_file_path(unique_name))
+                offset = f.tell()
+                f.write(b"".join(encoded_line for _, encoded_line in lines))
+                f.flush()
+                if settings.history_fsync_policy == "batch":
+                    os.fsync(f.fileno())
+
+                time_index = self.__get_time_index(unique_name)  # Once written, as it may read the file to catch up
+                for end_time, encoded_line in lines:
+                    time_index.on_result_appended(end_time, offset)
+                    offset += len(encoded_line)
+            except Exception as e:
+                get_general_logger().error(f"Error while writing {len(lines)} query results to monitor {unique_name}'s history: {e}")
+
+    def __get_unwritten_lines(self, unique_name: str) -> list[bytes]:
+        """
+        Returns the encoded lines of the monitor's results not written yet, in chronological order.
+        The file's lock must be held, so that each result is either in the returned lines or in the file, never in both.
+        """
+        with self.__pending_results_lock:
+            encoded_lines = [encoded_line for _, encoded_line in self.__results_being_written.get(unique_name, [])]
+            encoded_lines += [encoded_line for name, _, encoded_line in self.__pending_results if name == unique_name]
+        return encoded_lines
+
+    def __iter_written_lines(self, unique_name: str, since: datetime | None) -> Iterator[bytes]:
+        """
+        Yields the non-empty lines of the monitor's file, from the first one that may be at or after since.
+        The file's lock must be held, as the offsets of the time index are only valid until the file is rewritten.
+        """
+        target_path = self.get_file_path(unique_name)
+        if not os.path.exists(target_path):
+            return
+        with open(target_path, "rb") as f:
+            f.seek(self.__get_time_index(unique_name).find_start_offset(since) if since is not None else 0)
+            for line in f:
+                if line.strip():
+                    yield line
+
+    def __get_file_lock(self, unique_name: str) -> threading.Lock:
+        with self.__time_indexes_lock:
+            return self.__file_locks.setdefault(unique_name, threading.Lock())
+
+    def __get_time_index(self, unique_name: str) -> SparseTimeIndex:
+        with self.__time_indexes_lock:
+            if unique_name not in self.__time_indexes:
+                self.__time_indexes[unique_name] = SparseTimeIndex(self.get_file_path(unique_name))
+            return self.__time_indexes[unique_name]
+
+    @staticmethod
+    def get_file_path(unique_name: str) -> str:
+        return f"{HISTORY_DIRECTORY}/{unique_name}.jsonl"
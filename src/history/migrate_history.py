@@ -0,0 +1,54 @@
+"""
+Imports the history of the JSONL backend into another backend, e.g. before switching settings.history_backend to "sqlite".
+Run with: python src/app.py --migrate-history, which imports into the backend currently set in settings.history_backend.
+"""
+
+import glob
+import os
+
+from common.custom_logging import get_general_logger
+from history.history_store import HistoryStore, decode_history_line
+from history.jsonl_history_store import HISTORY_DIRECTORY, JsonlHistoryStore
+
+IMPORT_BATCH_SIZE = 1000
+
+
+def migrate_jsonl_history(target_store: HistoryStore) -> dict[str, int]:
+    """
+    Imports every JSONL history file into the target store. The JSONL files are left untouched.
+    Monitors that already have results in the target store are skipped, so running it again does not duplicate results.
+    Returns the number of results imported per monitor.
+    """
+    if isinstance(target_store, JsonlHistoryStore):
+        raise ValueError("The history is already stored as JSONL, set history_backend to another backend to migrate it.")
+    imported_counts = {}
+
+    for file_path in sorted(glob.glob(os.path.join(HISTORY_DIRECTORY, "*.jsonl"))):
+        unique_name = os.path.splitext(os.path.basename(file_path))[0]
+        if target_store.count(unique_name) > 0:
+            get_general_logger().warning(f"Monitor {unique_name} already has history in the target store, skipping {file_path}.")
+            continue
+
+        imported_count = 0
+        batch = []
+        with open(file_path, "r") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    batch.append(decode_history_line(line))
+                except Exception as e:
+                    get_general_logger().error(f"Skipping unreadable result at {file_path}:{line_number}: {e}")
+                    continue
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    target_store.append_many(unique_name, batch)
+                    imported_count += len(batch)
+                    batch = []
+        if batch:
+            target_store.append_many(unique_name, batch)
+            imported_count += len(batch)
+
+        imported_counts[unique_name] = imported_count
+        get_general_logger().info(f"Imported {imported_count} results of monitor {unique_name}.")
+
+    return imported_counts
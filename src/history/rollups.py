@@ -0,0 +1,211 @@
+"""
+Downsampled history: per-minute, per-hour and per-day summaries of a monitor's results, so that stats over long periods
+remain available, and cheap, once the raw results are deleted by the retention policy.
+
+Rollups are computed by the history compactor from the raw results, whatever the history backend, up to a per-monitor watermark:
+results that ended before the watermark are summarized in the rollups, later ones are only in the raw history.
+"""
+
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+import json
+import math
+import os
+import shutil
+import threading
+
+from common.reverse_reader import iter_lines_reversed
+from common.serialization import write_text_file_atomically
+from history.history_store import HistoryAggregate, rewrite_file_without_range
+from history.jsonl_history_store import HISTORY_DIRECTORY
+from queries.query_result import QueryResult
+
+ROLLUPS_DIRECTORY = f"{HISTORY_DIRECTORY}/rollups"
+RESOLUTIONS = ("minute", "hour", "day")  # Finest first
+WATERMARK_FILE_NAME = "watermark"
+
+
+@dataclass
+class Rollup:
+    """Summary of the results that ended within one bucket. Times are epoch timestamps, latencies are in seconds."""
+
+    start_time: float = 0
+    count: int = 0
+    passed_count: int = 0
+    latency_min: float = 0
+    latency_avg: float = 0
+    latency_max: float = 0
+    latency_p50: float = 0
+    latency_p95: float = 0
+    latency_p99: float = 0
+    first_end_time: float | None = None
+    last_passed_end_time: float | None = None
+    last_failed_end_time: float | None = None
+
+    def to_aggregate(self) -> HistoryAggregate:
+        return HistoryAggregate(
+            count=self.count,
+            passed_count=self.passed_count,
+            average_latency_seconds=self.latency_avg,
+            first_end_time=_to_datetime(self.first_end_time),
+            last_passed_end_time=_to_datetime(self.last_passed_end_time),
+            last_failed_end_time=_to_datetime(self.last_failed_end_time),
+        )
+
+
+def get_bucket_start(time: datetime, resolution: str) -> datetime:
+    """Returns the start of the bucket holding a time. Buckets follow local time, so that days start at midnight."""
+    if resolution == "minute":
+        return time.replace(second=0, microsecond=0)
+    if resolution == "hour":
+        return time.replace(minute=0, second=0, microsecond=0)
+    return time.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_next_bucket_start(bucket_start: datetime, resolution: str) -> datetime:
+    return bucket_start + {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}[resolution]
+
+
+def compute_rollups(results: list[QueryResult], resolution: str) -> list[Rollup]:
+    """Summarizes chronologically ordered results in buckets of the resolution, skipping empty buckets."""
+    results_per_bucket: dict[datetime, list[QueryResult]] = {}
+    for result in results:
+        results_per_bucket.setdefault(get_bucket_start(result.end_time, resolution), []).append(result)
+
+    rollups = []
+    for bucket_start, bucket_results in results_per_bucket.items():
+        latencies = sorted((result.end_time - result.start_time).total_seconds() for result in bucket_results)
+        passed_end_times = [result.end_time for result in bucket_results if result.test_passed]
+        failed_end_times = [result.end_time for result in bucket_results if result.test_passed is False]
+        rollups.append(
+            Rollup(
+                start_time=bucket_start.timestamp(),
+                count=len(bucket_results),
+                passed_count=len(passed_end_times),
+                latency_min=latencies[0],
+                latency_avg=sum(latencies) / len(latencies),
+                latency_max=latencies[-1],
+                latency_p50=_percentile(latencies, 50),
+                latency_p95=_percentile(latencies, 95),
+                latency_p99=_percentile(latencies, 99),
+                first_end_time=bucket_results[0].end_time.timestamp(),
+                last_passed_end_time=passed_end_times[-1].timestamp() if passed_end_times else None,
+                last_failed_end_time=failed_end_times[-1].timestamp() if failed_end_times else None,
+            )
+        )
+    return rollups
+
+
+class RollupStore:
+    """
+    One JSONL file per monitor and resolution in data/history/rollups/<monitor>/, plus the monitor's watermark.
+    Written by the compactor only, read by the stats.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()  # The compactor rewrites files that the stats may be reading
+
+    def get_watermark(self, unique_name: str) -> datetime | None:
+        """Returns the time before which the monitor's results are summarized in its rollups, None if nothing is yet."""
+        try:
+            with open(f"{self.get_directory(unique_name)}/{WATERMARK_FILE_NAME}") as f:
+                return datetime.fromtimestamp(float(f.read()))
+        except (OSError, ValueError):
+            return None
+
+    def set_watermark(self, unique_name: str, watermark: datetime) -> None:
+        os.makedirs(self.get_directory(unique_name), exist_ok=True)
+        write_text_file_atomically(f"{self.get_directory(unique_name)}/{WATERMARK_FILE_NAME}", str(watermark.timestamp()))
+
+    def append(self, unique_name: str, resolution: str, rollups: list[Rollup]) -> None:
+        if not rollups:
+            return
+        os.makedirs(self.get_directory(unique_name), exist_ok=True)
+        with self.__lock, open(self.__get_file_path(unique_name, resolution), "a") as f:
+            f.writelines(json.dumps(asdict(rollup)) + "\n" for rollup in rollups)
+
+    def read(self, unique_name: str, resolution: str, since: datetime, until: datetime) -> list[Rollup]:
+        """Returns the rollups whose bucket lies entirely within [since, until), in chronological order."""
+        target_path = self.__get_file_path(unique_name, resolution)
+        if not os.path.exists(target_path):
+            return []
+
+        rollups = []
+        with self.__lock, open(target_path, "rb") as f:
+            for line in iter_lines_reversed(f):  # Mostly recent windows are read, from the end of the file
+                if not line.strip():
+                    continue
+                rollup = Rollup(**json.loads(line))
+                bucket_start = datetime.fromtimestamp(rollup.start_time)
+                if bucket_start < since:
+                    break
+                if get_next_bucket_start(bucket_start, resolution) <= until:
+                    rollups.append(rollup)
+        rollups.reverse()
+        return rollups
+
+    def delete_from(self, unique_name: str, since: datetime) -> None:
+        """Deletes the rollups of buckets starting at or after `since`, e.g. left over by an interrupted compaction."""
+        for resolution in RESOLUTIONS:
+            self.__truncate(unique_name, resolution, keep=lambda rollup_start: rollup_start < since.timestamp(), from_end=True)
+
+    def delete_before(self, unique_name: str, resolution: str, before: datetime) -> None:
+        """Deletes the rollups of buckets starting before `before`, to apply the retention policy."""
+        self.__truncate(unique_name, resolution, keep=lambda rollup_start: rollup_start >= before.timestamp(), from_end=False)
+
+    def rename(self, old_unique_name: str, new_unique_name: str) -> None:
+        with self.__lock:
+            if os.path.exists(self.get_directory(old_unique_name)):
+                os.rename(self.get_directory(old_unique_name), self.get_directory(new_unique_name))
+
+    def delete(self, unique_name: str) -> None:
+        with self.__lock:
+            shutil.rmtree(self.get_directory(unique_name), ignore_errors=True)
+
+    @staticmethod
+    def get_directory(unique_name: str) -> str:
+        return f"{ROLLUPS_DIRECTORY}/{unique_name}"
+
+    def __get_file_path(self, unique_name: str, resolution: str) -> str:
+        return f"{self.get_directory(unique_name)}/{resolution}.jsonl"
+
+    def __truncate(self, unique_name: str, resolution: str, keep, from_end: bool) -> None:
+        """Removes the rollups that are not kept from the start or the end of the file, rewriting it only if any is removed."""
+        target_path = self.__get_file_path(unique_name, resolution)
+        if not os.path.exists(target_path):
+            return
+
+        with self.__lock:
+            with open(target_path, "rb") as f:
+                if from_end:
+                    cut_offset = os.path.getsize(target_path)
+                    for line in iter_lines_reversed(f):
+                        if line.strip() and keep(json.loads(line)["start_time"]):
+                            break
+                        cut_offset -= len(line) + 1
+                    cut_range = (max(0, cut_offset), os.path.getsize(target_path))
+                else:
+                    cut_offset = 0
+                    for line in f:
+                        if line.strip() and keep(json.loads(line)["start_time"]):
+                            break
+                        cut_offset += len(line)
+                    cut_range = (0, cut_offset)
+            if cut_range[0] < cut_range[1]:
+                rewrite_file_without_range(target_path, *cut_range)
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    """Nearest-rank percentile."""
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+
+def _to_datetime(timestamp: float | None) -> datetime | None:
+    return datetime.fromtimestamp(timestamp) if timestamp is not None else None
+
+
+__rollup_store = RollupStore()
+
+
+def get_rollup_store() -> RollupStore:
+    return __rollup_store
@@ -0,0 +1,130 @@
+"""
+Sparse sidecar index of a JSONL history file, to find where a time window starts without decoding the whole file.
+Results are appended in chronological order, so every INDEX_INTERVAL-th result's end time and byte offset are enough
+to binary search the position of any time, then only read the file from there.
+"""
+
+import bisect
+from datetime import datetime
+import os
+
+import common.serialization as serialization
+from common.custom_logging import get_general_logger
+from history.history_store import decode_history_line
+
+INDEX_INTERVAL = 256  # Results between two index entries, i.e. at most that many results are decoded in vain per lookup
+INDEX_FILE_EXTENSION = ".idx"
+
+
+class SparseTimeIndex:
+    """
+    Index file next to the history file, with one "<end timestamp> <byte offset>" line per INDEX_INTERVAL results.
+    Maintained by the process appending to the history file, read by any process.
+    """
+
+    def __init__(self, history_file_path: str) -> None:
+        self.__history_file_path = history_file_path
+        self.__index_file_path = history_file_path + INDEX_FILE_EXTENSION
+        self.__results_since_last_entry: int | None = None  # Unknown until the writer's first append
+
+    def on_result_appended(self, end_time: datetime, offset: int) -> None:
+        """
+        To be called by the writer with the offset at which a result was appended to the history file.
+        Rebuilds the index first if it is missing, e.g. for history files created before the index existed.
+        """
+        if self.__results_since_last_entry is None:
+            self.__results_since_last_entry = self.__catch_up(offset)
+
+        if self.__results_since_last_entry == 0 or self.__results_since_last_entry >= INDEX_INTERVAL:
+            with open(self.__index_file_path, "a") as f:
+                f.write(f"{end_time.timestamp()} {offset}\n")
+            self.__results_since_last_entry = 0
+        self.__results_since_last_entry += 1
+
+    def find_start_offset(self, since: datetime) -> int:
+        """Returns a byte offset of the history file before which all results ended before `since`, 0 without a usable index."""
+        entries = self.__read_entries()
+        position = bisect.bisect_left([timestamp for timestamp, _ in entries], since.timestamp()) - 1
+        if position < 0:
+            return 0
+        offset = entries[position][1]
+        return offset if self.__is_line_start(offset) else 0  # Outdated index, e.g. the history file was edited
+
+    def rename(self, new_history_file_path: str) -> None:
+        if os.path.exists(self.__index_file_path):
+            os.rename(self.__index_file_path, new_history_file_path + INDEX_FILE_EXTENSION)
+        self.__history_file_path = new_history_file_path
+        self.__index_file_path = new_history_file_path + INDEX_FILE_EXTENSION
+
+    def delete(self) -> None:
+        if os.path.exists(self.__index_file_path):
+            os.remove(self.__index_file_path)
+        self.__results_since_last_entry = None
+
+    def rebuild(self) -> None:
+        """Recreates the index from the history file, e.g. after it was rewritten."""
+        self.__results_since_last_entry = self.__catch_up(None)
+
+    def __catch_up(self, history_file_size: int | None) -> int:
+        """
+        Indexes the results appended since the last index entry, rebuilding the whole index if it is missing or outdated.
+        Returns the number of results after the last index entry.
+        """
+        entries = self.__read_entries()
+        if entries and self.__is_line_start(entries[-1][1]):
+            start_offset = entries[-1][1]
+        else:
+            entries = []
+            start_offset = 0
+            serialization.write_text_file_atomically(self.__index_file_path, "")
+            get_general_logger().debug(f"Building the time index of {self.__history_file_path}")
+
+        results_since_last_entry = 0
+        new_entries = []
+        with open(self.__history_file_path, "rb") as f:
+            f.seek(start_offset)
+            offset = start_offset
+            for line in f:
+                line_offset = offset
+                offset += len(line)
+                if history_file_size is not None and line_offset >= history_file_size:
+                    break
+                if not line.strip():
+                    continue
+                if not entries and not new_entries or results_since_last_entry >= INDEX_INTERVAL:
+                    end_time = decode_history_line(line).end_time
+                    new_entries.append(f"{end_time.timestamp()} {line_offset}\n")
+                    results_since_last_entry = 0
+                results_since_last_entry += 1
+
+        if new_entries:
+            with open(self.__index_file_path, "a") as f:
+                f.writelines(new_entries)
+        return results_since_last_entry if entries or new_entries else 0
+
+    def __read_entries(self) -> list[tuple[float, int]]:
+        entries = []
+        try:
+            with open(self.__index_file_path, "r") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2 and line.endswith("\n"):  # Skips a line being written by another process
+                        entries.append((float(parts[0]), int(parts[1])))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            get_general_logger().warning(f"Ignoring unreadable time index {self.__index_file_path}: {e}")
+            return []
+        return entries
+
+    def __is_line_start(self, offset: int) -> bool:
+        """Whether the offset is the start of a line of the history file, which index entries always point to."""
+        if offset == 0:
+            return True
+        try:
+            with open(self.__history_file_path, "rb") as f:
+                f.seek(offset - 1)
+                previous_byte = f.read(1)
+                return previous_byte == b"\n" and f.read(1) not in (b"", b"\n")
+        except OSError:
+            return False
@@ -0,0 +1,154 @@
+from datetime import datetime
+import os
+import sqlite3
+import threading
+
+from common.custom_logging import get_general_logger
+from history.history_store import HistoryAggregate, HistoryStore
+from queries.query_result import QueryResult
+
+DATABASE_PATH = "data/history.sqlite3"
+
+# Times are stored as POSIX timestamps, which sort and subtract natively in SQL
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    monitor TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    end_time REAL NOT NULL,
+    test_passed INTEGER,
+    retries INTEGER,
+    code_or_status INTEGER,
+    message TEXT,
+    reason TEXT,
+    exception_type TEXT,
+    queue_wait_seconds REAL
+);
+CREATE INDEX IF NOT EXISTS results_monitor_end_time ON results (monitor, end_time);
+"""
+
+COLUMNS = "start_time, end_time, test_passed, retries, code_or_status, message, reason, exception_type, queue_wait_seconds"
+
+
+class SqliteHistoryStore(HistoryStore):
+    """
+    Stores all monitors' results in a single SQLite database, indexed on (monitor, end_time),
+    so that last-N, time range and aggregate queries only touch the rows they need.
+    Uses write-ahead logging so that reads (e.g. the GUI) do not block writes (e.g. the monitors), even across processes.
+    """
+
+    def __init__(self, database_path: str = DATABASE_PATH) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(database_path)), exist_ok=True)
+        # A single connection shared by the monitoring workers and the GUI bridge, serialized by the lock
+        self.__connection = sqlite3.connect(database_path, check_same_thread=False, timeout=30)
+        self.__lock = threading.Lock()
+        with self.__lock, self.__connection:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("PRAGMA synchronous=NORMAL")  # Durable across application crashes, only the last commits may be lost on power loss
+            self.__connection.executescript(SCHEMA)
+
+    def append(self, unique_name: str, query_result: QueryResult) -> None:
+        self.append_many(unique_name, [query_result])
+
+    def append_many(self, unique_name: str, query_results: list[QueryResult]) -> None:
+        """Appends several results in a single transaction, e.g. when importing history."""
+        try:
+            rows = [(unique_name, *_to_row(query_result)) for query_result in query_results]
+            with self.__lock, self.__connection:
+                self.__connection.executemany(f"INSERT INTO results (monitor, {COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        except Exception as e:
+            get_general_logger().error(f"Error while appending query result to history: {e}")
+
+    def read_last(self, unique_name: str, count: int) -> list[QueryResult]:
+        rows = self.__query(
+            f"SELECT {COLUMNS} FROM results WHERE monitor = ? ORDER BY end_time DESC, id DESC LIMIT ?",
+            (unique_name, count),
+        )
+        return [_from_row(row) for row in reversed(rows)]
+
+    def read_range(self, unique_name: str, since: datetime, until: datetime | None = None) -> list[QueryResult]:
+        rows = self.__query(
+            f"SELECT {COLUMNS} FROM results WHERE monitor = ? AND end_time BETWEEN ? AND ? ORDER BY end_time, id",
+            (unique_name, since.timestamp(), until.timestamp() if until is not None else float("inf")),
+        )
+        return [_from_row(row) for row in rows]
+
+    def aggregate(self, unique_name: str, since: datetime, until: datetime | None = None) -> HistoryAggregate:
+        rows = self.__query(
+            "SELECT COUNT(*), TOTAL(test_passed), AVG(end_time - start_time), MIN(end_time),"
+            " MAX(CASE WHEN test_passed THEN end_time END), MAX(CASE WHEN NOT test_passed THEN end_time END)"
+            " FROM results WHERE monitor = ? AND end_time BETWEEN ? AND ?",
+            (unique_name, since.timestamp(), until.timestamp() if until is not None else float("inf")),
+        )
+        if not rows or rows[0][0] == 0:
+            return HistoryAggregate()
+        count, passed_count, average_latency, first_end_time, last_passed_end_time, last_failed_end_time = rows[0]
+        return HistoryAggregate(
+            count=count,
+            passed_count=int(passed_count),
+            average_latency_seconds=average_latency,
+            first_end_time=_to_datetime(first_end_time),
+            last_passed_end_time=_to_datetime(last_passed_end_time),
+            last_failed_end_time=_to_datetime(last_failed_end_time),
+        )
+
+    def rename(self, old_unique_name: str, new_unique_name: str) -> None:
+        with self.__lock, self.__connection:
+            self.__connection.execute("UPDATE results SET monitor = ? WHERE monitor = ?", (new_unique_name, old_unique_name))
+
+    def delete(self, unique_name: str) -> None:
+        with self.__lock, self.__connection:
+            self.__connection.execute("DELETE FROM results WHERE monitor = ?", (unique_name,))
+        get_general_logger().debug(f"Monitor {unique_name} history deleted.")
+
+    def delete_before(self, unique_name: str, before: datetime) -> int:
+        with self.__lock, self.__connection:
+            return self.__connection.execute("DELETE FROM results WHERE monitor = ? AND end_time < ?", (unique_name, before.timestamp())).rowcount
+
+    def count(self, unique_name: str) -> int:
+        return self.__query("SELECT COUNT(*) FROM results WHERE monitor = ?", (unique_name,))[0][0]
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__connection.close()
+
+    def __query(self, sql: str, parameters: tuple) -> list[tuple]:
+        try:
+            with self.__lock:
+                return self.__connection.execute(sql, parameters).fetchall()
+        except Exception as e:
+            get_general_logger().error(f"Error while reading history: {e}")
+            return []
+
+
+def _to_row(query_result: QueryResult) -> tuple:
+    return (
+        query_result.start_time.timestamp(),
+        query_result.end_time.timestamp(),
+        query_result.test_passed,
+        query_result.retries,
+        query_result.code_or_status,
+        query_result.message,
+        query_result.reason,
+        query_result.exception_type,
+        query_result.queue_wait_seconds,
+    )
+
+
+def _from_row(row: tuple) -> QueryResult:
+    start_time, end_time, test_passed, retries, code_or_status, message, reason, exception_type, queue_wait_seconds = row
+    return QueryResult(
+        start_time=_to_datetime(start_time),
+        end_time=_to_datetime(end_time),
+        test_passed=bool(test_passed) if test_passed is not None else None,
+        retries=retries,
+        code_or_status=code_or_status,
+        message=message,
+        reason=reason,
+        exception_type=exception_type,
+        queue_wait_seconds=queue_wait_seconds,
+    )
+
+
+def _to_datetime(timestamp: float | None) -> datetime | None:
+    return datetime.fromtimestamp(timestamp) if timestamp is not None else None
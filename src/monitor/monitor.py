@@ -1,18 +1,23 @@
+import asyncio
 from datetime import datetime, timedelta
+import logging
 import os
 import traceback
-from plyer import notification
 import common.mediator as mediator
-from common import util
+from common import http_client, util
 from common.util import get_query_class_from_string, is_valid_filename, is_valid_url
 from queries.query import Query
 from queries.query_result import QueryResult
 from common.serialization import Deserializable
-from common.custom_logging import get_custom_logger, read_entries_from_log_file
+from common.custom_logging import close_custom_logger_file, get_custom_logger, read_entries_from_log_file, rename_custom_logger_file
 import common.serialization as serialization
 from common.custom_logging import get_general_logger
 import common.email_service as email_service
 from common.settings_manager import settings
+from monitor.scheduler import compute_next_run_time, compute_retry_delay, compute_startup_run_time
+from history.history_store import HistoryAggregate, get_history_store
+from history.rollups import get_rollup_store
+from monitor.rolling_stats import RollingStats, build_rolling_stats
 
 AVG_STATS_TIMESPAN_DAYS = 7
 PERIOD_IF_PERIOD_INVALID = 86400  # 1 day
@@ -21,7 +26,20 @@ DEFAULT_LOG_LEVEL = "INFO"
 
 class Monitor(Deserializable):
 
+    # Attributes set by the user, as opposed to the runtime state resulting from executions
+    CONFIG_ATTRIBUTES = ("unique_name", "query", "period_in_seconds", "retries", "retries_interval_in_seconds", "paused")
+    RUNTIME_STATE_ATTRIBUTES = (
+        "last_query_passed",
+        "time_at_last_status_change",
+        "stats_avg_uptime",
+        "stats_avg_latency",
+        "error_preventing_execution",
+        "_next_run_time",
+    )
+
     def __init__(self, unique_name: str = "undefined", period_in_seconds: int = 3600, query: Query = None) -> None:
+        self.__is_config_dirty = True  # New monitors have never been saved
+        self.__is_state_dirty = True
         self.unique_name = unique_name
         # Default to an HttpQuery if none is provided
         if query is None:
@@ -33,13 +51,15 @@ class Monitor(Deserializable):
         self.period_in_seconds = period_in_seconds
         self.retries = 0
         self.retries_interval_in_seconds = 1
-        self._next_run_time = datetime.now() + timedelta(seconds=self.period_in_seconds)
+        self.set_next_run_time()
         self.paused = False
         self.error_preventing_execution: str | None = None
         self.time_at_last_status_change = datetime.now()
         self.stats_avg_uptime = 0
         self.stats_avg_latency = 0
         self.__logger = None
+        self.__last_scheduler_lag_s: float | None = None
+        self.__rolling_stats: RollingStats | None = None  # Built from the history when first needed
 
         # Needed by the GUI as it doesn't have direct access to the query results
         # self.current_status DEPRACATED in favor of more descriptive last_query_passed
@@ -50,7 +70,51 @@ class Monitor(Deserializable):
             # Creating a new empty monitor or deserializing one, so we default to "up"
             self.last_query_passed = True
 
+    def __setattr__(self, name: str, value) -> None:
+        # Dirty tracking, so that saving only writes what changed. Changes made inside the query object are not tracked,
+        # which is why the GUI saves everything after editing a monitor (see MonitorsManager.save_monitors_configs_to_file)
+        if name in Monitor.CONFIG_ATTRIBUTES or name in Monitor.RUNTIME_STATE_ATTRIBUTES:
+            if name not in self.__dict__ or self.__dict__[name] != value:
+                if name in Monitor.CONFIG_ATTRIBUTES:
+                    self.__is_config_dirty = True
+                else:
+                    self.__is_state_dirty = True
+        super().__setattr__(name, value)
+
+    def is_config_dirty(self) -> bool:
+        """Whether CONFIG_ATTRIBUTES changed since the monitor was last saved."""
+        return self.__is_config_dirty
+
+    def is_state_dirty(self) -> bool:
+        """Whether RUNTIME_STATE_ATTRIBUTES changed since the monitor was last saved."""
+        return self.__is_state_dirty
+
+    def mark_as_saved(self) -> None:
+        """To be called before (not after) encoding the monitor, so that changes made while it is being saved are saved next time."""
+        self.__is_config_dirty = False
+        self.__is_state_dirty = False
+
     def execute(self) -> QueryResult:
+        """Blocking version of execute_async(), for callers outside of the background monitoring event loop."""
+
+        async def execute_and_close_connections():
+            try:
+                return await self.execute_async()
+            finally:
+                http_client.close_connections()  # The event loop is closed right after
+
+        return asyncio.run(execute_and_close_connections())
+
+    async def execute_async(self, planned_start_time: datetime | None = None, execution_slots: asyncio.Semaphore | None = None) -> QueryResult:
+        """
+        Executes the monitor's query, with retries, and handles its final result.
+        :param planned_start_time: When the scheduler planned this execution, used to record the scheduler lag. None for manual executions.
+        :param execution_slots: Limits how many queries run at once, a slot is only held while a query attempt is running
+        """
+        if planned_start_time is not None:
+            self.__last_scheduler_lag_s = (datetime.now() - planned_start_time).total_seconds()
+            self.log_monitor_event("Started %.3fs after its planned time", self.__last_scheduler_lag_s, level="DEBUG")
+
         self.set_next_run_time()  # Has to happen before the paused/invalid checks otherwise it will fire every cycle
 
         if self.paused:
@@ -64,25 +128,72 @@ class Monitor(Deserializable):
                 exception_type="Invalid Configuration", message=self.error_preventing_execution, reason=self.error_preventing_execution
             )
 
-        self._next_run_time = datetime.now() + timedelta(seconds=self.period_in_seconds)
+        query_result = await self.__execute_query_with_retries(execution_slots)
+
+        # Handling the result is blocking (disk, alerts...), so keep it off the event loop
+        await asyncio.to_thread(self.__process_new_query_result, query_result)
+        return query_result
+
+    async def __execute_query_with_retries(self, execution_slots: asyncio.Semaphore | None) -> QueryResult:
+        """
+        Executes the query, retrying failed attempts up to self.retries times with an exponential backoff and jitter,
+        but never past the next planned run time.
+        Waiting for a retry is a timer on the event loop, it neither blocks a thread nor holds an execution slot.
+        Returns the result of the last attempt, with the number of attempts made in QueryResult.retries.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            query_result = await self.__execute_query_once(execution_slots)
+
+            if query_result.test_passed or attempt > self.retries:
+                break
+
+            delay = compute_retry_delay(
+                attempt,
+                self.retries_interval_in_seconds,
+                backoff_factor=settings.monitoring_retries_backoff_factor,
+                jitter_percent=settings.monitoring_retries_jitter_percent,
+                max_delay_seconds=self.period_in_seconds,
+            )
+            if datetime.now() + timedelta(seconds=delay) >= self._next_run_time:
+                # The next scheduled run checks again anyway, retrying past it would overlap with it
+                self.log_monitor_event("Attempt %d/%d failed (%s), the next run is due before a retry", attempt, self.retries + 1, query_result.reason, level="INFO")
+                break
+            self.log_monitor_event("Attempt %d/%d failed (%s), retrying in %.1fs", attempt, self.retries + 1, query_result.reason, delay, level="INFO")
+            await asyncio.sleep(delay)
+
+        query_result.retries = attempt
+        return query_result
+
+    async def __execute_query_once(self, execution_slots: asyncio.Semaphore | None) -> QueryResult:
         try:
-            query_result: QueryResult = self.query.execute()
+            # The query takes the slot itself, after waiting on its own per-origin limits
+            return await self.query.execute_async(execution_slots)
         except Exception as e:
             self.log_monitor_event(f"Execution failed: {e}", level="ERROR")
             self.error_preventing_execution = str(e)
-            query_result = QueryResult(test_passed=False, exception_type=type(e).__name__, message=str(e), reason=str(e))
+            return QueryResult(test_passed=False, exception_type=type(e).__name__, message=str(e), reason=str(e))
 
-        self.log_monitor_event(f"Executed with results: {query_result}", level="DEBUG")
+    def __process_new_query_result(self, query_result: QueryResult):
+        # Queries can run concurrently, but their side effects must not interleave
+        with mediator.monitor_results_lock:
+            if self not in mediator.get_monitors_manager().monitors:
+                return  # Removed while executing, e.g. deleted or moved to another worker process, its files must not be recreated
 
-        self.handle_new_query_result(query_result)
+            self.log_monitor_event("Executed with results: %s", query_result, level="DEBUG")
 
-        self.append_query_result_to_history(query_result)
+            self.handle_new_query_result(query_result)
 
-        mediator.new_monitor_results.trigger(self.unique_name)
+            self.append_query_result_to_history(query_result)
 
-        # HACK - Ended up with some state in the monitor CONFIGURATIONS... so I'll simply force save on every new result until I can think of a proper solution (just split it? Keep it this way?)
-        mediator.get_monitors_manager().save_monitors_configs_to_file()
-        return query_result
+            mediator.new_monitor_results.trigger(self.unique_name)
+
+            mediator.get_monitors_manager().request_save()
+
+    def get_last_scheduler_lag(self) -> float | None:
+        """Returns how late in seconds the last scheduled execution started compared to its planned time, or None if never scheduled."""
+        return self.__last_scheduler_lag_s
 
     def execute_in_background(self):
         """
@@ -91,47 +202,65 @@ class Monitor(Deserializable):
         """
         mediator.bg_monitoring_queue.put(self)
 
-    def log_monitor_event(self, event: str, level: str = "INFO"):
-        """Adds an entry to the monitoring file."""
+    def log_monitor_event(self, event: str, *args, level: str = "INFO"):
+        """
+        Adds an entry to the monitoring file.
+        :param args: Merged into `event` with the % operator, only if the level is enabled, e.g. to not describe a result for a disabled DEBUG entry
+        """
         if self.__logger is None:
             self.__logger = get_custom_logger("monitors/" + self.unique_name)
 
         if level not in ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]:
             level = DEFAULT_LOG_LEVEL
 
-        log_string = f"{self.unique_name} - {event}"
-
-        if level == "DEBUG":
-            self.__logger.debug(log_string)
-        elif level == "INFO":
-            self.__logger.info(log_string)
-        elif level == "WARNING":
-            self.__logger.warning(log_string)
-        elif level == "ERROR":
-            self.__logger.error(log_string)
-        elif level == "CRITICAL":
-            self.__logger.critical(log_string)
-        else:
-            raise ValueError(f"Invalid log level: {level}")
+        level_number = logging.getLevelName(level)
+        if not self.__logger.isEnabledFor(level_number):
+            return
+
+        if args:
+            event = event % args
+        self.__logger.log(level_number, f"{self.unique_name} - {event}")
 
     def read_monitor_log_entries(self, max_number_of_entries: int, min_level: str = "INFO"):
         """Reads and returns the last `max_number_of_entries` log entries from the monitor's log file with the specified level."""
-        partial_path = f"logs/monitors/{self.unique_name}.log"
-        log_file_path = util.resolve_relative_path(partial_path)
+        log_file_path = self.get_log_file_path()
         # If file doesn't exist, log a warning and return []
         if not os.path.exists(log_file_path):
-            get_general_logger().warning(f"Log file {partial_path} does not exist.")
+            get_general_logger().warning(f"Log file {log_file_path} does not exist.")
             return []
         else:
             return read_entries_from_log_file(log_file_path, max_number_of_entries, min_level)
 
+    def get_log_file_path(self) -> str:
+        return util.resolve_relative_path(f"logs/monitors/{self.unique_name}.log")
+
     def set_next_run_time(self):
-        """Sets the next run time based on the period_in_seconds, or a safe default if the period is invalid."""
+        """
+        Sets the next run time based on the period_in_seconds, or a safe default if the period is invalid.
+        Runs are staggered and/or jittered according to the monitoring_stagger_start_times and monitoring_max_jitter_seconds settings.
+        """
         if getattr(self, "period_in_seconds", None) is None or self.period_in_seconds < 1:
             get_general_logger().warning(f"Monitor {self.unique_name} has an invalid period, usin default of {PERIOD_IF_PERIOD_INVALID} seconds.")
-            self._next_run_time = datetime.now() + timedelta(seconds=PERIOD_IF_PERIOD_INVALID)
+            period_in_seconds = PERIOD_IF_PERIOD_INVALID
         else:
-            self._next_run_time = datetime.now() + timedelta(seconds=self.period_in_seconds)
+            period_in_seconds = self.period_in_seconds
+        self._next_run_time = compute_next_run_time(
+            self.unique_name,
+            period_in_seconds,
+            datetime.now(),
+            stagger=settings.monitoring_stagger_start_times,
+            max_jitter_seconds=settings.monitoring_max_jitter_seconds,
+        )
+
+    def set_startup_run_time(self):
+        """
+        Sets the first run time of a monitor overdue since the last session to within general_interval, or its period if shorter,
+        spread with the other overdue monitors. Its later runs follow set_next_run_time().
+        """
+        window_seconds = settings.general_interval
+        if getattr(self, "period_in_seconds", None) is not None and self.period_in_seconds >= 1:
+            window_seconds = min(window_seconds, self.period_in_seconds)
+        self._next_run_time = compute_startup_run_time(self.unique_name, window_seconds, datetime.now())
 
     def handle_new_query_result(self, query_result: QueryResult):
         # Trigger a status change if the status changed
@@ -145,6 +274,12 @@ class Monitor(Deserializable):
             self.log_monitor_event(f"Monitor is {'back online' if query_result.test_passed else 'down'}", level="WARNING")
         self.last_query_passed = query_result.test_passed
 
+        if self.__rolling_stats is None:
+            # Before the result is appended to the history, so that it is not counted twice
+            self.__rolling_stats = build_rolling_stats(self.unique_name, timedelta(days=AVG_STATS_TIMESPAN_DAYS), datetime.now())
+        self.__rolling_stats.add_result(query_result)
+        self.__apply_stats(self.__rolling_stats.get_aggregate(datetime.now()))
+
     def sendUserAlerts(self, query_result: QueryResult):
 
         get_general_logger().debug(f"Sending alert for monitor {self.unique_name}")
@@ -157,7 +292,11 @@ class Monitor(Deserializable):
             messageString = f"Monitor {self.unique_name} is down."
 
         # Currently using a single app-wide settings, profiles could be implemented in the future
-        if settings.alerts_use_toast:
+        if settings.alerts_use_toast and mediator.headless_mode:
+            get_general_logger().debug("Skipping toast notification in headless mode")
+        elif settings.alerts_use_toast:
+            from plyer import notification  # Imported here so headless mode never loads it
+
             if query_result.test_passed:
                 icon = util.resolve_relative_path("assets/icon_32px.ico")
             else:
@@ -173,106 +312,65 @@ class Monitor(Deserializable):
             email_service.send_sms_alert(messageTitleString, messageString)
 
     def read_results_from_history(self, count: int) -> list[QueryResult]:
-        resultsList = []
-        try:
-            target_path = self.get_history_file_path()
-            if not os.path.exists(target_path):
-                get_general_logger().warning(f"Requested history file {target_path} does not exist.")
-                return []
-            with open(target_path, "r") as f:
-                lines = f.readlines()
-                if len(lines) > 0:
-                    capped_count = min(count, len(lines))  # Avoid reading more entries than we have
-                    for line in lines[-capped_count:]:
-                        resultsList.append(serialization.from_encoded_json(line))
-                    return resultsList
-        except Exception as e:
-            get_general_logger().error(f"Error while getting previous query result: {e}")
-            traceback.print_exc()
-            return []
-        return resultsList
+        return get_history_store().read_last(self.unique_name, count)
 
     def read_results_from_history_days(self, days_to_read: int) -> list[QueryResult]:
-        resultsList = []
-        try:
-            target_path = self.get_history_file_path()
-            if not os.path.exists(target_path):
-                get_general_logger().warning(f"Requested history file {target_path} does not exist.")
-                return []
-            with open(target_path, "r") as f:
-                lines = f.readlines()
-                if len(lines) > 0:
-                    for line in lines:
-                        result: QueryResult = serialization.from_encoded_json(line)
-                        try:
-                            if datetime.now() - result.end_time < timedelta(days=days_to_read):
-                                resultsList.append(result)
-                        except Exception as e:
-                            get_general_logger().error(f"Error while filtering results by date: {e}")
-                            traceback.print_exc()
-                            continue
-                    return resultsList
-        except Exception as e:
-            get_general_logger().error(f"Error while getting previous query result: {e}")
-            traceback.print_exc()
-            return []
-        return resultsList
+        return get_history_store().read_range(self.unique_name, datetime.now() - timedelta(days=days_to_read))
+
+    def is_due(self) -> bool:
+        return datetime.now() > self._next_run_time
 
     def execute_if_due(self):
-        if datetime.now() > self._next_run_time:
+        if self.is_due():
             return self.execute()
         else:  # DEBUG - Remove this cause it'll spam the logs
             get_general_logger().debug(f"Monitor {self.unique_name} not due yet, next run in {self._next_run_time - datetime.now()}")
         return None
 
     def append_query_result_to_history(self, query_result):
-        try:
-            target_path = self.get_history_file_path()
-            self.create_history_file_if_not_exists()
-            encoded_query_result = serialization.to_encoded_jsonl(query_result)
-            with open(target_path, "a") as f:
-                f.write(encoded_query_result + "\n")
-
-        except Exception as e:
-            get_general_logger().error(f"Error while appending query result to history: {e}")
+        get_history_store().append(self.unique_name, query_result)
 
     def create_history_file_if_not_exists(self):
-        target_path = self.get_history_file_path()
-        os.makedirs(os.path.dirname(target_path), exist_ok=True)
-        if not os.path.exists(target_path):
-            get_general_logger().debug(f"Monitor {self.unique_name} did not have a history file, creating one now.")
-            with open(target_path, "w") as f:
-                f.write("")  # Create an empty file
-
-    def delete_history_file(self):
-        target_path = self.get_history_file_path()
-        if os.path.exists(target_path):
-            os.remove(target_path)
-            get_general_logger().debug(f"Monitor {self.unique_name} history file deleted.")
+        get_history_store().create(self.unique_name)
+
+    @staticmethod
+    def delete_files(unique_name: str):
+        """Deletes a monitor's history and rollups, once what this process buffered for them is written. Its log file is kept."""
+        get_history_store().delete(unique_name)
+        get_rollup_store().delete(unique_name)
+        close_custom_logger_file("monitors/" + unique_name)
+
+    @staticmethod
+    def rename_files(old_unique_name: str, new_unique_name: str):
+        """Renames a monitor's history, rollups and log files, once what this process buffered for them is written."""
+        get_history_store().rename(old_unique_name, new_unique_name)
+        get_rollup_store().rename(old_unique_name, new_unique_name)
+        rename_custom_logger_file("monitors/" + old_unique_name, "monitors/" + new_unique_name)
 
     def recalculate_stats(self):
-        results = self.read_results_from_history_days(AVG_STATS_TIMESPAN_DAYS)
-        if len(results) > 0:
-            uptime_sum = 0
-            latency_sum = 0
-            for result in results:
-                uptime_sum += result.test_passed
-                latency_sum += result.calcualte_latency()
-            self.stats_avg_uptime = uptime_sum / len(results)
-            self.stats_avg_latency = latency_sum / len(results)
-            self.time_at_last_status_change = results[0].end_time  # Default to oldest result at first
-            for result in results:
-                if result.test_passed != self.last_query_passed:
-                    self.time_at_last_status_change = result.end_time  # Update to the most recent status change if any
-                    break
+        """Rebuilds the stats from the history. Only needed on demand, as new results update them incrementally."""
+        with mediator.monitor_results_lock:
+            self.__rolling_stats = build_rolling_stats(self.unique_name, timedelta(days=AVG_STATS_TIMESPAN_DAYS), datetime.now())
+            self.__apply_stats(self.__rolling_stats.get_aggregate(datetime.now()))
+
+    def refresh_stats(self):
+        """Slides the stats' window to now, e.g. for a monitor that has not had results for a while. Does not read the disk."""
+        with mediator.monitor_results_lock:
+            if self.__rolling_stats is not None:  # Otherwise the saved stats are still the latest, or they come from a worker process
+                self.__apply_stats(self.__rolling_stats.get_aggregate(datetime.now()))
+
+    def __apply_stats(self, aggregate: HistoryAggregate):
+        if aggregate.count > 0:
+            self.stats_avg_uptime = aggregate.uptime
+            self.stats_avg_latency = aggregate.average_latency_seconds
+            # The status last changed right after the most recent result with the other status, or before the window if there is none
+            last_other_status_end_time = aggregate.last_failed_end_time if self.last_query_passed else aggregate.last_passed_end_time
+            self.time_at_last_status_change = last_other_status_end_time or aggregate.first_end_time
         else:
             self.stats_avg_uptime = 0
             self.stats_avg_latency = 0
             self.time_at_last_status_change = datetime.now()
 
-    def get_history_file_path(self):
-        return f"data/history/{self.unique_name}.jsonl"
-
     def validate_and_apply_config_from_frontend(self, config: dict) -> None:
         """
         Applies the configuration received from the frontend if valid, otherwise raises an exception
@@ -348,30 +446,20 @@ class Monitor(Deserializable):
         # targetMonitor.time_at_last_status_change = datetime.now()
         # targetMonitor.stats_avg_uptime = 0
         # targetMonitor.stats_avg_latency = 0
-        targetMonitor._next_run_time = datetime.now() + timedelta(seconds=self.period_in_seconds)
+        targetMonitor.set_next_run_time()
 
         # Special considerations for monitor renames
         try:
             if targetMonitor.unique_name != config["original_name"]:
-                # Rename the history file if it exists
-                old_history_path = util.resolve_relative_path(f"data/history/{config['original_name']}.jsonl")
-                if os.path.exists(old_history_path):
-                    os.rename(old_history_path, f"data/history/{targetMonitor.unique_name}.jsonl")
-                # Rename the log file and reinitialize the logger
-                # First, release handlers for the previoius logger
-                if targetMonitor.__logger is not None:
-                    for handler in targetMonitor.__logger.handlers:
-                        targetMonitor.__logger.removeHandler(handler)
-                        handler.close()
-                # TODO: Don't hardcode the log path?
-                old_log_path = util.resolve_relative_path(f"logs/monitors/{config['original_name']}.log")
-                if os.path.exists(old_log_path):
-                    os.rename(old_log_path, f"logs/{targetMonitor.unique_name}.log")
+                mediator.get_monitors_manager().rename_monitor_files(config["original_name"], targetMonitor.unique_name)
+                # Reinitialize the logger with the renamed log file
                 targetMonitor.__logger = get_custom_logger("monitors/" + targetMonitor.unique_name)
         except Exception as e:
             get_general_logger().error(f"Error while renaming monitor history file: {e}")
             traceback.print_exc()
 
+        mediator.get_monitors_manager().reschedule_monitor(targetMonitor)
+
         self.log_monitor_event(f"Configuration modified by user.")
 
     def validate_monitor_configuration(self) -> bool:
@@ -1,7 +1,20 @@
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import queue
 import threading
+import time
 import common.mediator as mediator
 from monitor.monitor import Monitor
+from monitor.scheduler import MonitorScheduler
+from monitor.sharded_monitoring import ShardedMonitoringPool
+from common.debounced_flusher import DebouncedFlusher
+from common import http_client
+from history.history_compactor import HistoryCompactor
+from history.history_store import get_history_store
 from common.simple_queue import QueueEvents
 from common.serialization import Deserializable
 from common.custom_logging import get_general_logger
@@ -9,11 +22,26 @@ import common.serialization as serialization
 
 from common.settings_manager import settings
 
+MONITORS_CONFIG_FILE_PATH = "data/monitors.json"
+MONITORS_STATE_FILE_PATH = "data/monitors_state.json"  # Runtime state, changes with every result unlike the configuration
+
 
 class MonitorsManager(Deserializable):
 
     def __init__(self) -> None:
         self.monitors: list[Monitor] = []
+        self.__scheduler = MonitorScheduler()
+        self.__planned_wake_time: datetime | None = None  # When the monitoring loop will next wake up on its own
+        self.__executor: ThreadPoolExecutor | None = None
+        self.__execution_slots: asyncio.Semaphore | None = None
+        self.__in_flight_monitors: set[Monitor] = set()
+        self.__background_tasks: set[asyncio.Task] = set()
+        self.__last_tick_duration_s: float = 0
+        self.__sharded_pool: ShardedMonitoringPool | None = None  # Set when monitoring runs in worker processes
+        self.__owns_configs_file = True
+        self.__is_monitors_list_dirty = False  # Monitors added or removed since the last save
+        self.__saver = DebouncedFlusher(self.__save_dirty_monitors, settings.monitoring_save_delay_seconds, "monitors-saver")
+        self.__compactor = HistoryCompactor(lambda: [monitor.unique_name for monitor in list(self.monitors)])
         mediator.new_monitor_results.add(lambda _: self.checkIfAllMonitorsAreUpAndValid())
 
     def add_monitor(self, monitor: Monitor) -> None:
@@ -22,12 +50,54 @@ class MonitorsManager(Deserializable):
             if m.unique_name == monitor.unique_name:
                 raise ValueError(f"Monitor with name {monitor.unique_name} already exists")
         self.monitors.append(monitor)
+        self.__is_monitors_list_dirty = True
+        self.reschedule_monitor(monitor)
         self.checkIfAllMonitorsAreUpAndValid()
 
     def remove_monitor(self, monitor: Monitor) -> None:
         self.monitors.remove(monitor)
+        self.__is_monitors_list_dirty = True
+        self.__scheduler.unschedule(monitor)
+        if self.__sharded_pool is not None:
+            self.__sharded_pool.sync_configs()
         self.checkIfAllMonitorsAreUpAndValid()
 
+    def rename_monitor_files(self, old_unique_name: str, new_unique_name: str) -> None:
+        """
+        Renames a monitor's files after its name changed, before it is rescheduled under its new name.
+        When sharded, the worker running the monitor renames them first, as it holds them open and buffers writes to them.
+        """
+        if self.__sharded_pool is not None:
+            self.__sharded_pool.rename_monitor_files(old_unique_name, new_unique_name)
+        self.__compactor.forget(old_unique_name)
+        Monitor.rename_files(old_unique_name, new_unique_name)  # When sharded, only updates this process's open files and caches
+
+    def delete_monitor_files(self, unique_name: str) -> None:
+        """
+        Deletes the history and rollups of a removed monitor.
+        When sharded, the worker that ran the monitor deletes them first, as it may still execute it, hold its files open,
+        buffer writes to them or compact them.
+        """
+        if self.__sharded_pool is not None:
+            self.__sharded_pool.delete_monitor_files(unique_name)
+        self.__compactor.forget(unique_name)
+        Monitor.delete_files(unique_name)  # When sharded, only updates this process's open files and caches
+
+    def reschedule_monitor(self, monitor: Monitor) -> None:
+        """
+        Updates the schedule after a monitor's next run time or paused state changed,
+        waking the monitoring loop up if the monitor is now due before it would have woken up on its own.
+        """
+        if self.__sharded_pool is not None:
+            self.__sharded_pool.sync_configs()  # The schedule is kept by the worker responsible for the monitor
+            return
+        self.__scheduler.schedule(monitor)
+        if not monitor.paused and self.__planned_wake_time is not None and monitor._next_run_time < self.__planned_wake_time:
+            try:
+                mediator.bg_monitoring_queue.put_nowait(QueueEvents.SCHEDULE_CHANGED)
+            except queue.Full:
+                pass  # The loop has events waiting, so it is about to wake up anyway
+
     def create_and_add_empty_monitor(self) -> Monitor:
         unique_name = self.get_next_free_monitor_name()
         monitor = Monitor(unique_name=unique_name)
@@ -55,49 +125,237 @@ class MonitorsManager(Deserializable):
             get_general_logger().debug(f"Executing monitor {monitor.unique_name}")
             get_general_logger().debug(monitor.execute())
 
-    def execute_due_monitors(self) -> None:
-        """Executes all monitors that are due and prints the result."""
+    async def execute_due_monitors(self) -> None:
+        """
+        Executes all monitors whose deadline has passed concurrently on the monitoring event loop, and waits for all of them to complete.
+        At most settings.monitoring_max_parallel_executions monitors execute at the same time.
+        The side effects of each execution are serialized by the monitors themselves (see mediator.monitor_results_lock).
+        """
+        tick_start = time.perf_counter()
 
-        for monitor in self.monitors:
-            monitor.execute_if_due()
+        due_monitors = self.__scheduler.pop_due_monitors(datetime.now())
+        # Monitors still running (e.g. manually executed) are rescheduled when they complete
+        due_monitors = [(monitor, planned_start_time) for monitor, planned_start_time in due_monitors if monitor not in self.__in_flight_monitors]
+        if len(due_monitors) == 0:
+            return
+
+        await asyncio.gather(*(self.__execute_monitor(monitor, planned_start_time) for monitor, planned_start_time in due_monitors))
+
+        self.__last_tick_duration_s = time.perf_counter() - tick_start
+        get_general_logger().debug("Executed %d due monitors in %.3fs", len(due_monitors), self.__last_tick_duration_s)
+
+    async def __execute_monitor(self, monitor: Monitor, planned_start_time: datetime | None = None) -> None:
+        """Executes a single monitor, then schedules its next run. Never raises."""
+        self.__in_flight_monitors.add(monitor)
+        try:
+            await monitor.execute_async(planned_start_time, self.__execution_slots)
+        except Exception as e:
+            get_general_logger().error(f"Monitor {monitor.unique_name} failed to execute: {e}")
+        finally:
+            self.__in_flight_monitors.discard(monitor)
+            if monitor in self.monitors:
+                self.reschedule_monitor(monitor)
+
+    def get_last_tick_duration(self) -> float:
+        """Returns the wall time in seconds of the last execution of due monitors."""
+        return self.__last_tick_duration_s
+
+    def __get_executor(self) -> ThreadPoolExecutor:
+        """Returns the worker pool used for blocking work (non-async queries, results handling), creating it on first use."""
+        if self.__executor is None:
+            max_workers = max(1, settings.monitoring_max_parallel_executions)
+            self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="monitor-worker")
+        return self.__executor
+
+    def __start_background_task(self, coroutine) -> None:
+        """Runs a coroutine concurrently on the monitoring event loop, keeping a reference to it until it completes."""
+        task = asyncio.create_task(coroutine)
+        self.__background_tasks.add(task)
+        task.add_done_callback(self.__background_tasks.discard)
 
     def start_background_monitoring_thread(self) -> threading.Thread:
-        """Starts a background thread that continuously executes due monitors."""
+        """
+        Starts a background thread that runs the monitoring event loop and continuously executes due monitors,
+        or that dispatches the monitors to worker processes if settings.monitoring_worker_processes is set.
+        """
         mediator.main_loop_exited.add(self.stop_background_monitoring_thread)
 
+        if settings.monitoring_worker_processes > 0:
+            return self.__start_sharded_monitoring_thread(settings.monitoring_worker_processes)
+
+        # The queue is blocking, so it is listened to from its own thread to keep the event loop free
+        queue_listener = ThreadPoolExecutor(max_workers=1, thread_name_prefix="monitoring-queue-listener")
+
         async def background_monitoring_loop():
+            loop = asyncio.get_running_loop()
+            loop.set_default_executor(self.__get_executor())
+            self.__execution_slots = asyncio.Semaphore(max(1, settings.monitoring_max_parallel_executions))
+            for monitor in self.monitors:
+                if settings.monitoring_stagger_start_times and monitor.is_due():
+                    # Overdue since the last session, spread them out rather than running them all on the first tick
+                    monitor.set_startup_run_time()
+                self.__scheduler.schedule(monitor)
+
             while True:
-                # Wait listening for an event for a time, or continue after the timeout
-                event = mediator.bg_monitoring_queue.get(timeout_s=settings.general_interval)
+                # Sleep until the earliest deadline, still waking up every general_interval at most as a safety net
+                timeout_s = settings.general_interval
+                next_deadline = self.__scheduler.get_next_deadline()
+                if next_deadline is not None:
+                    timeout_s = max(0, min(timeout_s, (next_deadline - datetime.now()).total_seconds()))
+                self.__planned_wake_time = datetime.now() + timedelta(seconds=timeout_s)
+
+                # Wait listening for an event until then
+                event = await loop.run_in_executor(queue_listener, lambda: mediator.bg_monitoring_queue.get(timeout_s=timeout_s))
+                self.__log_received_event(event)
 
                 if event == QueueEvents.EXIT_APP:
                     get_general_logger().debug("Background monitoring loop exiting")
                     break
                 elif isinstance(event, Monitor):
                     # A monitor has been manually queued for immediate execution
-                    event.execute()
-                    pass
-                else:
-                    # Queue timed out, perform the regular loop
-                    self.execute_due_monitors()
+                    if event in self.__in_flight_monitors:
+                        get_general_logger().debug(f"Monitor {event.unique_name} is already executing, ignoring the request to execute it")
+                    else:
+                        self.__start_background_task(self.__execute_monitor(event))
+
+                # Whatever woke the loop up, start the monitors that came due in the meantime
+                self.__start_background_task(self.execute_due_monitors())
+
+            # Abandon the executions still in flight, e.g. queries waiting on their timeout
+            for task in list(self.__background_tasks):
+                task.cancel()
+            await asyncio.gather(*self.__background_tasks, return_exceptions=True)
+            http_client.close_connections()
 
         def thread_target():
-            asyncio.run(background_monitoring_loop())  # Run the coroutine in this thread's event loop
+            self.__compactor.start()  # Where the history is written, i.e. in each worker process when sharded
+            asyncio.run(background_monitoring_loop())  # Run the coroutine in this thread's event loop, also shuts down the worker pool
+            queue_listener.shutdown(wait=False)
+            self.__executor = None
+            self.__compactor.stop()
+            get_history_store().close()  # Writes the results still buffered
+            self.__saver.stop()  # Save the results of the last executions
 
         thread = threading.Thread(target=thread_target)
         thread.start()
         return thread
 
+    def __start_sharded_monitoring_thread(self, worker_count: int) -> threading.Thread:
+        """Starts the monitoring worker processes, and a background thread that forwards them the monitoring queue's events."""
+        self.__sharded_pool = ShardedMonitoringPool(self, worker_count)
+
+        def thread_target():
+            self.__sharded_pool.start()
+            while True:
+                event = mediator.bg_monitoring_queue.get(timeout_s=settings.general_interval)
+                self.__log_received_event(event)
+
+                if event == QueueEvents.EXIT_APP:
+                    get_general_logger().debug("Background monitoring loop exiting")
+                    break
+                elif isinstance(event, Monitor):
+                    # A monitor has been manually queued for immediate execution
+                    self.__sharded_pool.execute_in_background(event)
+            self.__sharded_pool.stop()
+            self.__saver.stop()  # Save the last results received from the workers
+
+        thread = threading.Thread(target=thread_target)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def __log_received_event(event) -> None:
+        if event == QueueEvents.NO_EVENT or not get_general_logger().isEnabledFor(logging.DEBUG):
+            return
+        stats = mediator.bg_monitoring_queue.get_stats()
+        description = f"execution request for monitor {event.unique_name}" if isinstance(event, Monitor) else event
+        get_general_logger().debug(f"Background monitoring received {description} after {stats.last_wait_s:.3f}s in queue, {stats.depth} events still waiting")
+
+    def disable_configs_file(self) -> None:
+        """Prevents this manager from writing data/monitors.json, e.g. in monitoring worker processes which only hold some of the monitors."""
+        self.__owns_configs_file = False
+
     def stop_background_monitoring_thread(self) -> None:
         mediator.bg_monitoring_queue.put(QueueEvents.EXIT_APP)
 
+    def request_save(self) -> None:
+        """
+        Saves the monitors that changed within settings.monitoring_save_delay_seconds, from a background thread.
+        Meant for frequent changes, e.g. new results, so that they are batched into a single write.
+        """
+        if self.__owns_configs_file:
+            self.__saver.request_flush()
+
     def save_monitors_configs_to_file(self) -> None:
-        # Prepare monitors for serialization
+        """Saves all the monitors immediately, e.g. after the user edited them."""
+        if not self.__owns_configs_file:
+            return
+
+        # Called both from the monitoring workers and the GUI bridge
+        with mediator.monitor_results_lock:
+            # Prepare monitors for serialization
+            for monitor in self.monitors:
+                monitor.create_history_file_if_not_exists()  # Ensure the history files exist
+                monitor.validate_monitor_configuration()  # Ensure the latest validation status is saved
+            self.__is_monitors_list_dirty = True  # Changes inside the monitors' queries are not tracked, so force a full save
+        self.__saver.flush_now()
+
+    def __save_dirty_monitors(self) -> None:
+        """
+        Writes the configuration file if any monitor's configuration changed, and the runtime state file if any monitor's state changed.
+        The state is written on its own so that a new result does not rewrite the configuration.
+        """
+        with mediator.monitor_results_lock:
+            is_config_dirty = self.__is_monitors_list_dirty or any(monitor.is_config_dirty() for monitor in self.monitors)
+            is_state_dirty = is_config_dirty or any(monitor.is_state_dirty() for monitor in self.monitors)
+            if not is_state_dirty:
+                return
+
+            self.__is_monitors_list_dirty = False
+            for monitor in self.monitors:
+                monitor.mark_as_saved()
+            configs_json = self.__encode_configs() if is_config_dirty else None
+            state_json = self.__encode_runtime_state()
+
+        # Writing happens outside of the lock to not hold up the monitors
+        if configs_json is not None:
+            serialization.write_text_file_atomically(MONITORS_CONFIG_FILE_PATH, configs_json)
+        serialization.write_text_file_atomically(MONITORS_STATE_FILE_PATH, state_json)
+        get_general_logger().debug(f"Saved monitors {'configuration and state' if configs_json is not None else 'state'}")
+
+    def __encode_configs(self) -> str:
+        encoded_manager = serialization.to_dict_encoded_with_types(self)
+        for encoded_monitor in encoded_manager["value"]["monitors"]:
+            for attribute in Monitor.RUNTIME_STATE_ATTRIBUTES:
+                encoded_monitor["value"].pop(attribute, None)
+        return json.dumps(encoded_manager, indent=4)
+
+    def __encode_runtime_state(self) -> str:
+        runtime_states = {
+            monitor.unique_name: {attribute: getattr(monitor, attribute) for attribute in Monitor.RUNTIME_STATE_ATTRIBUTES} for monitor in self.monitors
+        }
+        return serialization.to_encoded_jsonl(runtime_states)
+
+    def load_runtime_state_from_file(self) -> None:
+        """
+        Restores the monitors' runtime state saved by a previous session, to be called after loading the configuration file.
+        Monitors without a saved state (e.g. configuration files from older versions) keep the state found in the configuration file.
+        """
+        runtime_states = {}
+        try:
+            if os.path.exists(MONITORS_STATE_FILE_PATH):
+                runtime_states = serialization.load_from_json_file(MONITORS_STATE_FILE_PATH)
+        except Exception as e:
+            get_general_logger().warning(f"Could not load the monitors' runtime state, starting from the configuration only: {e}")
+
         for monitor in self.monitors:
-            monitor.create_history_file_if_not_exists()  # Ensure the history files exist
-            monitor.validate_monitor_configuration()  # Ensure the latest validation status is saved
-            monitor.recalculate_stats()  # Ensure the latest stats are saved
-        serialization.save_as_json_file(self, "data/monitors.json")
+            runtime_state = runtime_states.get(monitor.unique_name)
+            if runtime_state is None:
+                monitor.set_next_run_time()  # Otherwise computed before the monitor had its name
+                continue
+            for attribute, value in runtime_state.items():
+                if attribute in Monitor.RUNTIME_STATE_ATTRIBUTES:
+                    setattr(monitor, attribute, value)
 
     def checkIfAllMonitorsAreUpAndValid(self):
         # Determine if all monitors are up, some are down, or some have exceptions/issues
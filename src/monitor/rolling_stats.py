@@ -0,0 +1,142 @@
+"""
+Sliding-window stats of a monitor's results, updated in constant time with each new result instead of re-reading its history.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from history.history_store import HistoryAggregate, get_history_store
+from history.rollups import get_bucket_start, get_rollup_store
+from queries.query_result import QueryResult
+
+BUCKET_RESOLUTION = "hour"  # Same buckets as the per-hour rollups, which the stats are rebuilt from
+
+
+@dataclass
+class _Bucket:
+    start_time: datetime
+    count: int = 0
+    passed_count: int = 0
+    latency_sum_seconds: float = 0
+    first_end_time: datetime | None = None
+
+
+class RollingStats:
+    """
+    Running totals over the results of the last `window`, kept per hour so that the oldest hour can be subtracted once it
+    leaves the window. The window therefore slides by whole hours, i.e. it may span up to an hour more than `window`.
+    Not thread-safe, the monitor updates it under mediator.monitor_results_lock.
+    """
+
+    def __init__(self, window: timedelta) -> None:
+        self.__window = window
+        self.__buckets: deque[_Bucket] = deque()
+        self.__count = 0
+        self.__passed_count = 0
+        self.__latency_sum_seconds = 0.0
+        self.__last_passed_end_time: datetime | None = None
+        self.__last_failed_end_time: datetime | None = None
+
+    def add_result(self, query_result: QueryResult) -> None:
+        latency_seconds = (query_result.end_time - query_result.start_time).total_seconds()
+        self.__add(
+            query_result.end_time,
+            count=1,
+            passed_count=1 if query_result.test_passed else 0,
+            latency_sum_seconds=latency_seconds,
+            first_end_time=query_result.end_time,
+            last_passed_end_time=query_result.end_time if query_result.test_passed else None,
+            last_failed_end_time=query_result.end_time if query_result.test_passed is False else None,
+        )
+
+    def add_aggregate(self, aggregate: HistoryAggregate) -> None:
+        """Adds the summary of the results of one bucket, e.g. from a rollup, in chronological order with the other additions."""
+        if aggregate.count == 0:
+            return
+        self.__add(
+            aggregate.first_end_time,
+            count=aggregate.count,
+            passed_count=aggregate.passed_count,
+            latency_sum_seconds=aggregate.average_latency_seconds * aggregate.count,
+            first_end_time=aggregate.first_end_time,
+            last_passed_end_time=aggregate.last_passed_end_time,
+            last_failed_end_time=aggregate.last_failed_end_time,
+        )
+
+    def get_aggregate(self, now: datetime) -> HistoryAggregate:
+        """Returns the stats of the window ending now, after dropping the hours that left it."""
+        self.__expire(now)
+        if self.__count == 0:
+            return HistoryAggregate()
+
+        window_start = self.__buckets[0].start_time
+        return HistoryAggregate(
+            count=self.__count,
+            passed_count=self.__passed_count,
+            average_latency_seconds=self.__latency_sum_seconds / self.__count,
+            first_end_time=self.__buckets[0].first_end_time,
+            # The last results of each status are kept as long as they are in the window
+            last_passed_end_time=self.__last_passed_end_time if self.__is_in_window(self.__last_passed_end_time, window_start) else None,
+            last_failed_end_time=self.__last_failed_end_time if self.__is_in_window(self.__last_failed_end_time, window_start) else None,
+        )
+
+    def __add(
+        self,
+        end_time: datetime,
+        count: int,
+        passed_count: int,
+        latency_sum_seconds: float,
+        first_end_time: datetime,
+        last_passed_end_time: datetime | None,
+        last_failed_end_time: datetime | None,
+    ) -> None:
+        bucket_start = get_bucket_start(end_time, BUCKET_RESOLUTION)
+        if not self.__buckets or self.__buckets[-1].start_time < bucket_start:
+            self.__buckets.append(_Bucket(start_time=bucket_start, first_end_time=first_end_time))
+        bucket = self.__buckets[-1]  # A late result (e.g. clock change) is counted in the latest hour
+
+        bucket.count += count
+        bucket.passed_count += passed_count
+        bucket.latency_sum_seconds += latency_sum_seconds
+        self.__count += count
+        self.__passed_count += passed_count
+        self.__latency_sum_seconds += latency_sum_seconds
+        if last_passed_end_time is not None:
+            self.__last_passed_end_time = max(filter(None, (self.__last_passed_end_time, last_passed_end_time)))
+        if last_failed_end_time is not None:
+            self.__last_failed_end_time = max(filter(None, (self.__last_failed_end_time, last_failed_end_time)))
+
+    def __expire(self, now: datetime) -> None:
+        window_start = get_bucket_start(now - self.__window, BUCKET_RESOLUTION)
+        while self.__buckets and self.__buckets[0].start_time < window_start:
+            bucket = self.__buckets.popleft()
+            self.__count -= bucket.count
+            self.__passed_count -= bucket.passed_count
+            self.__latency_sum_seconds -= bucket.latency_sum_seconds
+        if not self.__buckets:
+            self.__latency_sum_seconds = 0.0  # Clears the floating point drift of the subtractions
+
+    @staticmethod
+    def __is_in_window(end_time: datetime | None, window_start: datetime) -> bool:
+        return end_time is not None and end_time >= window_start
+
+
+def build_rolling_stats(unique_name: str, window: timedelta, now: datetime) -> RollingStats:
+    """
+    Builds a monitor's stats from its history: from its per-hour rollups for the hours already rolled up,
+    which is a few hundred lines for a week, then from its raw results.
+    """
+    rolling_stats = RollingStats(window)
+    since = get_bucket_start(now - window, BUCKET_RESOLUTION)
+
+    raw_since = since
+    watermark = get_rollup_store().get_watermark(unique_name)
+    if watermark is not None and watermark > since:
+        for rollup in get_rollup_store().read(unique_name, BUCKET_RESOLUTION, since, watermark):
+            rolling_stats.add_aggregate(rollup.to_aggregate())
+        raw_since = watermark
+
+    for query_result in get_history_store().read_range(unique_name, raw_since):
+        rolling_stats.add_result(query_result)
+    return rolling_stats
@@ -0,0 +1,124 @@
+from __future__ import annotations
+from datetime import datetime, timedelta
+import heapq
+import itertools
+import math
+import random
+import threading
+from typing import TYPE_CHECKING
+import zlib
+
+if TYPE_CHECKING:
+    from monitor.monitor import Monitor
+
+
+def compute_next_run_time(unique_name: str, period_in_seconds: float, now: datetime, stagger: bool = True, max_jitter_seconds: float = 0) -> datetime:
+    """
+    Computes when a monitor should run next.
+    With stagger, runs are placed on a grid of the monitor's period, offset by a stable hash of its name,
+    so that monitors sharing a period are spread evenly across it instead of all coming due at once.
+    The placement only depends on the name and period, so it is the same for new, edited and reloaded monitors.
+    Without stagger, the next run is simply one period from now.
+    :param max_jitter_seconds: Upper bound of a random delay added on top, capped to the period
+    """
+    if stagger:
+        phase = _get_phase_fraction(unique_name) * period_in_seconds
+        periods_elapsed = math.floor((now.timestamp() - phase) / period_in_seconds)
+        next_run_timestamp = (periods_elapsed + 1) * period_in_seconds + phase
+        next_run_time = datetime.fromtimestamp(next_run_timestamp)
+    else:
+        next_run_time = now + timedelta(seconds=period_in_seconds)
+
+    if max_jitter_seconds > 0:
+        next_run_time += timedelta(seconds=random.uniform(0, min(max_jitter_seconds, period_in_seconds)))
+
+    return next_run_time
+
+
+def compute_startup_run_time(unique_name: str, window_seconds: float, now: datetime) -> datetime:
+    """
+    Computes when a monitor that is overdue at startup should run: within window_seconds from now, at the same relative
+    position as its phase in compute_next_run_time(), so that overdue monitors are spread over the window rather than
+    all run at once, nor each pushed to its next grid point up to a whole period away.
+    """
+    return now + timedelta(seconds=_get_phase_fraction(unique_name) * window_seconds)
+
+
+def _get_phase_fraction(unique_name: str) -> float:
+    """Returns a monitor's stable position in [0, 1) within its period, from its name."""
+    return zlib.crc32(unique_name.encode("utf-8")) / 2**32  # Stable across runs, unlike hash()
+
+
+def compute_retry_delay(
+    attempt: int, base_interval_seconds: float, backoff_factor: float = 2, jitter_percent: float = 0, max_delay_seconds: float | None = None
+) -> float:
+    """
+    Computes how long to wait before retrying after a failed attempt, with an exponential backoff and a random jitter.
+    E.g. with a 1s base interval and a factor of 2: ~1s after the first attempt, ~2s after the second, ~4s after the third...
+    :param attempt: The number of the attempt that just failed, starting at 1
+    :param jitter_percent: The delay is randomly spread by up to this percentage, both ways
+    :param max_delay_seconds: Upper bound of the delay, jitter included
+    """
+    delay = base_interval_seconds * backoff_factor ** (attempt - 1)
+    if jitter_percent > 0:
+        delay *= 1 + random.uniform(-jitter_percent, jitter_percent) / 100
+    if max_delay_seconds is not None:
+        delay = min(delay, max_delay_seconds)
+    return max(0, delay)
+
+
+class MonitorScheduler:
+    """
+    Min-heap of monitors keyed on their next run time, so the monitoring loop can sleep exactly until the earliest deadline.
+
+    Entries are invalidated lazily: (re)scheduling a monitor pushes a new entry and only the latest entry of each monitor is valid,
+    outdated ones are simply discarded when they reach the top of the heap.
+    Paused monitors are not kept in the heap, they are scheduled again when resumed.
+    Thread-safe, as monitors are (re)scheduled from both the monitoring loop and the GUI bridge.
+    """
+
+    def __init__(self) -> None:
+        self.__heap: list[tuple[datetime, int, Monitor]] = []
+        self.__valid_entries: dict[Monitor, int] = {}  # Monitor -> sequence number of its only valid entry
+        self.__sequence = itertools.count()  # Tie-breaker, also identifies entries
+        self.__lock = threading.Lock()
+
+    def schedule(self, monitor: Monitor) -> None:
+        """(Re)schedules a monitor at its current _next_run_time, replacing any previous entry."""
+        with self.__lock:
+            if monitor.paused:
+                self.__valid_entries.pop(monitor, None)
+                return
+            sequence_number = next(self.__sequence)
+            self.__valid_entries[monitor] = sequence_number
+            heapq.heappush(self.__heap, (monitor._next_run_time, sequence_number, monitor))
+
+    def unschedule(self, monitor: Monitor) -> None:
+        """Removes a monitor from the schedule, e.g. when it is deleted."""
+        with self.__lock:
+            self.__valid_entries.pop(monitor, None)
+
+    def pop_due_monitors(self, now: datetime) -> list[tuple[Monitor, datetime]]:
+        """
+        Removes and returns all monitors whose deadline has passed, with their planned start time.
+        They stay out of the schedule until they are scheduled again, typically after their execution.
+        """
+        due_monitors = []
+        with self.__lock:
+            while self.__heap and self.__heap[0][0] <= now:
+                deadline, sequence_number, monitor = heapq.heappop(self.__heap)
+                if self.__valid_entries.get(monitor) == sequence_number:
+                    del self.__valid_entries[monitor]
+                    due_monitors.append((monitor, deadline))
+        return due_monitors
+
+    def get_next_deadline(self) -> datetime | None:
+        """Returns the earliest deadline in the schedule, or None if nothing is scheduled."""
+        with self.__lock:
+            # Discard outdated entries until a valid one is at the top
+            while self.__heap and self.__valid_entries.get(self.__heap[0][2]) != self.__heap[0][1]:
+                heapq.heappop(self.__heap)
+            return self.__heap[0][0] if self.__heap else None
+
+    def __len__(self) -> int:
+        return len(self.__valid_entries)
@@ -0,0 +1,303 @@
+"""
+Runs the monitors in worker processes instead of the application process, so that query processing, serialization
+and results handling use all cores instead of contending for the GIL of a single process.
+
+Monitors are assigned to a worker by a stable hash of their name. Each worker runs the regular background monitoring loop
+on its own monitors and writes their history and logs. The application process keeps the complete list of monitors,
+forwards them configuration changes and manual executions, and aggregates the workers' results for the tray icon and the GUI.
+"""
+
+from datetime import datetime
+import multiprocessing
+import threading
+from typing import TYPE_CHECKING
+import zlib
+
+import common.mediator as mediator
+import common.serialization as serialization
+from common.custom_logging import close_custom_logger_file, get_general_logger
+from common.settings_manager import settings
+from monitor.monitor import Monitor
+
+if TYPE_CHECKING:
+    from monitor.monitors_manager import MonitorsManager
+
+WORKER_STOP_TIMEOUT_S = 10
+
+
+def get_shard_index(unique_name: str, shard_count: int) -> int:
+    """Returns the index of the worker responsible for a monitor. Stable across runs, unlike hash()."""
+    return zlib.crc32(unique_name.encode("utf-8")) % shard_count
+
+
+class ShardedMonitoringPool:
+    """
+    Application-side handle on the monitoring worker processes.
+
+    Messages to a worker (one queue per worker):
+        ("sync", {unique_name: encoded config}, {unique_name: next run time}): The complete configuration of the monitors the worker
+            is responsible for, and when they are due, only used for the monitors new to the worker, e.g. overdue at startup
+        ("execute", unique_name): Execute a monitor immediately
+        ("rename", old_unique_name, new_unique_name): Stop running a renamed monitor and rename its files
+        ("delete", unique_name): Stop running a removed monitor and delete its files
+        ("exit",): Stop monitoring and exit
+    Messages from the workers (one shared queue):
+        ("state", unique_name, {attribute: value}): A monitor's runtime state after it handled a new result
+        ("renamed", old_unique_name, new_unique_name): A monitor's files were renamed, it can be synced under its new name
+        ("deleted", unique_name): A monitor's files were deleted, and will not be recreated by the worker
+    """
+
+    def __init__(self, monitors_manager: "MonitorsManager", worker_count: int) -> None:
+        self.__monitors_manager = monitors_manager
+        self.__worker_count = worker_count
+        self.__context = multiprocessing.get_context("spawn")  # Identical behavior on all platforms, and no inherited threads/locks
+        self.__processes: list[multiprocessing.Process] = []
+        self.__command_queues: list[multiprocessing.Queue] = []
+        self.__state_queue = self.__context.Queue()
+        self.__listener_thread: threading.Thread | None = None
+        self.__last_synced_configs: list[dict[str, str] | None] = [None] * worker_count
+        self.__sync_lock = threading.Lock()
+        self.__pending_replies: dict[tuple[str, str], threading.Event] = {}  # Set once a worker replied (reply, unique_name)
+
+    def start(self) -> None:
+        get_general_logger().info(f"Starting {self.__worker_count} monitoring worker processes.")
+        for shard_index in range(self.__worker_count):
+            command_queue = self.__context.Queue()
+            process = self.__context.Process(
+                target=run_worker,
+                args=(shard_index, self.__worker_count, command_queue, self.__state_queue),
+                name=f"monitoring-worker-{shard_index}",
+                daemon=True,
+            )
+            process.start()
+            self.__processes.append(process)
+            self.__command_queues.append(command_queue)
+
+        self.__listener_thread = threading.Thread(target=self.__listen_to_workers, name="monitoring-workers-listener", daemon=True)
+        self.__listener_thread.start()
+        self.sync_configs()
+
+    def stop(self) -> None:
+        get_general_logger().info("Stopping monitoring worker processes.")
+        for command_queue in self.__command_queues:
+            command_queue.put(("exit",))
+        for process in self.__processes:
+            process.join(WORKER_STOP_TIMEOUT_S)
+            if process.is_alive():
+                get_general_logger().warning(f"{process.name} did not exit in time, terminating it.")
+                process.terminate()
+        self.__state_queue.put(None)  # Stops the listener
+        if self.__listener_thread is not None:
+            self.__listener_thread.join()
+        self.__processes.clear()
+        self.__command_queues.clear()
+
+    def execute_in_background(self, monitor: Monitor) -> None:
+        """Asks the worker responsible for the monitor to execute it immediately."""
+        shard_index = get_shard_index(monitor.unique_name, self.__worker_count)
+        self.__command_queues[shard_index].put(("execute", monitor.unique_name))
+
+    def rename_monitor_files(self, old_unique_name: str, new_unique_name: str) -> None:
+        """
+        Has the worker responsible for a renamed monitor stop running it and rename its files, and waits until it is done.
+        The monitor must only be synced under its new name afterwards, possibly to another worker.
+        """
+        if not self.__command_queues:
+            return
+
+        close_custom_logger_file("monitors/" + old_unique_name)  # This process logs to it too, e.g. configuration changes
+        self.__send_and_wait_for_reply(("rename", old_unique_name, new_unique_name), "renamed")
+
+    def delete_monitor_files(self, unique_name: str) -> None:
+        """
+        Has the worker responsible for a removed monitor stop running it and delete its files, and waits until it is done,
+        so that the worker does not write to them afterwards, e.g. with a result that was being handled or buffered.
+        """
+        if not self.__command_queues:
+            return
+        self.__send_and_wait_for_reply(("delete", unique_name), "deleted")
+
+    def __send_and_wait_for_reply(self, command: tuple, reply: str) -> None:
+        """Sends a command about a monitor to the worker responsible for it, and waits until it replies that it is done."""
+        unique_name = command[1]
+        replied = self.__pending_replies[(reply, unique_name)] = threading.Event()
+        shard_index = get_shard_index(unique_name, self.__worker_count)
+        self.__command_queues[shard_index].put(command)
+        if not replied.wait(WORKER_STOP_TIMEOUT_S):
+            get_general_logger().error(f"Monitoring worker {shard_index + 1} did not complete {command[0]} of monitor {unique_name} in time.")
+        self.__pending_replies.pop((reply, unique_name), None)
+
+    def sync_configs(self) -> None:
+        """Sends each worker the configuration of its monitors, if it changed since it was last sent."""
+        if not self.__command_queues:
+            return
+
+        with self.__sync_lock:
+            configs_per_shard: list[dict[str, str]] = [{} for _ in range(self.__worker_count)]
+            next_run_times_per_shard: list[dict[str, datetime]] = [{} for _ in range(self.__worker_count)]
+            for monitor in list(self.__monitors_manager.monitors):
+                config = {attribute: getattr(monitor, attribute) for attribute in Monitor.CONFIG_ATTRIBUTES}
+                shard_index = get_shard_index(monitor.unique_name, self.__worker_count)
+                configs_per_shard[shard_index][monitor.unique_name] = serialization.to_encoded_jsonl(config)
+                next_run_times_per_shard[shard_index][monitor.unique_name] = monitor._next_run_time
+
+            for shard_index, configs in enumerate(configs_per_shard):
+                if configs != self.__last_synced_configs[shard_index]:
+                    self.__command_queues[shard_index].put(("sync", configs, next_run_times_per_shard[shard_index]))
+                    self.__last_synced_configs[shard_index] = configs
+
+    def __listen_to_workers(self) -> None:
+        while True:
+            message = self.__state_queue.get()
+            if message is None:
+                return
+            try:
+                if message[0] in ("renamed", "deleted"):
+                    replied = self.__pending_replies.get((message[0], message[1]))
+                    if replied is not None:
+                        replied.set()
+                else:
+                    _, unique_name, state = message
+                    self.__apply_monitor_state(unique_name, state)
+            except Exception as e:
+                get_general_logger().error(f"Error while handling message from a monitoring worker: {e}")
+
+    def __apply_monitor_state(self, unique_name: str, state: dict) -> None:
+        with mediator.monitor_results_lock:
+            monitor = self.__monitors_manager.get_monitor_by_name(unique_name)
+            if monitor is None:
+                return  # Removed or renamed since
+
+            status_changed = monitor.last_query_passed != state["last_query_passed"]
+            for attribute, value in state.items():
+                setattr(monitor, attribute, value)
+
+            if status_changed:
+                mediator.monitor_status_changed.trigger(unique_name)
+            mediator.new_monitor_results.trigger(unique_name)
+            self.__monitors_manager.request_save()
+
+
+def run_worker(shard_index: int, shard_count: int, command_queue: multiprocessing.Queue, state_queue: multiprocessing.Queue) -> None:
+    """Entry point of a monitoring worker process."""
+    import common.custom_logging as custom_logging
+    import common.settings_manager as settings_manager
+    from monitor.monitors_manager import MonitorsManager
+
+    custom_logging.initialize()
+    settings_manager.load_configs()
+    settings_manager.settings.monitoring_worker_processes = 0  # Workers run their monitors themselves
+    custom_logging.set_log_level(settings_manager.settings.general_log_level)
+    custom_logging.set_structured_format(settings_manager.settings.logs_structured_format)
+    custom_logging.set_rotation_policy(
+        settings_manager.settings.logs_max_file_size_mb, settings_manager.settings.logs_max_file_age_days, settings_manager.settings.logs_rotated_files_kept
+    )
+    get_general_logger().info(f"Monitoring worker {shard_index + 1}/{shard_count} starting.")
+
+    monitors_manager = MonitorsManager()
+    monitors_manager.disable_configs_file()  # The application process owns data/monitors.json
+    mediator.register_monitors_manager(monitors_manager)
+
+    def send_monitor_state(unique_name: str):
+        monitor = monitors_manager.get_monitor_by_name(unique_name)
+        if monitor is not None:
+            state_queue.put(("state", unique_name, {attribute: getattr(monitor, attribute) for attribute in Monitor.RUNTIME_STATE_ATTRIBUTES}))
+
+    mediator.new_monitor_results.add(send_monitor_state)
+    monitoring_thread = monitors_manager.start_background_monitoring_thread()
+    applied_configs: dict[str, str] = {}
+
+    while True:
+        command = command_queue.get()
+        if command[0] == "exit":
+            break
+        elif command[0] == "execute":
+            monitor = monitors_manager.get_monitor_by_name(command[1])
+            if monitor is not None:
+                monitor.execute_in_background()
+        elif command[0] == "sync":
+            _apply_synced_configs(monitors_manager, command[1], command[2], applied_configs)
+        elif command[0] == "rename":
+            _rename_monitor(monitors_manager, command[1], command[2], applied_configs)
+            state_queue.put(("renamed", command[1], command[2]))
+        elif command[0] == "delete":
+            _delete_monitor(monitors_manager, command[1], applied_configs)
+            state_queue.put(("deleted", command[1]))
+        else:
+            get_general_logger().error(f"Monitoring worker received an unknown command: {command}")
+
+    mediator.main_loop_exited.trigger()
+    monitoring_thread.join()
+    get_general_logger().info(f"Monitoring worker {shard_index + 1}/{shard_count} exited.")
+
+
+def _apply_synced_configs(
+    monitors_manager: "MonitorsManager", encoded_configs: dict[str, str], next_run_times: dict[str, datetime], applied_configs: dict[str, str]
+) -> None:
+    """
+    Adds, updates and removes the worker's monitors to match the configurations sent by the application process.
+    :param next_run_times: When the monitors are due according to the application process, kept for new monitors
+    :param applied_configs: The encoded configurations applied by the previous sync, updated in place
+    """
+    with mediator.monitor_results_lock:
+        for monitor in list(monitors_manager.monitors):
+            if monitor.unique_name not in encoded_configs:
+                monitors_manager.remove_monitor(monitor)
+
+        for unique_name, encoded_config in encoded_configs.items():
+            if applied_configs.get(unique_name) == encoded_config:
+                continue  # Unchanged
+
+            monitor = monitors_manager.get_monitor_by_name(unique_name)
+            is_new_monitor = monitor is None
+            if is_new_monitor:
+                monitor = Monitor(unique_name=unique_name)  # Picks up its last status from its history
+
+            for attribute, value in serialization.from_encoded_json(encoded_config).items():
+                setattr(monitor, attribute, value)
+            if is_new_monitor and isinstance(next_run_times.get(unique_name), datetime):
+                monitor._next_run_time = next_run_times[unique_name]
+                if settings.monitoring_stagger_start_times and monitor.is_due():
+                    monitor.set_startup_run_time()  # Overdue since the last session, same as in MonitorsManager's monitoring loop
+            else:
+                monitor.set_next_run_time()
+
+            if is_new_monitor:
+                monitors_manager.add_monitor(monitor)
+            else:
+                monitors_manager.reschedule_monitor(monitor)
+
+    applied_configs.clear()
+    applied_configs.update(encoded_configs)
+
+
+def _rename_monitor(monitors_manager: "MonitorsManager", old_unique_name: str, new_unique_name: str, applied_configs: dict[str, str]) -> None:
+    """
+    Stops running a renamed monitor and renames its files, which this worker holds open and buffers writes to.
+    The application process then syncs it under its new name, to the worker responsible for that name.
+    """
+    with mediator.monitor_results_lock:
+        monitor = monitors_manager.get_monitor_by_name(old_unique_name)
+        if monitor is not None:
+            monitors_manager.remove_monitor(monitor)
+        applied_configs.pop(old_unique_name, None)
+        try:
+            monitors_manager.rename_monitor_files(old_unique_name, new_unique_name)
+        except Exception as e:
+            get_general_logger().error(f"Error while renaming the files of monitor {old_unique_name}: {e}")
+
+
+def _delete_monitor(monitors_manager: "MonitorsManager", unique_name: str, applied_configs: dict[str, str]) -> None:
+    """
+    Stops running a removed monitor and deletes its files, after its results still being handled or buffered are written
+    and its compaction if any is done, so that nothing recreates them. Usually already removed by the previous sync.
+    """
+    with mediator.monitor_results_lock:
+        monitor = monitors_manager.get_monitor_by_name(unique_name)
+        if monitor is not None:
+            monitors_manager.remove_monitor(monitor)
+        applied_configs.pop(unique_name, None)
+        try:
+            monitors_manager.delete_monitor_files(unique_name)
+        except Exception as e:
+            get_general_logger().error(f"Error while deleting the files of monitor {unique_name}: {e}")
@@ -1,9 +1,12 @@
+import asyncio
 from datetime import datetime
 
 from http.client import HTTPResponse
 import urllib
 from urllib.error import HTTPError, URLError
 from urllib.request import Request
+from common import http_client
+from common.host_limiter import get_host_limiter
 from queries.query import Query
 from queries.query_result import QueryResult
 
@@ -57,6 +60,28 @@ class HttpQuery(Query):
             # Timeout, URL does not exist or there is a connection issue
             return self._postprocess_query_result(self._process_exception(e))
 
+    async def execute_async(self, execution_slot: asyncio.Semaphore | None = None) -> QueryResult:
+        # Same as execute(), but through the asyncio http client so that the monitoring thread is never blocked
+        async with get_host_limiter().limit(self.url, execution_slot) as queue_wait_seconds:
+            query_result = await self.__fetch_and_process()
+        query_result.queue_wait_seconds = queue_wait_seconds
+        return query_result
+
+    async def __fetch_and_process(self) -> QueryResult:
+        self._start_time = datetime.now()  # After waiting on the host limiter, so the latency only reflects the service
+        try:
+            response = await http_client.fetch(self.url, self.timeout)
+            return self._postprocess_query_result(self._process_response(response))
+        except ValueError as e:
+            # URL is invalid?
+            return self._postprocess_query_result(self._process_exception(e))
+        except HTTPError as e:
+            # 404, 500...
+            return self._postprocess_query_result(self._process_exception(e))
+        except URLError as e:
+            # Timeout, URL does not exist or there is a connection issue
+            return self._postprocess_query_result(self._process_exception(e))
+
     def _process_response(self, response: HTTPResponse) -> QueryResult:
         """
         Process the response from the HTTP request and builds the QueryResult.
@@ -1,3 +1,6 @@
+import asyncio
+import contextlib
+
 from queries.query_result import QueryResult
 from common.serialization import Deserializable
 
@@ -31,10 +34,18 @@ class Query(Deserializable):
         """
         Execute the query on the given cursor.
         """
-
-        # TODO: Make async, or make the ENTIRE backend monitoring logic its own service
         raise NotImplementedError("Subclasses must implement this method.")
 
+    async def execute_async(self, execution_slot: asyncio.Semaphore | None = None) -> QueryResult:
+        """
+        Execute the query without blocking the event loop.
+        Subclasses with a native asynchronous implementation override this,
+        others have their blocking execute() run on the event loop's default executor.
+        :param execution_slot: Global limit on running queries, held while the query runs but not while it waits on per-origin limits
+        """
+        async with execution_slot or contextlib.nullcontext():
+            return await asyncio.to_thread(self.execute)
+
     def _postprocess_query_result(self, query_result: QueryResult) -> QueryResult:
         """
         Hook to allow for post-processing of the query result.
@@ -5,6 +5,8 @@ from common.serialization import Deserializable
 class QueryResult(Deserializable):
     """Class to hold the results of a query"""
 
+    DECODE_WITHOUT_INIT = True  # Decoded for every line of history read
+
     def __init__(
         self,
         start_time: datetime = None,
@@ -15,6 +17,7 @@ class QueryResult(Deserializable):
         message: str = None,
         reason: str = None,
         exception_type: str = None,
+        queue_wait_seconds: float = None,
     ) -> None:
         self.start_time = start_time if start_time else datetime.now()
         self.end_time = end_time if end_time else datetime.now()
@@ -24,10 +27,11 @@ class QueryResult(Deserializable):
         self.message = str(message) if message else None
         self.reason = str(reason) if reason else None
         self.exception_type = str(exception_type) if exception_type else None
+        self.queue_wait_seconds = float(queue_wait_seconds) if queue_wait_seconds is not None else None  # Time spent waiting on host limits
 
     def __str__(self):
         status = "Passed" if self.test_passed else "Failed"
-        return f"{status} - Start: {self.start_time}, End: {self.end_time}, Retries: {self.retries}, Code/Status: {self.code_or_status}, Message: {self.message}, Reason: {self.reason}, Exception Type: {self.exception_type}"
+        return f"{status} - Start: {self.start_time}, End: {self.end_time}, Retries: {self.retries}, Code/Status: {self.code_or_status}, Message: {self.message}, Reason: {self.reason}, Exception Type: {self.exception_type}, Queue Wait: {self.queue_wait_seconds}"
 
     def calcualte_latency(self) -> float:
         return (self.end_time - self.start_time).total_seconds()
@@ -1,8 +1,10 @@
+import asyncio
 from datetime import datetime
 import re
 
 from playwright.sync_api import sync_playwright
 from common.custom_logging import get_general_logger
+from common.host_limiter import get_host_limiter
 from queries.query import Query
 from queries.query_result import QueryResult
 
@@ -68,36 +70,42 @@ class RenderedContentRegexQuery(Query):
 
         return super().parameters_are_valid()
 
-    def get_rendered_page_content(self, url: str, timeout: int = 30) -> str:
+    async def get_rendered_page_content_async(self, url: str, timeout: int = 30) -> str:
         """
         Gets the fully rendered content of a webpage using Playwright.
         Returns the HTML content as a string.
+        """
+        from playwright.async_api import async_playwright
+
+        async with async_playwright() as p:
+            browser = await p.chromium.launch()
+            try:
+                page = await browser.new_page()
+                await page.goto(url, timeout=timeout * 1000)
+                await page.wait_for_load_state("networkidle")
+                return await page.content()
+            finally:
+                await browser.close()
+
+    def get_rendered_page_content(self, url: str, timeout: int = 30) -> str:
+        """
+        Blocking version of get_rendered_page_content_async.
 
         NOTE: MAJOR not-understood code block here, this was taken straight from various online snippets and appears to work
         """
-        from playwright.async_api import async_playwright
         import asyncio
         from concurrent.futures import ThreadPoolExecutor
 
-        async def _get_content():
-            async with async_playwright() as p:
-                browser = await p.chromium.launch()
-                try:
-                    page = await browser.new_page()
-                    await page.goto(url, timeout=timeout * 1000)
-                    await page.wait_for_load_state("networkidle")
-                    return await page.content()
-                finally:
-                    await browser.close()
-
-        if asyncio.get_event_loop().is_running():
-            # We're in an event loop, so run in a separate thread
-            with ThreadPoolExecutor() as executor:
-                future = executor.submit(asyncio.run, _get_content())
-                return future.result()
-
-        # If no event loop, just run it
-        return asyncio.run(_get_content())
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # If no event loop, just run it
+            return asyncio.run(self.get_rendered_page_content_async(url, timeout))
+
+        # We're in an event loop, so run in a separate thread
+        with ThreadPoolExecutor() as executor:
+            future = executor.submit(asyncio.run, self.get_rendered_page_content_async(url, timeout))
+            return future.result()
 
     def execute(self) -> QueryResult:
         self._start_time = datetime.now()
@@ -105,7 +113,25 @@ class RenderedContentRegexQuery(Query):
             rendered_content = self.get_rendered_page_content(self.url, self.timeout)
         except Exception as e:
             get_general_logger().error(f"Error getting rendered content: {e}")
+            return self._process_exception(e)
 
+        return self._process_rendered_content(rendered_content)
+
+    async def execute_async(self, execution_slot: asyncio.Semaphore | None = None) -> QueryResult:
+        # Playwright has a native async API, so the page is rendered directly on the monitoring event loop
+        async with get_host_limiter().limit(self.url, execution_slot) as queue_wait_seconds:
+            self._start_time = datetime.now()
+            try:
+                rendered_content = await self.get_rendered_page_content_async(self.url, self.timeout)
+                query_result = self._process_rendered_content(rendered_content)
+            except Exception as e:
+                get_general_logger().error(f"Error getting rendered content: {e}")
+                query_result = self._process_exception(e)
+
+        query_result.queue_wait_seconds = queue_wait_seconds
+        return query_result
+
+    def _process_rendered_content(self, rendered_content: str) -> QueryResult:
         test_passed = self._test_passed_predicate(rendered_content)
         return QueryResult(
             start_time=self._start_time,
@@ -117,6 +143,17 @@ class RenderedContentRegexQuery(Query):
             reason="Did not match regex pattern." if not test_passed else None,
         )
 
+    def _process_exception(self, e: Exception) -> QueryResult:
+        return QueryResult(
+            start_time=self._start_time,
+            end_time=datetime.now(),
+            test_passed=False,
+            retries=1,
+            message=str(e),
+            reason=str(e),
+            exception_type=type(e).__name__,
+        )
+
     def _test_passed_predicate(self, rendered_content: str) -> bool:
         self.flags = 0
         if self.multi_line:
@@ -0,0 +1,143 @@
+"""
+Tests of the binary history backend and of the migration from JSONL to it, run from the project root with: python -m pytest tests
+"""
+
+from datetime import datetime, timedelta
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from common import custom_logging
+import common.serialization as serialization
+from history import binary_history_store
+from history.binary_history_store import BinaryHistoryStore
+from history.jsonl_history_store import HISTORY_DIRECTORY
+from history.migrate_history import migrate_jsonl_history
+from queries.query_result import QueryResult
+
+START = datetime(2024, 12, 7, 15, 27, 14, 250000)  # Fractions of a second exact in binary, so timestamps round-trip exactly
+
+
+def make_results() -> list[QueryResult]:
+    """One result per minute, with assorted strings: repeated, non-ASCII, with characters escaped in JSON, and missing."""
+    fields = [
+        dict(test_passed=True, code_or_status=200, message="OK"),
+        dict(test_passed=False, code_or_status=503, retries=2, message="Connexion refusée ✓", reason="Service Unavailable", exception_type="HTTPError"),
+        dict(test_passed=True, code_or_status=200, message="OK", queue_wait_seconds=0.5),
+        dict(test_passed=False, message='quote " backslash \\ and\nnewline', reason="OK", exception_type="TimeoutError"),
+        dict(test_passed=None, message="", reason=None),
+        dict(test_passed=True, code_or_status=200, message="日本語 \u2028 separator", queue_wait_seconds=0),
+    ]
+    return [
+        QueryResult(start_time=START + timedelta(minutes=i), end_time=START + timedelta(minutes=i, seconds=i * 0.25), **kwargs)
+        for i, kwargs in enumerate(fields)
+    ]
+
+
+class BinaryHistoryStoreTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.previous_directory = os.getcwd()
+        cls.directory = tempfile.TemporaryDirectory()
+        os.chdir(cls.directory.name)
+        custom_logging.initialize()
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.previous_directory)
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.test_directory = tempfile.mkdtemp(dir=self.directory.name)
+        os.chdir(self.test_directory)  # The stores write to data/history in the working directory
+
+    def assertResultsEqual(self, actual: list[QueryResult], expected: list[QueryResult]):
+        self.assertEqual(len(actual), len(expected))
+        for actual_result, expected_result in zip(actual, expected):
+            self.assertEqual(vars(actual_result), vars(expected_result))
+
+
+class BinaryHistoryStoreTest(BinaryHistoryStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.results = make_results()
+        self.store = BinaryHistoryStore()
+        for result in self.results:
+            self.store.append("monitor", result)
+
+    def test_read_range(self):
+        self.assertEqual(self.store.count("monitor"), len(self.results))
+        self.assertResultsEqual(self.store.read_range("monitor", START), self.results)
+        self.assertResultsEqual(self.store.read_range("monitor", self.results[1].end_time, self.results[3].end_time), self.results[1:4])
+        self.assertResultsEqual(self.store.read_range("monitor", self.results[-1].end_time + timedelta(seconds=1)), [])
+        self.assertResultsEqual(self.store.read_last("monitor", 2), self.results[-2:])
+
+    def test_strings_are_interned_once(self):
+        with open(f"{HISTORY_DIRECTORY}/monitor.strings", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), len(set(lines)))
+        self.assertEqual(lines.count('"OK"'), 1)  # As a message and as a reason
+
+    def test_read_by_another_store(self):
+        """The string table is loaded from its file, as by a store of another process."""
+        self.assertResultsEqual(BinaryHistoryStore().read_range("monitor", START), self.results)
+        # Strings appended by this store after the other one loaded its table
+        other_store = BinaryHistoryStore()
+        other_store.read_last("monitor", 1)
+        new_result = QueryResult(start_time=START + timedelta(hours=1), end_time=START + timedelta(hours=1), test_passed=False, message="New message")
+        self.store.append("monitor", new_result)
+        self.assertResultsEqual(other_store.read_last("monitor", 1), [new_result])
+
+    def test_aggregate(self):
+        aggregate_paths = {"struct": None}
+        if binary_history_store.numpy is not None:
+            aggregate_paths["numpy"] = binary_history_store.numpy
+        window = self.results[1:]
+        for path, numpy_module in aggregate_paths.items():
+            with self.subTest(path=path), mock.patch.object(binary_history_store, "numpy", numpy_module):
+                aggregate = self.store.aggregate("monitor", window[0].end_time, window[-1].end_time)
+                self.assertEqual(aggregate.count, len(window))
+                self.assertEqual(aggregate.passed_count, 2)
+                self.assertAlmostEqual(aggregate.uptime, 2 / len(window))
+                self.assertAlmostEqual(aggregate.average_latency_seconds, sum(result.calcualte_latency() for result in window) / len(window))
+                self.assertEqual(aggregate.first_end_time, window[0].end_time)
+                self.assertEqual(aggregate.last_passed_end_time, self.results[5].end_time)
+                self.assertEqual(aggregate.last_failed_end_time, self.results[3].end_time)
+
+                empty_aggregate = self.store.aggregate("monitor", self.results[-1].end_time + timedelta(seconds=1))
+                self.assertEqual(empty_aggregate.count, 0)
+
+    def test_delete_before(self):
+        self.assertEqual(self.store.delete_before("monitor", self.results[2].end_time), 2)
+        self.assertResultsEqual(self.store.read_range("monitor", START), self.results[2:])
+
+
+class MigrateJsonlHistoryTest(BinaryHistoryStoreTestCase):
+    def test_migrate_to_binary(self):
+        results = make_results()
+        os.makedirs(HISTORY_DIRECTORY)
+        with open(f"{HISTORY_DIRECTORY}/monitor.jsonl", "w", encoding="utf-8") as f:
+            # Both line formats, as in a file written before and after switching settings.history_jsonl_compact_format
+            for result in results[:3]:
+                f.write(serialization.to_encoded_jsonl(result) + "\n")
+            f.write("\n")
+            f.write("not a result\n")  # Skipped
+            for result in results[3:]:
+                f.write(serialization.to_compact_jsonl(result) + "\n")
+
+        store = BinaryHistoryStore()
+        self.assertEqual(migrate_jsonl_history(store), {"monitor": len(results)})
+        self.assertResultsEqual(store.read_range("monitor", START), results)
+        self.assertResultsEqual(BinaryHistoryStore().read_range("monitor", START), results)
+
+        # Monitors already migrated are skipped
+        self.assertEqual(migrate_jsonl_history(store), {})
+        self.assertEqual(store.count("monitor"), len(results))
+
+
+if __name__ == "__main__":
+    unittest.main()
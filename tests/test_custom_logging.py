@@ -0,0 +1,49 @@
+"""
+Tests of the log files helpers, run from the project root with: python -m pytest tests
+"""
+
+from datetime import datetime
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from common.custom_logging import _read_log_file_start_time
+
+
+class ReadLogFileStartTimeTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log_file_path = os.path.join(self.directory.name, "monitor.log")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_log_file(self, content: str):
+        with open(self.log_file_path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def test_text_file(self):
+        self.write_log_file("2024-12-07 15:27:14,060 -> First\n2024-12-08 10:00:00,000 -> Second\n")
+        self.assertEqual(_read_log_file_start_time(self.log_file_path), datetime(2024, 12, 7, 15, 27, 14, 60000))
+
+    def test_structured_file(self):
+        entries = [
+            {"timestamp": "2024-12-07 15:27:14,060", "level": "INFO", "monitor": "m", "module": "monitor", "function": "f", "line": 1, "message": "First"},
+            {"timestamp": "2024-12-08 10:00:00,000", "level": "INFO", "monitor": "m", "module": "monitor", "function": "f", "line": 1, "message": "Second"},
+        ]
+        self.write_log_file("".join(json.dumps(entry) + "\n" for entry in entries))
+        self.assertEqual(_read_log_file_start_time(self.log_file_path), datetime(2024, 12, 7, 15, 27, 14, 60000))
+
+    def test_empty_or_missing_file_is_now(self):
+        before = datetime.now()
+        self.assertGreaterEqual(_read_log_file_start_time(self.log_file_path), before)
+        self.write_log_file("")
+        self.assertGreaterEqual(_read_log_file_start_time(self.log_file_path), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+"""
+Tests of the asyncio HTTP client against a local server, run from the project root with: python -m pytest tests
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import sys
+import threading
+import time
+import unittest
+from urllib.error import HTTPError, URLError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from common import http_client
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keeps connections alive unless told otherwise
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connection_count += 1
+        self.requests_on_connection = 0
+
+    def do_GET(self):
+        self.requests_on_connection += 1
+        path = self.path.removeprefix(f"http://{self.server.proxied_host}")  # Requests through a proxy carry the whole URL
+        if path == "/chunked":
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in (b"Hello", b", ", b"chunked world"):
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        elif path == "/close":
+            self.send_body(b"closing", headers={"Connection": "close"})
+            self.close_connection = True
+        elif path == "/close-when-idle":
+            self.send_body(b"closing silently")
+            self.close_connection = True  # Without telling the client, as servers do with idle connections
+        elif path == "/drop-when-reused":
+            if self.requests_on_connection > 1:
+                self.close_connection = True  # Closed right as the client reuses it, without a response
+                return
+            self.send_body(b"first")
+        elif path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/ok")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif path == "/slow":
+            time.sleep(1)
+            self.send_body(b"too late")
+        elif path == "/ok":
+            self.send_body(b"OK " + self.path.encode())
+        else:
+            self.send_error(404)
+
+    def send_body(self, body: bytes, headers: dict[str, str] | None = None):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpClientTest(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        cls.server.daemon_threads = True
+        cls.server.proxied_host = "monitored.invalid"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.connection_count = 0
+
+    async def asyncTearDown(self):
+        http_client.close_connections()
+        setattr(http_client, "__proxies", None)  # Read again from the environment
+
+    async def test_keep_alive_reuses_the_connection(self):
+        for _ in range(3):
+            response = await http_client.fetch(self.base_url + "/ok", 5)
+            self.assertEqual(response.read(), b"OK /ok")
+        self.assertEqual(self.server.connection_count, 1)
+
+    async def test_chunked_body(self):
+        response = await http_client.fetch(self.base_url + "/chunked", 5)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.read(), b"Hello, chunked world")
+        # The connection is reusable after the last chunk
+        await http_client.fetch(self.base_url + "/ok", 5)
+        self.assertEqual(self.server.connection_count, 1)
+
+    async def test_connection_close(self):
+        response = await http_client.fetch(self.base_url + "/close", 5)
+        self.assertEqual(response.read(), b"closing")
+        response = await http_client.fetch(self.base_url + "/ok", 5)
+        self.assertEqual(response.read(), b"OK /ok")
+        self.assertEqual(self.server.connection_count, 2)
+
+    async def test_server_closing_an_idle_connection(self):
+        await http_client.fetch(self.base_url + "/close-when-idle", 5)
+        time.sleep(0.1)  # The server closes the connection while it is idle in the pool
+        response = await http_client.fetch(self.base_url + "/ok", 5)
+        self.assertEqual(response.read(), b"OK /ok")
+        self.assertEqual(self.server.connection_count, 2)
+
+    async def test_server_dropping_a_reused_connection_is_retried(self):
+        self.assertEqual((await http_client.fetch(self.base_url + "/drop-when-reused", 5)).read(), b"first")
+        response = await http_client.fetch(self.base_url + "/drop-when-reused", 5)
+        self.assertEqual(response.read(), b"first")
+        self.assertEqual(self.server.connection_count, 2)
+
+    async def test_redirect(self):
+        response = await http_client.fetch(self.base_url + "/redirect", 5)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.url, self.base_url + "/ok")
+        self.assertEqual(response.read(), b"OK /ok")
+
+    async def test_error_status(self):
+        with self.assertRaises(HTTPError) as context:
+            await http_client.fetch(self.base_url + "/missing", 5)
+        self.assertEqual(context.exception.code, 404)
+
+    async def test_timeout(self):
+        start = time.perf_counter()
+        with self.assertRaises(URLError) as context:
+            await http_client.fetch(self.base_url + "/slow", 0.2)
+        self.assertIsInstance(context.exception.reason, TimeoutError)
+        self.assertLess(time.perf_counter() - start, 0.9)
+
+    async def test_connection_refused(self):
+        with self.assertRaises(URLError):
+            await http_client.fetch("http://127.0.0.1:1/", 5)
+
+    async def test_proxy(self):
+        setattr(http_client, "__proxies", {"http": self.base_url})
+        response = await http_client.fetch(f"http://{self.server.proxied_host}/ok", 5)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.read(), f"OK http://{self.server.proxied_host}/ok".encode())
+
+
+if __name__ == "__main__":
+    unittest.main()